@@ -0,0 +1,258 @@
+# account_state.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import CONFIG
+from market_stream import StreamConnection, stream_symbol, stream_mark_price
+
+CLOSED_ORDER_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+CLOSED_ID_TTL = 60  # 스트림에서 종료된 주문 id를 기억하는 시간 (초) - 늦게 도착한 REST 주문 응답을 무시
+CLOSED_ID_MAX = 1024
+
+
+class AccountState:
+    """유저 데이터 스트림(ORDER_TRADE_UPDATE, ACCOUNT_UPDATE)으로 잔고/포지션/미체결 주문을 메모리에 유지합니다.
+
+    스트림이 끊겼거나 ACCOUNT_RECONCILE_INTERVAL이 지나면 다음 조회 시 REST로 전체 상태를 다시 맞춥니다.
+    첫 REST 동기화가 성공하기 전에는 메모리 상태를 반환하지 않고 매 조회마다 REST를 다시 시도합니다.
+    """
+
+    def __init__(self, exchange, symbols, url=None):
+        self.exchange = exchange
+        self.symbols = list(symbols)
+        self.base_url = url or CONFIG.get('ACCOUNT_STREAM_URL', 'wss://fstream.binance.com/ws')
+        self.reconcile_interval = CONFIG.get('ACCOUNT_RECONCILE_INTERVAL', 300)
+        self.rest_min_interval = CONFIG.get('ACCOUNT_REST_MIN_INTERVAL', 5)
+        self.keepalive_interval = CONFIG.get('LISTEN_KEY_KEEPALIVE', 1800)
+        self._tickers = {stream_symbol(t).upper(): t for t in self.symbols}
+        self._lock = threading.RLock()
+        self._info = {}
+        self._wallet_balance = 0.0
+        self._positions = {}  # (symbol_id, positionSide) -> info.positions 형식의 dict
+        self._orders = {t: {} for t in self.symbols}  # ticker -> {order_id: ccxt 주문 dict}
+        self._closed_ids = OrderedDict()  # 스트림에서 종료(체결/취소 등)된 주문 id -> 수신 시각
+        self._ready = False  # REST 동기화가 한 번이라도 성공해야 메모리 상태를 믿는다
+        self._replay = None  # REST 조회 중에 받은 스트림 이벤트 (조회 결과 위에 다시 적용)
+        self._reconcile_lock = threading.Lock()
+        self._last_reconcile = 0.0
+        self._last_reconcile_attempt = 0.0
+        self._last_keepalive = 0.0
+        self._listen_key = None
+        self.connection = None
+
+    # --- 스트림 관리 ---
+    def start(self):
+        try:
+            self._listen_key = self.exchange.fapiPrivatePostListenKey()['listenKey']
+            self._last_keepalive = time.time()
+        except Exception as e:
+            logging.error(f"listenKey 발급 실패, REST 조회로 동작합니다: {e}")
+            return False
+        self.connection = StreamConnection(f"{self.base_url}/{self._listen_key}", self._on_message, 'account-stream')
+        return self.connection.start()
+
+    def stop(self):
+        if self.connection is not None:
+            self.connection.stop()
+
+    @property
+    def streaming(self):
+        return self.connection is not None and self.connection.connected
+
+    def _keepalive(self, now):
+        if self._listen_key is None or now - self._last_keepalive < self.keepalive_interval:
+            return
+        try:
+            self.exchange.fapiPrivatePutListenKey({'listenKey': self._listen_key})
+            self._last_keepalive = now
+        except Exception as e:
+            logging.warning(f"listenKey 연장 실패, 재발급합니다: {e}")
+            self._renew_listen_key()
+
+    def _renew_listen_key(self):
+        try:
+            self._listen_key = self.exchange.fapiPrivatePostListenKey()['listenKey']
+            self._last_keepalive = time.time()
+            self.connection.reconnect(f"{self.base_url}/{self._listen_key}")
+        except Exception as e:
+            logging.error(f"listenKey 재발급 실패: {e}")
+        self._last_reconcile = 0.0  # 끊긴 동안의 변경분은 REST로 복구
+
+    # --- 이벤트 처리 ---
+    def _on_message(self, message):
+        data = message.get('data', message)
+        event = data.get('e')
+        if event in ('ACCOUNT_UPDATE', 'ORDER_TRADE_UPDATE'):
+            with self._lock:
+                if self._replay is not None:
+                    self._replay.append(data)
+        if event == 'ACCOUNT_UPDATE':
+            self._apply_account_update(data['a'])
+        elif event == 'ORDER_TRADE_UPDATE':
+            self._apply_order_update(data['o'])
+        elif event == 'listenKeyExpired':
+            logging.warning("listenKey 만료 이벤트 수신")
+            self._renew_listen_key()
+
+    def _apply_account_update(self, update):
+        with self._lock:
+            for asset in update.get('B', []):
+                if asset.get('a') == 'USDT':
+                    self._wallet_balance = float(asset['wb'])
+            for p in update.get('P', []):
+                key = (p['s'], p['ps'])
+                position = dict(self._positions.get(key, {'symbol': p['s'], 'positionSide': p['ps'], 'leverage': str(CONFIG['LEVERAGE'])}))
+                leverage = float(position.get('leverage') or CONFIG['LEVERAGE'])
+                position.update({
+                    'positionAmt': p['pa'],
+                    'entryPrice': p['ep'],
+                    'unrealizedProfit': p['up'],
+                    'initialMargin': str(abs(float(p['pa'])) * float(p['ep']) / leverage),
+                })
+                self._positions[key] = position  # 기존 dict는 변경하지 않고 교체
+
+    def _apply_order_update(self, o):
+        ticker = self._tickers.get(o['s'])
+        if ticker is None:
+            return
+        order_id = str(o['i'])
+        with self._lock:
+            orders = dict(self._orders[ticker])
+            if o['X'] in CLOSED_ORDER_STATUSES:
+                orders.pop(order_id, None)
+                self._remember_closed(order_id)
+            else:
+                orders[order_id] = {
+                    'id': order_id,
+                    'clientOrderId': o.get('c'),
+                    'symbol': ticker,
+                    'type': o['o'].lower(),
+                    'side': o['S'].lower(),
+                    'price': float(o['p']),
+                    'stopPrice': float(o.get('sp') or 0.0),
+                    'amount': float(o['q']),
+                    'filled': float(o.get('z') or 0.0),
+                    'remaining': float(o['q']) - float(o.get('z') or 0.0),
+                    'reduceOnly': bool(o.get('R')),
+                    'status': 'open',
+                    'info': {'positionSide': o['ps'], 'orderId': order_id, 'status': o['X']},
+                }
+            self._orders[ticker] = orders
+
+    def _remember_closed(self, order_id):
+        """종료된 주문 id를 기록하고 오래된 기록은 지웁니다. (잠금 안에서 호출)"""
+        now = time.time()
+        self._closed_ids[order_id] = now
+        self._closed_ids.move_to_end(order_id)
+        while self._closed_ids and (len(self._closed_ids) > CLOSED_ID_MAX or now - next(iter(self._closed_ids.values())) > CLOSED_ID_TTL):
+            self._closed_ids.popitem(last=False)
+
+    def on_order_created(self, ticker, order):
+        """주문 직후 스트림 이벤트가 오기 전에도 미체결 목록에 보이도록 반영합니다.
+
+        REST 응답이 스트림보다 늦게 올 수 있으므로, 미체결이 아니거나 스트림이 이미 종료를 알린 주문은 넣지 않습니다.
+        """
+        if not order or not order.get('id') or order.get('status') != 'open':
+            return
+        order_id = str(order['id'])
+        with self._lock:
+            if ticker not in self._orders or order_id in self._closed_ids:
+                return
+            self._orders[ticker] = {**self._orders[ticker], order_id: order}
+
+    def on_order_canceled(self, ticker, order_id):
+        with self._lock:
+            self._remember_closed(str(order_id))
+            if ticker in self._orders:
+                orders = dict(self._orders[ticker])
+                orders.pop(str(order_id), None)
+                self._orders[ticker] = orders
+
+    # --- REST 동기화 ---
+    def _maybe_reconcile(self):
+        now = time.time()
+        self._keepalive(now)
+        if self._ready and self.streaming and now - self._last_reconcile < self.reconcile_interval:
+            return
+        with self._reconcile_lock:
+            if self._ready:
+                if self.streaming and time.time() - self._last_reconcile < self.reconcile_interval:
+                    return  # 기다리는 동안 다른 호출이 동기화함
+                # 스트림이 끊긴 동안에도 조회마다 전체 REST 동기화를 하지 않도록 최소 간격을 둔다 (그 사이에는 메모리 상태)
+                if now - self._last_reconcile_attempt < self.rest_min_interval:
+                    return
+            # 첫 동기화 전의 빈 상태(잔고 0, 주문 없음)는 실제 상태가 아니므로 실패하면 예외를 그대로 올린다
+            self._last_reconcile_attempt = now
+            self.reconcile()
+
+    def reconcile(self):
+        """REST로 잔고와 미체결 주문 전체를 다시 받아 메모리 상태를 교체합니다.
+
+        조회하는 동안 받은 스트림 이벤트는 모아 두었다가 조회 결과 위에 다시 적용하고,
+        그 사이 스트림이 종료를 알린 주문은 REST 결과에서 뺍니다.
+        """
+        with self._lock:
+            self._replay = []
+        try:
+            balance = self.exchange.fetch_balance(params={"type": "future"})
+            orders = {t: {str(o['id']): o for o in self.exchange.fetch_open_orders(t)} for t in self.symbols}
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            self._info = {k: v for k, v in balance['info'].items() if k != 'positions'}
+            self._wallet_balance = float(balance['info'].get('totalWalletBalance', 0.0))
+            self._positions = {(p['symbol'], p['positionSide']): p for p in balance['info']['positions']}
+            self._orders = {t: {i: o for i, o in by_id.items() if i not in self._closed_ids} for t, by_id in orders.items()}
+            replay, self._replay = self._replay, None
+            for data in replay:
+                if data['e'] == 'ACCOUNT_UPDATE':
+                    self._apply_account_update(data['a'])
+                else:
+                    self._apply_order_update(data['o'])
+            self._last_reconcile = time.time()
+            self._ready = True
+        logging.info(f"Account state reconciled via REST. (replayed {len(replay)} stream events)")
+
+    # --- 조회 ---
+    def balance(self):
+        """fetch_balance와 같은 형태의 잔고를 메모리 상태로 만들어 반환합니다."""
+        self._maybe_reconcile()
+        with self._lock:
+            positions = list(self._positions.values())
+            info = dict(self._info)
+            wallet = self._wallet_balance
+        unrealized = 0.0
+        for i, p in enumerate(positions):
+            amt = float(p.get('positionAmt', 0.0))
+            if amt == 0:
+                continue
+            ticker = self._tickers.get(p['symbol'])
+            mark = stream_mark_price(ticker) if ticker else None
+            if mark is not None:
+                # 스트림 마크 가격으로 미실현 손익/증거금을 최신화
+                leverage = float(p.get('leverage') or CONFIG['LEVERAGE'])
+                p = dict(p, markPrice=str(mark),
+                         unrealizedProfit=str(amt * (mark - float(p['entryPrice']))),
+                         initialMargin=str(abs(amt) * mark / leverage))
+                positions[i] = p
+            unrealized += float(p.get('unrealizedProfit', 0.0))
+        info.update({
+            'positions': positions,
+            'totalWalletBalance': str(wallet),
+            'totalUnrealizedProfit': str(unrealized),
+        })
+        total = wallet + unrealized
+        return {
+            'info': info,
+            'USDT': {'total': total},
+            'total': {'USDT': total},
+        }
+
+    def open_orders(self, ticker):
+        """심볼의 미체결 주문 목록을 반환합니다."""
+        self._maybe_reconcile()
+        with self._lock:
+            return list(self._orders.get(ticker, {}).values())
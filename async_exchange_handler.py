@@ -0,0 +1,94 @@
+# async_exchange_handler.py
+import asyncio
+import logging
+import time
+import ccxt.async_support as ccxt_async
+import my_key
+from config import CONFIG
+from ohlcv_cache import ohlcv_cache, MAX_FETCH_LIMIT
+from market_stream import stream_price
+from position_book import get_book
+from exchange_handler import AccountSnapshot
+import rate_limiter
+
+
+class AsyncExchangeHandler:
+    """ccxt async 기반 조회 전용 핸들러. 여러 심볼의 시세/캔들/잔고/주문 조회를 동시에 실행합니다.
+
+    주문 실행은 기존 ExchangeHandler가 담당하고, 이 핸들러는 루프마다 필요한 입력 데이터를 병렬로 모읍니다.
+    """
+
+    def __init__(self, max_concurrency=None):
+        self.exchange = self._create_exchange()
+        self.max_concurrency = max_concurrency or CONFIG.get('ASYNC_MAX_CONCURRENCY', 10)
+        self._semaphore = None
+
+    def _create_exchange(self):
+        """ccxt async exchange 객체를 생성합니다."""
+        try:
+            exchange = ccxt_async.binance({
+                'apiKey': my_key.binance_api_key,
+                'secret': my_key.binance_secret_key,
+                'enableRateLimit': True,
+                'options': {'defaultType': 'future'}
+            })
+            return rate_limiter.install(exchange)  # 동기 핸들러와 같은 가중치 제한기 공유
+        except Exception as e:
+            logging.error(f"async 거래소 객체 생성 실패: {e}")
+            raise
+
+    async def _call(self, method, *args, **kwargs):
+        # 모든 심볼이 하나의 동시 실행 한도를 공유한다 (가중치 제한은 rate_limiter가 담당)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await getattr(self.exchange, method)(*args, **kwargs)
+
+    async def close(self):
+        await self.exchange.close()
+
+    async def fetch_price(self, ticker):
+        """스트림 가격이 있으면 그대로, 없으면 REST로 현재가를 조회합니다."""
+        price = stream_price(ticker)
+        if price is not None:
+            return price
+        return (await self._call('fetch_ticker', ticker))['last']
+
+    async def fetch_ohlcv(self, ticker, timeframe, count):
+        """OHLCV 캐시를 공유하며 필요한 구간만 비동기로 가져옵니다."""
+        buf = ohlcv_cache.buffer(ticker, timeframe, count)
+        now = time.time()
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        plan = ohlcv_cache.plan(buf, count, timeframe_ms, now)
+        if plan is not None:
+            full, since, limit = plan
+            requested = limit
+            rows = []
+            while limit > 0:
+                page = await self._call('fetch_ohlcv', ticker, timeframe, since=since, limit=min(MAX_FETCH_LIMIT, limit))
+                if not page:
+                    break
+                rows.extend(page)
+                if not full:
+                    break
+                since = page[-1][0] + timeframe_ms
+                limit -= len(page)
+            ohlcv_cache.apply(buf, rows, full, now, requested)
+        return buf.frame(count)
+
+    async def fetch_balance(self):
+        return await self._call('fetch_balance', params={"type": "future"})
+
+    async def fetch_open_orders(self, ticker):
+        return await self._call('fetch_open_orders', ticker)
+
+    async def fetch_snapshot(self, symbols):
+        """잔고와 모든 심볼의 미체결 주문을 동시에 조회해 AccountSnapshot을 만듭니다."""
+        results = await asyncio.gather(self.fetch_balance(), *(self.fetch_open_orders(t) for t in symbols))
+        balance = results[0]
+        open_orders = {t: tuple(orders) for t, orders in zip(symbols, results[1:])}
+        return AccountSnapshot(time.time(), balance, get_book(balance), open_orders)
+
+    async def fetch_market_data(self, ticker, timeframe='1m', count=100):
+        """한 심볼의 현재가와 캔들을 동시에 조회합니다."""
+        return await asyncio.gather(self.fetch_price(ticker), self.fetch_ohlcv(ticker, timeframe, count))
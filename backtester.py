@@ -0,0 +1,388 @@
+# backtester.py
+import logging
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+from config import CONFIG
+import strategy_logic
+import risk_manager
+import grid_reconciler
+import signal_kernel
+from resampler import timeframe_ms
+
+FUNDING_INTERVAL_MS = 8 * 3_600_000  # 바이낸스 선물 펀딩 주기 (00, 08, 16시 UTC)
+
+# fills 배열 컬럼: (timestamp, 포지션 사이드(+1 롱, -1 숏), 평균 체결가, 수량, 수수료, 종류(0 그리드, 1 비율 조정))
+FILL_GRID, FILL_REBALANCE = 0, 1
+SCALAR_SEGMENT = 16  # 이 길이 이하 구간의 비율 조정 조건은 캔들별로 직접 확인
+BacktestResult = namedtuple('BacktestResult', ['summary', 'equity', 'fills', 'signals'])
+# 평가 자본(수익률/최대 낙폭)을 바꾸는 CONFIG 키
+EQUITY_KEYS = (
+    'LEVERAGE', 'POSITION_SIZE', 'MAX_STEPS', 'GRID_INTERVAL_MIN', 'GRID_INTERVAL_MAX', 'GRID_PRICE_TOLERANCE',
+    'HEDGE_REBALANCE_THRESHOLD', 'MIN_VOLUME_CHANGE',
+    'BACKTEST_INITIAL_BALANCE', 'BACKTEST_MAKER_FEE', 'BACKTEST_TAKER_FEE', 'BACKTEST_FUNDING_RATE',
+)
+# 진입 신호 통계(entry_signal_series)에만 쓰이는 CONFIG 키 - 수익률/낙폭은 바뀌지 않음
+SIGNAL_KEYS = (
+    'RSI_THRESHOLD_LONG', 'RSI_THRESHOLD_SHORT', 'ADX_THRESHOLD', 'CCI_THRESHOLD', 'MFI_THRESHOLD',
+    'STOCH_K_THRESHOLD', 'STOCH_D_THRESHOLD', 'BB_EXPANSION_THRESHOLD', 'VOLUME_SPIKE_THRESHOLD',
+    'ENTRY_CONDITION_STRICTNESS', 'BACKTEST_SIGNAL_HORIZON',
+)
+
+
+@contextmanager
+def override_config(params):
+    """params의 CONFIG 값을 잠시 바꿔 실행합니다. (전략 함수들이 CONFIG를 직접 읽으므로)"""
+    params = params or {}
+    missing = object()
+    previous = {k: CONFIG.get(k, missing) for k in params}
+    CONFIG.update(params)
+    try:
+        yield
+    finally:
+        for k, v in previous.items():
+            if v is missing:
+                CONFIG.pop(k, None)
+            else:
+                CONFIG[k] = v
+
+
+class BacktestData:
+    """백테스트 입력 캔들과 파라미터와 무관한 지표 시계열을 한 번만 계산해 보관합니다.
+
+    같은 데이터로 여러 파라미터를 돌릴 때 지표를 다시 계산하지 않도록 재사용합니다.
+    """
+
+    def __init__(self, candles, timeframe='1m', ticker=None, series=None, origin=None):
+        data = np.asarray(candles, dtype=float)
+        valid = ~np.isnan(data[:, 0])  # 저장소의 빈 시각(nan 행) 제거
+        self.candles = data if valid.all() else data[valid]  # 빈 시각이 없으면 복사 없이 그대로 (공유 메모리 뷰 등)
+        self.timeframe = timeframe
+        self.ticker = ticker
+        if series is not None and not valid.all():
+            series = {k: v[valid] for k, v in series.items()}
+        self._series = series  # 미리 계산한 지표 시계열 (없으면 처음 쓸 때 계산)
+        # 지표 워밍업을 시작한 캔들 시각: 잘라낸 데이터는 원본의 시작점을 이어받는다 (같은 구간이라도 워밍업이 다르면 결과가 다름)
+        self.origin = origin if origin is not None else (int(self.candles[0, 0]) if len(self.candles) else None)
+
+    def __len__(self):
+        return len(self.candles)
+
+    @property
+    def range(self):
+        """(첫 캔들 시각, 마지막 캔들 시각, 캔들 수, 지표 워밍업 시작 시각) - 결과 캐시 키에 씁니다."""
+        if len(self.candles) == 0:
+            return (None, None, 0, self.origin)
+        return (int(self.candles[0, 0]), int(self.candles[-1, 0]), len(self.candles), self.origin)
+
+    def slice(self, start, end):
+        """[start, end) 위치의 부분 데이터. 지표는 전체 시계열 값을 잘라 쓰므로 구간 앞쪽도 워밍업 없이 유효합니다."""
+        return BacktestData(self.candles[start:end], self.timeframe, self.ticker,
+                            {k: v[start:end] for k, v in self.series.items()}, self.origin)
+
+    @property
+    def series(self):
+        if self._series is None:
+            self._series = signal_kernel.entry_value_series(self.candles)
+        return self._series
+
+
+def load_data(ticker, timeframe='1m', since=None, until=None):
+    """candle_store에 저장된 [since, until) 캔들로 BacktestData를 만듭니다."""
+    from candle_store import candle_store
+    return BacktestData(candle_store.read(ticker, timeframe, since, until), timeframe, ticker)
+
+
+def grid_anchors(close, interval):
+    """각 캔들 종가에서 그리드를 깔 기준가와 간격 (실시간 grid_reconciler.grid_anchor와 같은 규칙).
+
+    기준가는 종가가 한 칸 이상 벗어나거나 간격이 허용 오차 비율 이상 바뀔 때만 그 캔들 종가로 옮깁니다.
+    앞 캔들의 기준가에 따라 정해지므로 캔들 순서대로 한 번 훑습니다.
+    """
+    tolerance = CONFIG.get('GRID_PRICE_TOLERANCE', 0.3)
+    anchor_price = np.empty(len(close))
+    anchor_interval = np.empty(len(close))
+    price = step = None
+    for t, (c, i) in enumerate(zip(close.tolist(), interval.tolist())):
+        if price is None or not grid_reconciler.keeps_anchor(price, step, c, i, tolerance):
+            price, step = c, i
+        anchor_price[t] = price
+        anchor_interval[t] = step
+    return anchor_price, anchor_interval
+
+
+def grid_fill_counts(anchor_price, anchor_interval, low, high, steps):
+    """각 캔들 동안 체결되는 그리드 단계 수 (매수, 매도).
+
+    직전 캔들 종가 시점의 기준가에서 그 간격으로 steps개씩 깐 그리드(build_grid_ladder)가 이번 캔들 저가/고가에 닿은 만큼 체결됩니다.
+    k번째 매수 레벨 a(1 - I*k)는 k <= (1 - low/a) / I 이면 체결되므로 단계 수를 바로 구합니다.
+    """
+    prev_anchor = anchor_price[:-1]
+    prev_interval = anchor_interval[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        buys = np.floor((1.0 - low[1:] / prev_anchor) / prev_interval + 1e-9)
+        sells = np.floor((high[1:] / prev_anchor - 1.0) / prev_interval + 1e-9)
+    buys = np.clip(np.nan_to_num(buys), 0, steps).astype(np.int64)
+    sells = np.clip(np.nan_to_num(sells), 0, steps).astype(np.int64)
+    zero = np.zeros(1, dtype=np.int64)
+    return np.concatenate([zero, buys]), np.concatenate([zero, sells])
+
+
+def funding_schedule(timestamps, funding_rates=None):
+    """펀딩 시각(8시간 경계)에 시작하는 캔들 위치와 그때의 펀딩비. funding_rates는 (M, 2) [timestamp, rate] 이력입니다."""
+    bars = np.flatnonzero(timestamps.astype(np.int64) % FUNDING_INTERVAL_MS == 0)
+    if funding_rates is None or len(funding_rates) == 0:
+        return bars, np.full(len(bars), CONFIG.get('BACKTEST_FUNDING_RATE', 0.0001))
+    rates = np.asarray(funding_rates, dtype=float)
+    rates = rates[np.argsort(rates[:, 0])]
+    idx = np.searchsorted(rates[:, 0], timestamps[bars], side='right') - 1
+    return bars, np.where(idx >= 0, rates[np.maximum(idx, 0), 1], 0.0)
+
+
+def entry_signal_series(data, horizon=None):
+    """진입 조건 점수를 모든 캔들에 대해 한 번에 계산하고, 신호 뒤 horizon개 캔들 수익률로 신호 품질을 요약합니다.
+
+    실시간과 같이 캔들 조건은 직전 확정 캔들까지, MA/RSI 조건은 현재 캔들 종가 기준입니다.
+    """
+    horizon = horizon or CONFIG.get('BACKTEST_SIGNAL_HORIZON', 15)
+    v = data.series
+    shifted = {k: np.concatenate([[np.nan], x[:-1]]) for k, x in v.items()}
+    conditions = strategy_logic.candle_conditions(shifted)
+    conditions.update(strategy_logic.price_conditions(v['close'], v['ma'], v['rsi']))
+    long_score, short_score, long, short = strategy_logic.entry_scores(conditions)
+
+    close = v['close']
+    forward = np.full(len(close), np.nan)
+    if len(close) > horizon:
+        forward[:-horizon] = close[horizon:] / close[:-horizon] - 1.0
+    long_returns = forward[long & ~np.isnan(forward)]
+    short_returns = -forward[short & ~np.isnan(forward)]
+    stats = {
+        'long_signals': int(long.sum()),
+        'short_signals': int(short.sum()),
+        'long_hit_rate': float((long_returns > 0).mean()) if len(long_returns) else np.nan,
+        'short_hit_rate': float((short_returns > 0).mean()) if len(short_returns) else np.nan,
+        'long_avg_return': float(long_returns.mean()) if len(long_returns) else np.nan,
+        'short_avg_return': float(short_returns.mean()) if len(short_returns) else np.nan,
+    }
+    return {'long_score': long_score, 'short_score': short_score, 'long': long, 'short': short}, stats
+
+
+def _max_drawdown(equity):
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    return float(((peak - equity) / peak).max())
+
+
+def run_backtest(data, params=None, initial_balance=None, funding_rates=None, min_amount=0.0):
+    """저장된 캔들을 실시간 루프(evaluate_ticker)와 같은 규칙으로 재생합니다.
+
+    - 그리드: 매 캔들 종가에서 ATR 간격(strategy_logic.atr_grid_interval)과 실시간과 같은 기준가 규칙(grid_anchors)으로
+      롱 매수/숏 매도 MAX_STEPS개를 깔고, 다음 캔들의 저가/고가에 닿은 레벨은 지정가로 체결(메이커 수수료)합니다.
+    - 수량: risk_manager.position_amount (직전 종가 기준 평가 자본)
+    - 비율 조정: risk_manager.target_long_ratio / rebalance_order, 종가에 체결(테이커 수수료)
+    - 펀딩: 8시간 경계 캔들 시가 기준으로 롱은 지불, 숏은 수취
+
+    체결/펀딩/비율 조정이 일어나는 캔들만 순서대로 처리하고, 그 사이 구간의 비율 조정 조건과
+    지표/그리드 체결 단계/평가 자본은 배열 연산으로 한 번에 계산합니다.
+    """
+    started = time.time()
+    with override_config(params):
+        return _run(data, initial_balance or CONFIG.get('BACKTEST_INITIAL_BALANCE', 1000.0),
+                    funding_rates, min_amount, started)
+
+
+def _run(data, initial_balance, funding_rates, min_amount, started):
+    candles = data.candles
+    n = len(candles)
+    if n < 2:
+        raise ValueError("not enough candles for backtest")
+    ts, open_, high, low, close = candles[:, 0], candles[:, 1], candles[:, 2], candles[:, 3], candles[:, 4]
+    leverage = CONFIG['LEVERAGE']
+    maker_fee = CONFIG.get('BACKTEST_MAKER_FEE', 0.0002)
+    taker_fee = CONFIG.get('BACKTEST_TAKER_FEE', 0.0005)
+    threshold = CONFIG['HEDGE_REBALANCE_THRESHOLD']
+    steps = CONFIG['MAX_STEPS']
+
+    # --- 파라미터별 배열 계산 ---
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interval = strategy_logic.atr_grid_interval(data.series['atr'] / close)
+        change = np.concatenate([[0.0], close[1:] / close[:-1] - 1.0])
+    target = risk_manager.target_long_ratio(change)
+    anchor_price, anchor_interval = grid_anchors(close, interval)
+    buys, sells = grid_fill_counts(anchor_price, anchor_interval, low, high, steps)
+    funding_bars, funding_values = funding_schedule(ts, funding_rates)
+    funding_rate_at = dict(zip(funding_bars.tolist(), funding_values.tolist()))
+    events = np.union1d(np.flatnonzero((buys > 0) | (sells > 0)), funding_bars)
+
+    # 포지션 평가 금액(증거금 + 미실현 손익, position_value)은 포지션이 그대로면 가격의 1차식
+    value_scale = 1.0 / leverage + 1.0
+
+    wallet = initial_balance
+    long_qty = long_entry = short_qty = short_entry = 0.0
+    fees = funding_paid = 0.0
+    fills = []
+    states = []  # (캔들 위치, 지갑, 롱 수량, 롱 평단, 숏 수량, 숏 평단): 이 캔들 종가부터 유효한 상태
+
+    def free_margin(price):
+        """price에서 새 주문에 쓸 수 있는 증거금 (평가 자본 - 양방향 포지션 증거금)"""
+        equity = wallet + long_qty * (price - long_entry) + short_qty * (short_entry - price)
+        return equity - (long_qty + short_qty) * price / leverage
+
+    def rebalance_at(t):
+        """t 종가의 비율 조정 주문 (side, positionSide, 수량). 조건이 안 되거나 증거금이 모자라면 None"""
+        price = close[t]
+        long_value = long_qty * price * value_scale - long_qty * long_entry
+        short_value = short_qty * short_entry - short_qty * price * (1.0 - 1.0 / leverage)
+        order = risk_manager.rebalance_order(long_value, short_value, price, target[t], min_amount)
+        if order is None or order[2] * price / leverage > free_margin(price):
+            return None  # 실거래에서는 InsufficientFunds로 거부
+        return order
+
+    def first_rebalance(start, end):
+        """[start, end) 캔들 중 비율 조정 주문이 처음 나가는 위치 (없으면 None)"""
+        if start >= end or long_qty + short_qty == 0:
+            return None
+        if end - start <= SCALAR_SEGMENT:
+            # 짧은 구간은 배열 연산 오버헤드보다 실시간 함수를 그대로 부르는 편이 빠르다
+            for t in range(start, end):
+                if rebalance_at(t) is not None:
+                    return t
+            return None
+        price = close[start:end]
+        long_value = long_qty * price * value_scale - long_qty * long_entry
+        short_value = short_qty * short_entry - short_qty * price * (1.0 - 1.0 / leverage)
+        total = long_value + short_value
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gap = np.abs(long_value / total - target[start:end])
+            amount = np.minimum(total * gap * 0.3, total * 0.1) / price
+            hit = (total > 10) & (gap > threshold) & (amount >= min_amount) & (amount * price / leverage <= free_margin(price))
+        found = np.flatnonzero(hit)
+        return start + int(found[0]) if len(found) else None
+
+    cursor = 0  # 이 위치부터 비율 조정 조건을 확인하지 않은 캔들
+    for t in np.append(events, n):
+        t = int(t)
+        # 지난 이벤트와 이번 이벤트 사이의 비율 조정 (조정 후 포지션이 바뀌므로 하나씩 처리)
+        while True:
+            r = first_rebalance(cursor, t)
+            if r is None:
+                break
+            _, position_side, amount = rebalance_at(r)
+            price = close[r]
+            fee = amount * price * taker_fee
+            if position_side == 'LONG':
+                long_entry = (long_entry * long_qty + price * amount) / (long_qty + amount)
+                long_qty += amount
+            else:
+                short_entry = (short_entry * short_qty + price * amount) / (short_qty + amount)
+                short_qty += amount
+            wallet -= fee
+            fees += fee
+            fills.append((ts[r], 1.0 if position_side == 'LONG' else -1.0, price, amount, fee, FILL_REBALANCE))
+            states.append((r, wallet, long_qty, long_entry, short_qty, short_entry))
+            cursor = r + 1
+        if t >= n:
+            break
+
+        # 펀딩 (캔들 시작 시점 포지션 기준)
+        rate = funding_rate_at.get(t)
+        if rate is not None and (long_qty or short_qty):
+            payment = (long_qty - short_qty) * open_[t] * rate
+            wallet -= payment
+            funding_paid += payment
+
+        # 직전 종가 시점의 기준가에 깐 그리드의 체결 (수량은 직전 종가 기준 평가 자본으로 계산)
+        if buys[t] or sells[t]:
+            prev = close[t - 1]
+            equity = wallet + long_qty * (prev - long_entry) + short_qty * (short_entry - prev)
+            amount = risk_manager.position_amount(equity, prev)
+            base, step = anchor_price[t - 1], anchor_interval[t - 1]
+            for count, sign in ((buys[t], -1.0), (sells[t], 1.0)):
+                # 증거금이 모자라면 가까운 레벨부터 가능한 만큼만 체결
+                count = min(int(count), int(max(free_margin(prev), 0.0) * leverage / (amount * prev)))
+                if count <= 0:
+                    continue
+                qty = amount * count
+                notional = amount * base * (count + sign * step * count * (count + 1) / 2)
+                price = notional / qty
+                fee = notional * maker_fee
+                if sign < 0:
+                    long_entry = (long_entry * long_qty + notional) / (long_qty + qty)
+                    long_qty += qty
+                else:
+                    short_entry = (short_entry * short_qty + notional) / (short_qty + qty)
+                    short_qty += qty
+                wallet -= fee
+                fees += fee
+                fills.append((ts[t], -sign, price, qty, fee, FILL_GRID))
+
+        states.append((t, wallet, long_qty, long_entry, short_qty, short_entry))
+        cursor = t  # 체결 후 이 캔들 종가부터 다시 확인
+
+    # --- 평가 자본 곡선: 상태를 다음 상태 전까지 채워 한 번에 계산 ---
+    state = np.array(states) if states else np.empty((0, 6))
+    equity = np.full(n, float(initial_balance))
+    if len(state):
+        idx = np.searchsorted(state[:, 0], np.arange(n), side='right') - 1
+        valid = idx >= 0
+        s = state[np.maximum(idx, 0)]
+        equity = np.where(valid, s[:, 1] + s[:, 2] * (close - s[:, 3]) + s[:, 4] * (s[:, 5] - close), initial_balance)
+
+    # 평가 자본이 0 이하가 되면 청산된 것으로 보고 이후 결과를 버린다
+    liquidated = np.flatnonzero(equity <= 0)
+    liquidated_at = int(ts[liquidated[0]]) if len(liquidated) else None
+    if liquidated_at is not None:
+        equity[liquidated[0]:] = 0.0
+        fills = [f for f in fills if f[0] <= liquidated_at]
+
+    signals, signal_stats = entry_signal_series(data)
+    fills = np.array(fills) if fills else np.empty((0, 6))
+    summary = {
+        'ticker': data.ticker,
+        'start': int(ts[0]),
+        'end': int(ts[-1]),
+        'bars': n,
+        'initial_balance': float(initial_balance),
+        'final_equity': float(equity[-1]),
+        'return': float(equity[-1] / initial_balance - 1.0),
+        'max_drawdown': _max_drawdown(equity),
+        'fees': float(fees),
+        'funding': float(funding_paid),
+        'grid_fills': int((fills[:, 5] == FILL_GRID).sum()) if len(fills) else 0,
+        'rebalances': int((fills[:, 5] == FILL_REBALANCE).sum()) if len(fills) else 0,
+        'long_amount': float(long_qty),
+        'short_amount': float(short_qty),
+        'liquidated_at': liquidated_at,
+        'elapsed': time.time() - started,
+    }
+    summary.update(signal_stats)
+    return BacktestResult(summary, equity, fills, signals)
+
+
+def format_summary(summary):
+    return (f"{summary['ticker']} {summary['bars']} candles: equity {summary['initial_balance']:.2f} -> "
+            f"{summary['final_equity']:.2f} ({summary['return']:+.2%}), MDD {summary['max_drawdown']:.2%}, "
+            f"fees {summary['fees']:.2f}, funding {summary['funding']:.2f}, "
+            f"fills {summary['grid_fills']}, rebalances {summary['rebalances']}, "
+            f"long {summary['long_amount']:.4f} / short {summary['short_amount']:.4f}, "
+            f"signals L{summary['long_signals']}/S{summary['short_signals']} ({summary['elapsed']:.2f}s)")
+
+
+if __name__ == '__main__':
+    # 사용법: python backtester.py [심볼] [일수]  - 저장소에 없는 구간은 공개 API로 받아 저장 후 실행
+    import ccxt
+    from candle_store import candle_store
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ticker = sys.argv[1] if len(sys.argv) > 1 else CONFIG['SYMBOLS'][0]
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    now_ms = int(time.time() * 1000)
+    since = now_ms - int(days * 86_400_000)
+    since -= since % timeframe_ms('1m')
+    candle_store.backfill(ccxt.binance({'options': {'defaultType': 'future'}}), ticker, '1m', since)
+    result = run_backtest(load_data(ticker, '1m', since))
+    logging.info(format_summary(result.summary))
@@ -0,0 +1,231 @@
+# cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import CONFIG
+
+
+class _Flight:
+    """진행 중인 조회 한 건. 같은 키를 기다리는 호출자들이 결과를 함께 받습니다."""
+
+    def __init__(self, tags=()):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.tags = tuple(tags)
+        self.stale = False  # 조회 중에 무효화되면 결과를 저장하지 않는다 (호출자에게는 반환)
+
+
+class CacheNamespace:
+    """TTL과 크기 제한(LRU)이 있는 스레드 안전 캐시 한 구역입니다.
+
+    get_or_load()는 같은 키의 동시 조회를 한 번으로 합치고(single-flight), 항목에 붙인 태그(심볼, 심볼:방향)로
+    한꺼번에 무효화할 수 있습니다. 적중/실패/축출 횟수와 조회 시간을 셉니다.
+    """
+
+    def __init__(self, name, ttl=None, maxsize=256):
+        self.name = name
+        self.ttl = ttl  # None이면 만료 없음 (명시적으로 무효화할 때까지 유지)
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # 키 -> (값, 만료 시각, 태그)
+        self._tags = {}  # 태그 -> 키 집합
+        self._flights = {}  # 키 -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.shared = 0  # 다른 호출자의 조회 결과를 기다려 받은 횟수
+        self.load_time = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    # --- 내부 (잠금 안에서 호출) ---
+    def _lookup(self, key, now):
+        item = self._items.get(key)
+        if item is None:
+            return False, None
+        value, expires_at, _ = item
+        if expires_at is not None and now >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            return False, None
+        self._items.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value, tags, ttl, now):
+        self._remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        self._items[key] = (value, None if ttl is None else now + ttl, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._items) > self.maxsize:
+            self._remove(next(iter(self._items)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        item = self._items.pop(key, None)
+        if item is None:
+            return False
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    # --- 조회/저장 ---
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key, time.time())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, tags=(), ttl=None):
+        with self._lock:
+            self._store(key, value, tags, ttl, time.time())
+
+    def add(self, key, value, tags=(), ttl=None):
+        """키가 없거나 만료되었을 때만 저장하고 True를 반환합니다. (쿨다운 등 원자적 확인-후-기록용)"""
+        with self._lock:
+            now = time.time()
+            found, _ = self._lookup(key, now)
+            if found:
+                return False
+            self._store(key, value, tags, ttl, now)
+            return True
+
+    def get_or_load(self, key, loader, tags=(), ttl=None):
+        """캐시된 값을 반환하고, 없으면 loader()로 한 번만 조회해 저장합니다. 동시에 요청한 호출자는 그 결과를 기다립니다."""
+        with self._lock:
+            found, value = self._lookup(key, time.time())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight(tags)
+        if not owner:
+            flight.done.wait()
+            with self._lock:
+                self.shared += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.time()
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self.load_errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                self.loads += 1
+                self.load_time += time.time() - started
+                if flight.error is None and not flight.stale:
+                    self._store(key, flight.value, tags, ttl, time.time())
+            flight.done.set()
+        return flight.value
+
+    # --- 무효화 ---
+    def invalidate(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.stale = True
+            return self._remove(key)
+
+    def invalidate_tag(self, tag):
+        """태그가 붙은 항목을 모두 지웁니다. 지운 개수를 반환합니다."""
+        with self._lock:
+            for flight in self._flights.values():
+                if tag in flight.tags:
+                    flight.stale = True
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            for flight in self._flights.values():
+                flight.stale = True
+            self._items.clear()
+            self._tags.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'loads': self.loads,
+            'load_errors': self.load_errors,
+            'shared': self.shared,
+            'hit_rate': self.hits / total if total else 0.0,
+            'avg_load_ms': self.load_time / self.loads * 1000 if self.loads else 0.0,
+        }
+
+
+_namespaces = {}
+_registry_lock = threading.Lock()
+
+
+def namespace(name, ttl=None, maxsize=256):
+    """이름으로 캐시 구역을 가져옵니다. 처음 부를 때 ttl/maxsize로 만듭니다."""
+    with _registry_lock:
+        cache = _namespaces.get(name)
+        if cache is None:
+            cache = _namespaces[name] = CacheNamespace(name, ttl, maxsize)
+        return cache
+
+
+def symbol_tags(ticker, position_side=None):
+    """심볼 단위 태그와 (있으면) 심볼:방향 태그"""
+    return (ticker,) if position_side is None else (ticker, f"{ticker}:{position_side}")
+
+
+def invalidate_tag(tag):
+    """모든 구역에서 태그가 붙은 항목을 지웁니다."""
+    return sum(cache.invalidate_tag(tag) for cache in list(_namespaces.values()))
+
+
+def clear_all():
+    for cache in list(_namespaces.values()):
+        cache.clear()
+
+
+def stats():
+    return {name: cache.stats() for name, cache in list(_namespaces.items())}
+
+
+def log_stats():
+    result = stats()
+    for name, s in result.items():
+        logging.info(f"Cache {name}: size={s['size']}, hits={s['hits']}, misses={s['misses']}, shared={s['shared']}, "
+                     f"evictions={s['evictions']}, expirations={s['expirations']}, hit_rate={s['hit_rate']:.1%}, "
+                     f"avg_load={s['avg_load_ms']:.1f}ms")
+    return result
+
+
+# --- 구역 ---
+position_cache = namespace('position', CONFIG.get('CACHE_DURATION', 15), CONFIG.get('CACHE_MAX_ENTRIES', 256))
+funding_cache = namespace('funding', CONFIG.get('FUNDING_CACHE_DURATION', 3600), CONFIG.get('CACHE_MAX_ENTRIES', 256))
+snapshot_cache = namespace('snapshot', None, CONFIG.get('CACHE_MAX_ENTRIES', 256))  # 루프 단위 잔고 + 심볼별 미체결 주문 (주문/취소한 심볼만 무효화)
+notification_cache = namespace('notification', CONFIG.get('NOTIFICATION_COOLDOWN', 300), CONFIG.get('CACHE_MAX_ENTRIES', 256))
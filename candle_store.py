@@ -0,0 +1,250 @@
+# candle_store.py
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from config import CONFIG
+from position_book import symbol_id
+from resampler import timeframe_ms
+from ohlcv_cache import ohlcv_cache, fetch_ohlcv_range
+
+# 파일 레이아웃: 캔들 한 개 = float64 6개(timestamp, open, high, low, close, volume) 고정 폭 행.
+# 행 번호 = (timestamp - base) / 타임프레임 길이 이므로 위치 계산만으로 임의 구간을 읽을 수 있다. 빈 시각은 nan 행.
+ROW_FIELDS = 6
+ROW_BYTES = ROW_FIELDS * 8
+GROW_ROWS = 1440  # 파일을 늘릴 때 최소 증가 행 수 (1분봉 하루치)
+INDEX_FILE = 'index.json'
+
+
+def _merge_ranges(ranges):
+    """[start, end) 구간 목록을 정렬하고 겹치거나 맞닿은 구간을 합칩니다."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class CandleStore:
+    """(심볼, 타임프레임)별 mmap 캔들 파일과 보관 구간 인덱스(JSON)를 관리합니다.
+
+    인덱스에는 base(첫 행 시각), rows(논리 행 수), ranges(거래소와 동기화된 [start, end) 구간)를 둡니다.
+    ranges 밖의 구간만 거래소에서 받아 채우므로 재시작/백테스트 시 다시 내려받지 않습니다.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or CONFIG.get('CANDLE_STORE_DIR', 'data/candles')
+        self._index = None
+        self._maps = {}  # 파일 키 -> np.memmap
+        self._lock = threading.RLock()
+
+    # --- 인덱스/파일 ---
+    def _key(self, ticker, timeframe):
+        return f"{symbol_id(ticker)}_{timeframe}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _load_index(self):
+        if self._index is None:
+            path = os.path.join(self.directory, INDEX_FILE)
+            try:
+                with open(path, 'r') as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+            except (OSError, ValueError) as e:
+                logging.error(f"Candle store index load failed, starting empty: {e}")
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, path)  # 중간에 죽어도 이전 인덱스가 남는다
+
+    def _physical_rows(self, key):
+        path = self._path(key)
+        return os.path.getsize(path) // ROW_BYTES if os.path.exists(path) else 0
+
+    def _map(self, key):
+        mm = self._maps.get(key)
+        rows = self._physical_rows(key)
+        if mm is None or len(mm) != rows:
+            mm = np.memmap(self._path(key), dtype=np.float64, mode='r+', shape=(rows, ROW_FIELDS)) if rows else None
+            self._maps[key] = mm
+        return mm
+
+    def _grow(self, key, rows):
+        """파일 끝에 nan 행을 붙여 최소 rows행이 되도록 늘립니다."""
+        current = self._physical_rows(key)
+        if rows <= current:
+            return
+        extra = max(rows - current, GROW_ROWS)
+        os.makedirs(self.directory, exist_ok=True)
+        self._close(key)
+        with open(self._path(key), 'ab') as f:
+            f.write(np.full((extra, ROW_FIELDS), np.nan).tobytes())
+
+    def _prepend(self, key, entry, new_base, period):
+        """base보다 이른 캔들을 쓰기 위해 파일 앞쪽에 nan 행을 넣습니다. (드문 경우라 파일을 다시 씀)"""
+        shift = (entry['base'] - new_base) // period
+        old = np.fromfile(self._path(key), dtype=np.float64).reshape(-1, ROW_FIELDS)[:entry['rows']]
+        self._close(key)
+        data = np.full((shift + len(old), ROW_FIELDS), np.nan)
+        data[shift:] = old
+        tmp = self._path(key) + '.tmp'
+        data.tofile(tmp)
+        os.replace(tmp, self._path(key))
+        entry['base'] = new_base
+        entry['rows'] += shift
+
+    def _close(self, key):
+        mm = self._maps.pop(key, None)
+        if mm is not None:
+            mm.flush()
+            del mm
+
+    def close(self):
+        with self._lock:
+            for key in list(self._maps):
+                self._close(key)
+
+    # --- 조회/저장 ---
+    def ranges(self, ticker, timeframe):
+        with self._lock:
+            entry = self._load_index().get(self._key(ticker, timeframe))
+            return [tuple(r) for r in entry['ranges']] if entry else []
+
+    def write(self, ticker, timeframe, rows, covered=None):
+        """확정 캔들을 저장하고 covered([start, end))를 동기화된 구간으로 기록합니다.
+
+        covered가 없으면 rows 안에서 시각이 끊김 없이 이어지는 구간들을 기록합니다.
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, ROW_FIELDS)
+        if len(rows) == 0 and covered is None:
+            return 0
+        period = timeframe_ms(timeframe)
+        key = self._key(ticker, timeframe)
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if len(rows):
+                rows = rows[np.argsort(rows[:, 0], kind='stable')]
+                first = int(rows[0, 0])
+                if entry is None:
+                    entry = index[key] = {'base': first, 'rows': 0, 'ranges': []}
+                elif first < entry['base']:
+                    self._prepend(key, entry, first, period)
+                positions = ((rows[:, 0].astype(np.int64) - entry['base']) // period).astype(np.int64)
+                needed = int(positions[-1]) + 1
+                self._grow(key, needed)
+                mm = self._map(key)
+                mm[positions] = rows
+                mm.flush()
+                entry['rows'] = max(entry['rows'], needed)
+            if covered is not None:
+                spans = [[int(covered[0]), int(covered[1])]] if covered[1] > covered[0] else []
+            else:
+                breaks = np.flatnonzero(np.diff(rows[:, 0]) != period) + 1
+                spans = [[int(run[0, 0]), int(run[-1, 0]) + period] for run in np.split(rows, breaks)]
+            if entry is not None and spans:
+                entry['ranges'] = _merge_ranges(entry['ranges'] + spans)
+                self._save_index()
+        return len(rows)
+
+    def read(self, ticker, timeframe, since=None, until=None):
+        """[since, until) 구간 캔들을 (N, 6) 읽기 전용 mmap 뷰로 반환합니다. 빈 시각은 nan 행입니다."""
+        period = timeframe_ms(timeframe)
+        key = self._key(ticker, timeframe)
+        with self._lock:
+            entry = self._load_index().get(key)
+            mm = self._map(key) if entry else None
+            if mm is None:
+                return np.empty((0, ROW_FIELDS))
+            start = 0 if since is None else max(0, -(-(int(since) - entry['base']) // period))
+            end = entry['rows'] if until is None else min(entry['rows'], -(-(int(until) - entry['base']) // period))
+            view = mm[start:max(start, end)].view(np.ndarray)
+            view.flags.writeable = False
+            return view
+
+    def read_last(self, ticker, timeframe, count):
+        """저장된 마지막 count개 캔들(빈 시각 제외)"""
+        rows = self.read(ticker, timeframe)
+        rows = rows[-count * 2:] if count else rows
+        rows = rows[~np.isnan(rows[:, 0])]
+        return rows[-count:] if count else rows
+
+    def missing(self, ticker, timeframe, since, until):
+        """[since, until) 중 아직 동기화하지 않은 구간 목록"""
+        period = timeframe_ms(timeframe)
+        since = int(since) - int(since) % period
+        gaps, cursor = [], since
+        for start, end in self.ranges(ticker, timeframe):
+            if end <= cursor:
+                continue
+            if start >= until:
+                break
+            if start > cursor:
+                gaps.append((cursor, min(start, until)))
+            cursor = max(cursor, end)
+        if cursor < until:
+            gaps.append((cursor, until))
+        return gaps
+
+    def backfill(self, exchange, ticker, timeframe, since, until=None):
+        """[since, until) 중 빠진 구간만 거래소에서 받아 저장합니다. 형성 중인 캔들은 저장하지 않습니다."""
+        period = timeframe_ms(timeframe)
+        now_ms = int(time.time() * 1000)
+        last_closed_end = now_ms - now_ms % period  # 이 시각 이전 캔들만 확정
+        until = min(int(until or last_closed_end), last_closed_end)
+        fetched = 0
+        for start, end in self.missing(ticker, timeframe, since, until):
+            count = (end - start + period - 1) // period
+            rows = fetch_ohlcv_range(exchange, ticker, timeframe, start, count, period)
+            rows = [r for r in rows if start <= r[0] < end]
+            # 거래소에 캔들이 없는 시각(상장 전, 점검)도 다시 묻지 않도록 구간 전체를 동기화로 기록
+            fetched += self.write(ticker, timeframe, rows, covered=(start, end))
+        if fetched:
+            logging.info(f"{ticker} {timeframe} - Candle store backfilled {fetched} candles")
+        return fetched
+
+
+candle_store = CandleStore()
+
+
+def warm_start(exchange, ticker, timeframe, count):
+    """저장소의 캔들로 ohlcv_cache 버퍼를 채우고, 빠진 구간만 거래소에서 받아옵니다."""
+    period = timeframe_ms(timeframe)
+    now_ms = int(time.time() * 1000)
+    since = now_ms - now_ms % period - period * count
+    try:
+        candle_store.backfill(exchange, ticker, timeframe, since)
+        rows = candle_store.read_last(ticker, timeframe, count)
+    except Exception as e:
+        logging.error(f"{ticker} {timeframe} - Candle store warm start failed: {e}")
+        return 0
+    buf = ohlcv_cache.buffer(ticker, timeframe, count)
+    buf.upsert(rows)
+    buf.last_refresh = 0.0  # 다음 조회 때 형성 중 캔들부터 증분으로 갱신
+    return len(rows)
+
+
+def persist_buffers(timeframe='1m'):
+    """ohlcv_cache 버퍼의 확정 캔들을 저장소에 기록합니다."""
+    period = timeframe_ms(timeframe)
+    now_ms = int(time.time() * 1000)
+    for ticker in CONFIG['SYMBOLS']:
+        try:
+            rows = ohlcv_cache.buffer(ticker, timeframe).array()
+            rows = rows[rows[:, 0] + period <= now_ms]
+            candle_store.write(ticker, timeframe, rows)
+        except Exception as e:
+            logging.error(f"{ticker} {timeframe} - Candle store persist failed: {e}")
@@ -31,8 +31,13 @@ CONFIG = {
     'STOCH_D_THRESHOLD': 20,  # Stochastic D 임계값
     'BB_EXPANSION_THRESHOLD': 1.5,  # 볼린저 밴드 확장 임계값
     'TIMEFRAME_CONFIRMATION': True,  # 🔧 그록 권고: 다중 시간프레임 확인
+    'CONFIRMATION_TIMEFRAMES': ['5m', '15m', '1h'],  # 1분봉에서 리샘플링해 추세 확인
     'VOLUME_THRESHOLD': 1.5,  # 거래량 임계값
     'VOLUME_SPIKE_THRESHOLD': 2.0,  # 거래량 급증 임계값
+    'CANDLE_STORE_ENABLED': True,  # 확정 캔들을 디스크(mmap)에 보관해 재시작 시 빠진 구간만 조회
+    'CANDLE_STORE_DIR': 'data/candles',
+    'CANDLE_STORE_PERSIST_MINUTES': 10,  # 버퍼의 확정 캔들을 저장하는 주기 (분)
+    'INDICATOR_MEMO_SIZE': 512,  # 지표 결과 메모이즈 최대 항목 수 (LRU)
     'MAX_EXPOSURE': 3.0,  # 🔧 그록 권고: 노출 비율 제한 완화 (70% → 300%)
     'EMERGENCY_STOP_LOSS': 0.10,  # 10% 긴급 손절
     'POSITION_TIMEOUT': 1800,  # 30분 포지션 타임아웃
@@ -48,6 +53,52 @@ CONFIG = {
     'LOG_BACKUP_COUNT': 5,
     'CACHE_DURATION': 15,
     'FUNDING_CACHE_DURATION': 3600,
+    'CACHE_MAX_ENTRIES': 256,  # 캐시 구역별 최대 항목 수 (넘으면 오래 안 쓴 항목부터 제거)
+    'OHLCV_CACHE_SIZE': 1000,  # (심볼, 타임프레임)별 보관 캔들 수
+    'OHLCV_REFRESH_INTERVAL': 2,  # 이 시간(초) 안의 재요청은 보관 캔들로 응답
+    'MARKET_STREAM_ENABLED': True,  # 웹소켓 시세 스트림 사용 (끊기면 REST로 자동 전환)
+    'MARKET_STREAM_URL': 'wss://fstream.binance.com/stream',
+    'STREAM_STALE_SECONDS': 10,  # 이 시간(초) 이상 갱신이 없으면 스트림 데이터를 쓰지 않음
+    'ACCOUNT_STREAM_ENABLED': True,  # 유저 데이터 스트림으로 잔고/포지션/주문 유지
+    'ACCOUNT_STREAM_URL': 'wss://fstream.binance.com/ws',
+    'ACCOUNT_RECONCILE_INTERVAL': 300,  # REST 잔고/주문 재동기화 주기 (초)
+    'ACCOUNT_REST_MIN_INTERVAL': 5,  # 스트림이 끊겼을 때 REST 재동기화 최소 간격 (초)
+    'LISTEN_KEY_KEEPALIVE': 1800,  # listenKey 연장 주기 (초, 만료 60분)
+    'ASYNC_ENABLED': False,  # True면 모든 심볼을 asyncio로 동시에 조회하는 루프 사용
+    'ASYNC_MAX_CONCURRENCY': 10,  # 동시에 진행할 최대 REST 요청 수
+    'ASYNC_EVAL_CONCURRENCY': 4,  # 동시에 전략 평가/주문을 실행할 최대 심볼 수 (스레드)
+    'RATE_LIMIT_WEIGHT_1M': 2400,  # 바이낸스 선물 1분 요청 가중치 한도
+    'RATE_LIMIT_ORDERS_10S': 300,  # 10초 주문 수 한도
+    'RATE_LIMIT_ORDERS_1M': 1200,  # 1분 주문 수 한도
+    'RATE_LIMIT_SAFETY': 0.9,  # 한도의 90%까지만 사용
+    'RATE_LIMIT_BACKOFF': 30,  # Retry-After 헤더가 없을 때 요청 중지 시간 (초)
+    'BATCH_ORDER_LIMIT': 5,  # 배치 주문 1회 최대 개수 (바이낸스 선물 한도)
+    'BATCH_CANCEL_LIMIT': 10,  # 배치 취소 1회 최대 개수
+    'GRID_PRICE_TOLERANCE': 0.3,  # 목표 레벨과 이 비율(그리드 간격 대비) 이내 주문은 유지
+    'GRID_AMOUNT_TOLERANCE': 0.1,  # 목표 수량과 이 비율 이내 차이는 유지
+    'MARKET_SPECS_TTL': 3600,  # 마켓 스펙(호가/수량 단위, 최소 주문) 재조회 주기 (초)
+    'GRID_CLIENT_ID_PREFIX': 'grid_',  # 그리드 주문의 clientOrderId 접두어 (이 접두어 주문만 그리드 조정 대상)
+    'GRID_AMEND_ENABLED': True,  # 어긋난 주문을 취소/재주문 대신 수정(amend)으로 이동
+    'BACKTEST_INITIAL_BALANCE': 1000.0,  # 백테스트 시작 자본 (USDT)
+    'BACKTEST_MAKER_FEE': 0.0002,  # 그리드 지정가 체결 수수료
+    'BACKTEST_TAKER_FEE': 0.0005,  # 비율 조정 주문 수수료
+    'BACKTEST_FUNDING_RATE': 0.0001,  # 펀딩비 이력이 없을 때 8시간마다 적용할 펀딩비
+    'BACKTEST_SIGNAL_HORIZON': 15,  # 진입 신호 품질을 볼 이후 캔들 수
+    'SWEEP_WORKERS': None,  # 파라미터 스윕 프로세스 수 (None이면 CPU 수)
+    'SWEEP_CACHE_FILE': 'data/backtest_cache.jsonl',  # (파라미터, 데이터 구간)별 백테스트 결과 캐시
+    'WALK_FORWARD_TRAIN_DAYS': 30,  # 워크포워드 학습 구간 (일)
+    'WALK_FORWARD_TEST_DAYS': 7,  # 워크포워드 검증 구간 (일), 이만큼씩 앞으로 이동
+    'JOURNAL_FSYNC': 'interval',  # 거래 기록 fsync 정책: always(배치마다) / interval / never(OS에 맡김)
+    'JOURNAL_FLUSH_INTERVAL': 1.0,  # interval 정책의 fsync 주기 (초)
+    'FILL_STORE_DIR': 'data/fills',  # 심볼별 체결 기록(고정 레코드)과 조회 커서
+    'FILL_INGEST_MINUTES': 5,  # 새 체결을 가져오는 주기 (분)
+    'PNL_METHOD': 'average',  # 실현 손익 로트 매칭: average(평균단가, 거래소와 동일) / fifo(선입선출)
+    'NOTIFY_TRANSPORT': 'line_alert',  # 알림 전송: line_alert(텔레그램 등) / stub(메모리에 기록, 테스트용)
+    'NOTIFY_QUEUE_SIZE': 1000,  # 알림 대기열 최대 길이
+    'NOTIFY_OVERFLOW': 'drop_oldest',  # 대기열이 가득 찼을 때: drop_oldest / drop_newest / block(NOTIFY_BLOCK_TIMEOUT까지 대기 후 버림)
+    'NOTIFY_BLOCK_TIMEOUT': 0.05,  # block 정책의 최대 대기 시간 (초)
+    'NOTIFY_BATCH_WINDOW': 2.0,  # 이 시간 안에 들어온 알림을 한 메시지로 묶음 (초)
+    'NOTIFY_MAX_LENGTH': 4000,  # 한 메시지 최대 길이 (텔레그램 4096자 제한)
     'NOTIFY_COOLDOWN': 300,
     'NOTIFICATION_COOLDOWN': 300,  # 5분 알림 쿨다운
     'TRADE_FREQUENCY_TARGET': 55,  # 🔧 그록 목표: 주간 55회 매매
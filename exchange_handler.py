@@ -1,23 +1,51 @@
 # exchange_handler.py
 import ccxt
+import json
 import logging
 import time
+from collections import namedtuple
 import my_key
 from config import CONFIG
-from utils import handle_exception, invalidate_cache, save_history, can_notify
-from line_alert import SendMessage
+from utils import handle_exception, invalidate_cache, save_history, can_notify, snapshot_cache, symbol_tags
+from notifier import notify
+from account_state import AccountState
+from position_book import get_book
+from market_specs import market_specs
+import rate_limiter
+
+
+class AccountSnapshot(namedtuple('AccountSnapshot', ['timestamp', 'balance', 'positions', 'open_orders'])):
+    """한 루프 동안 공유하는 불변 계정 스냅샷 (잔고, PositionBook, 심볼별 미체결 주문)."""
+    __slots__ = ()
+
+    def position(self, ticker, position_side):
+        return self.positions.get(ticker, position_side)
+
+    def position_amount(self, ticker, position_side):
+        """포지션 수량 (항상 양수)"""
+        return self.positions.amount_of(ticker, position_side)
+
+    def position_value(self, ticker, position_side):
+        """포지션 평가 금액 (증거금 + 미실현 손익), mb.GetCoinRealMoney와 동일"""
+        return self.positions.value_of(ticker, position_side)
+
+    def orders(self, ticker):
+        return list(self.open_orders.get(ticker, ()))
+
+    @property
+    def total_usdt(self):
+        return self.balance['total']['USDT']
+
 
 class ExchangeHandler:
-    def __init__(self):
-        self.exchange = self._create_exchange()
+    def __init__(self, exchange=None):
+        self.exchange = exchange if exchange is not None else self._create_exchange()  # 시뮬레이터 등 주입 가능
+        self.account_state = None
 
     def get_position_amount(self, balance, ticker, position_side):
             """특정 심볼과 사이드의 포지션 수량을 잔고 객체에서 파싱합니다."""
-            symbol_id = ticker.replace("/", "").replace(":USDT", "")
             try:
-                for position in balance.get('info', {}).get('positions', []):
-                    if position['symbol'] == symbol_id and position['positionSide'] == position_side:
-                        return abs(float(position.get('positionAmt', 0.0))) # 항상 양수로 반환
+                return get_book(balance).amount_of(ticker, position_side) # 항상 양수로 반환
             except Exception as e:
                 logging.error(f"포지션 수량 파싱 오류: {e}")
             return 0.0
@@ -31,7 +59,7 @@ class ExchangeHandler:
                 'enableRateLimit': True,
                 'options': {'defaultType': 'future'}
             })
-            return exchange
+            return rate_limiter.install(exchange)
         except Exception as e:
             logging.error(f"거래소 객체 생성 실패: {e}")
             raise
@@ -47,6 +75,18 @@ class ExchangeHandler:
         except Exception as e:
             logging.error(f"{ticker} - 레버리지 설정 실패: {e}")
 
+    def start_account_stream(self, symbols):
+        """유저 데이터 스트림 기반 계정 상태를 시작합니다. 실패하면 REST 조회를 그대로 사용합니다."""
+        account_state = AccountState(self.exchange, symbols, CONFIG.get('ACCOUNT_STREAM_URL'))
+        if account_state.start():
+            self.account_state = account_state
+            logging.info("Account stream started.")
+
+    def stop_account_stream(self):
+        if self.account_state is not None:
+            self.account_state.stop()
+            self.account_state = None
+
     def ensure_hedge_mode(self):
         """헤지 모드를 활성화합니다."""
         try:
@@ -59,70 +99,275 @@ class ExchangeHandler:
         except Exception as e:
             handle_exception("System", "Hedge mode setting", e, "hedge_mode_error")
 
+    def _order_params(self, ticker, position_side, amount, action):
+        """주문 파라미터를 만듭니다. 청산성 주문은 포지션이 충분하면 reduceOnly를 붙입니다."""
+        params = {'positionSide': position_side}
+        is_close_order = any(keyword in action.lower() for keyword in ['close', 'stop', 'partial'])
+
+        if is_close_order:
+            # 포지션 감소 주문(reduceOnly)을 위한 로직 (원래 코드 유지)
+            posi = self.snapshot().position(ticker, position_side)
+            position_amt = float(posi.get('positionAmt', 0.0)) if posi else 0.0
+            position_exists = (position_side == 'LONG' and position_amt > 0) or \
+                              (position_side == 'SHORT' and position_amt < 0)
+            
+            if position_exists and abs(position_amt) >= amount:
+                params['reduceOnly'] = True
+                logging.info(f"ReduceOnly applied for {action}")
+        return params
+
+    def _record_order(self, ticker, order, position_side, price, amount, action):
+        """체결 대기 주문을 계정 상태와 거래 기록에 반영합니다."""
+        if self.account_state is not None:
+            self.account_state.on_order_created(ticker, order)
+        save_history({
+            'timestamp': time.time(),
+            'ticker': ticker,
+            'action': action.lower().replace(' ', '_'),
+            'side': position_side.lower(),
+            'price': price,
+            'amount': amount
+        })
+
     def place_order(self, ticker, side, position_side, amount, price, action, notify_type):
         """주문을 실행합니다."""
+        params = {'positionSide': position_side}
         try:
-            params = {'positionSide': position_side}
-            is_close_order = any(keyword in action.lower() for keyword in ['close', 'stop', 'partial'])
-
-            if is_close_order:
-                # 포지션 감소 주문(reduceOnly)을 위한 로직 (원래 코드 유지)
-                balance = self.exchange.fetch_balance(params={"type": "future"})
-                symbol_id = ticker.replace("/", "").replace(":USDT", "")
-                position_exists = False
-                position_amt = 0.0
-                
-                for posi in balance['info']['positions']:
-                    if posi['symbol'] == symbol_id and posi['positionSide'] == position_side:
-                        position_amt = float(posi.get('positionAmt', 0.0))
-                        if (position_side == 'LONG' and position_amt > 0) or \
-                           (position_side == 'SHORT' and position_amt < 0):
-                            position_exists = True
-                            break
-                
-                if position_exists and abs(position_amt) >= amount:
-                    params['reduceOnly'] = True
-                    logging.info(f"ReduceOnly applied for {action}")
+            params = self._order_params(ticker, position_side, amount, action)
             
             # 주문 실행
-            self.exchange.create_order(ticker, 'LIMIT', side, amount, price, params)
+            order = self.exchange.create_order(ticker, 'LIMIT', side, amount, price, params)
             invalidate_cache(ticker, position_side)
             logging.info(f"{action} order for {ticker}: Price {price}, Amount {amount}")
 
             if can_notify(ticker, notify_type):
-                SendMessage(f"[{ticker}] {action}: {price:,.0f} USDT")
+                notify(f"[{ticker}] {action}: {price:,.0f} USDT", key=(ticker, notify_type))
             
-            save_history({
-                'timestamp': time.time(),
-                'ticker': ticker,
-                'action': action.lower().replace(' ', '_'),
-                'side': position_side.lower(),
-                'price': price,
-                'amount': amount
-            })
+            self._record_order(ticker, order, position_side, price, amount, action)
         except ccxt.InvalidOrder as e:
             error_details = f"Order details: side={side}, position_side={position_side}, amount={amount}, price={price}, params={params}"
             logging.error(f"{ticker} - {action} invalid order: {e} | {error_details}")
             handle_exception(ticker, f"{action} invalid order", e, f"{notify_type}_invalid")
         except ccxt.InsufficientFunds as e:
             handle_exception(ticker, f"{action} insufficient funds", e, f"{notify_type}_funds")
-        except ccxt.RateLimitExceeded:
-            logging.error(f"Rate limit exceeded for {action}, waiting 60s")
-            time.sleep(60)
+        except rate_limiter.RATE_LIMIT_ERRORS:
+            # 고정 대기 대신 제한기가 Retry-After 동안 이후 요청을 늦춘다 (fetch2 래퍼에서 이미 표시)
+            logging.error(f"Rate limit exceeded for {action}, requests paused for {rate_limiter.limiter.blocked_for():.0f}s")
         except Exception as e:
             handle_exception(ticker, action, e, notify_type)
 
+    def place_orders(self, ticker, orders, notify_type):
+        """여러 지정가 주문을 배치 API로 실행합니다.
+
+        orders: [{'side', 'position_side', 'amount', 'price', 'action'(, 'client_id')}, ...]
+        BATCH_ORDER_LIMIT개씩 나눠 보내고, 입력 순서대로 [{'request', 'order', 'error'}]를 반환합니다.
+        일부 주문이 거절되어도 나머지는 그대로 진행합니다.
+        """
+        results = []
+        if not orders:
+            return results
+        market = self.exchange.market(ticker)
+        chunk_size = CONFIG.get('BATCH_ORDER_LIMIT', 5)
+
+        for start in range(0, len(orders), chunk_size):
+            chunk = orders[start:start + chunk_size]
+            chunk_results, payload, sent = [], [], []
+            for req in chunk:
+                result = {'request': req, 'order': None, 'error': None}
+                chunk_results.append(result)
+                try:
+                    # 한 건의 정밀도/파라미터 오류(스냅샷 조회 실패 포함)는 그 건만 실패로 기록한다
+                    params = self._order_params(ticker, req['position_side'], req['amount'], req['action'])
+                    item = {
+                        'symbol': market['id'],
+                        'side': req['side'].upper(),
+                        'positionSide': req['position_side'],
+                        'type': 'LIMIT',
+                        'timeInForce': 'GTC',
+                        'quantity': self.amount_to_precision(ticker, req['amount']),
+                        'price': self.price_to_precision(ticker, req['price']),
+                    }
+                except Exception as e:
+                    result['error'] = str(e)
+                    continue
+                if params.get('reduceOnly'):
+                    item['reduceOnly'] = 'true'
+                if req.get('client_id'):
+                    item['newClientOrderId'] = req['client_id']
+                payload.append(item)
+                sent.append(result)
+            results += chunk_results
+            if not payload:
+                continue
+
+            try:
+                responses = self.exchange.fapiPrivatePostBatchOrders({'batchOrders': json.dumps(payload)})
+            except rate_limiter.RATE_LIMIT_ERRORS:
+                logging.error(f"{ticker} - Rate limit exceeded for batch orders, requests paused for {rate_limiter.limiter.blocked_for():.0f}s")
+                for result in sent:
+                    result['error'] = 'rate limit exceeded'
+                results += [{'request': req, 'order': None, 'error': 'rate limit exceeded'} for req in orders[start + chunk_size:]]
+                break
+            except Exception as e:
+                handle_exception(ticker, "Batch order", e, notify_type)
+                for result in sent:
+                    result['error'] = str(e)
+                continue
+
+            for result, raw in zip(sent, responses):
+                req = result['request']
+                if 'orderId' not in raw:
+                    result['error'] = f"{raw.get('code')}: {raw.get('msg')}"
+                    continue
+                order = self.exchange.parse_order(raw, market)
+                self._record_order(ticker, order, req['position_side'], req['price'], req['amount'], req['action'])
+                result['order'] = order
+
+        placed = [r for r in results if r['order'] is not None]
+        failed = [r for r in results if r['order'] is None]
+        for position_side in {r['request']['position_side'] for r in placed}:
+            invalidate_cache(ticker, position_side)
+        logging.info(f"{ticker} - Batch orders: {len(placed)} placed, {len(failed)} failed")
+
+        for r in failed:
+            req = r['request']
+            logging.error(f"{ticker} - {req['action']} rejected: {r['error']} | side={req['side']}, position_side={req['position_side']}, amount={req['amount']}, price={req['price']}")
+        if failed and can_notify(ticker, f"{notify_type}_invalid"):
+            notify(f"[{ticker}] 배치 주문 {len(failed)}건 실패: {failed[0]['error'][:50]}", key=(ticker, f"{notify_type}_invalid"))
+        if placed and can_notify(ticker, notify_type):
+            notify(f"[{ticker}] {placed[0]['request']['action']} 등 {len(placed)}건 주문", key=(ticker, notify_type))
+        return results
+
+    def cancel_orders(self, order_ids, ticker):
+        """여러 주문을 배치 API로 취소합니다. {order_id: None(성공) 또는 오류 메시지}를 반환합니다."""
+        results = {}
+        if not order_ids:
+            return results
+        market_id = self.exchange.market(ticker)['id']
+        chunk_size = CONFIG.get('BATCH_CANCEL_LIMIT', 10)
+
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = [str(order_id) for order_id in order_ids[start:start + chunk_size]]
+            try:
+                responses = self.exchange.fapiPrivateDeleteBatchOrders({
+                    'symbol': market_id,
+                    'orderIdList': json.dumps([int(order_id) for order_id in chunk]),
+                })
+            except Exception as e:
+                logging.error(f"{ticker} - Batch cancel failed: {e}")
+                results.update({order_id: str(e) for order_id in chunk})
+                continue
+            for order_id, raw in zip(chunk, responses):
+                if 'orderId' in raw:
+                    results[order_id] = None
+                    if self.account_state is not None:
+                        self.account_state.on_order_canceled(ticker, order_id)
+                else:
+                    results[order_id] = f"{raw.get('code')}: {raw.get('msg')}"
+
+        invalidate_cache(ticker, 'LONG')
+        invalidate_cache(ticker, 'SHORT')
+        return results
+
+    def amend_orders(self, ticker, amends):
+        """미체결 지정가 주문의 가격/수량을 배치 API로 수정합니다. 취소 후 재주문보다 요청 수가 적습니다.
+
+        amends: [{'id', 'side', 'position_side', 'amount', 'price'}, ...]
+        입력 순서대로 [{'request', 'order', 'error'}]를 반환합니다.
+        """
+        results = []
+        if not amends:
+            return results
+        market = self.exchange.market(ticker)
+        chunk_size = CONFIG.get('BATCH_ORDER_LIMIT', 5)
+
+        for start in range(0, len(amends), chunk_size):
+            chunk = amends[start:start + chunk_size]
+            payload = [{
+                'orderId': int(req['id']),
+                'symbol': market['id'],
+                'side': req['side'].upper(),
+                'quantity': self.amount_to_precision(ticker, req['amount']),
+                'price': self.price_to_precision(ticker, req['price']),
+            } for req in chunk]
+            try:
+                responses = self.exchange.fapiPrivatePutBatchOrders({'batchOrders': json.dumps(payload)})
+            except Exception as e:
+                logging.error(f"{ticker} - Batch amend failed: {e}")
+                results += [{'request': req, 'order': None, 'error': str(e)} for req in chunk]
+                continue
+            for req, raw in zip(chunk, responses):
+                if 'orderId' not in raw:
+                    results.append({'request': req, 'order': None, 'error': f"{raw.get('code')}: {raw.get('msg')}"})
+                    continue
+                order = self.exchange.parse_order(raw, market)
+                if self.account_state is not None:
+                    self.account_state.on_order_created(ticker, order)
+                results.append({'request': req, 'order': order, 'error': None})
+
+        for position_side in {r['request']['position_side'] for r in results if r['order'] is not None}:
+            invalidate_cache(ticker, position_side)
+        for r in results:
+            if r['error'] is not None:
+                logging.error(f"{ticker} - Amend of order {r['request']['id']} rejected: {r['error']}")
+        return results
+
+    def snapshot(self):
+        """현재 루프의 계정 스냅샷을 반환합니다.
+
+        잔고/포지션은 루프마다 한 번 조회하고, 미체결 주문은 심볼별로 보관해 주문/취소한 심볼만 다시 조회합니다.
+        여러 심볼을 동시에 처리해도 무효화 후 첫 호출자만 조회하고 나머지는 그 결과를 받습니다.
+        """
+        account = snapshot_cache.get_or_load('account', self._build_snapshot)
+        open_orders = {t: self._symbol_orders(t) for t in CONFIG['SYMBOLS']}
+        return account._replace(open_orders=open_orders)
+
+    def _build_snapshot(self):
+        balance = self.fetch_balance()
+        return AccountSnapshot(time.time(), balance, get_book(balance), {})
+
+    def _symbol_orders(self, ticker):
+        return snapshot_cache.get_or_load(('orders', ticker), lambda: tuple(self.fetch_open_orders(ticker)), tags=symbol_tags(ticker))
+
+    def refresh_snapshot(self, snapshot=None):
+        """루프 시작 시 호출하여 새 스냅샷을 만듭니다. 이미 조회한 스냅샷을 넘기면 그대로 사용합니다."""
+        snapshot_cache.clear()
+        if snapshot is not None:
+            snapshot_cache.set('account', snapshot._replace(open_orders={}))
+            for ticker, orders in snapshot.open_orders.items():
+                snapshot_cache.set(('orders', ticker), tuple(orders), tags=symbol_tags(ticker))
+            return snapshot
+        return self.snapshot()
+
     def fetch_balance(self):
+        if self.account_state is not None:
+            return self.account_state.balance()
         return self.exchange.fetch_balance(params={"type": "future"})
 
     def fetch_open_orders(self, ticker):
+        if self.account_state is not None and ticker in self.account_state.symbols:
+            return self.account_state.open_orders(ticker)
         return self.exchange.fetch_open_orders(ticker)
 
     def cancel_order(self, order_id, ticker):
-        return self.exchange.cancel_order(order_id, ticker)
+        result = self.exchange.cancel_order(order_id, ticker)
+        if self.account_state is not None:
+            self.account_state.on_order_canceled(ticker, order_id)
+        snapshot_cache.invalidate_tag(ticker)
+        return result
         
     def create_market_order(self, ticker, side, amount, params):
-        return self.exchange.create_market_order(ticker, side, amount, params)
+        order = self.exchange.create_market_order(ticker, side, amount, params)
+        snapshot_cache.invalidate('account')  # 시장가는 바로 체결되어 포지션/잔고가 바뀐다
+        return order
 
     def price_to_precision(self, ticker, price):
-        return self.exchange.price_to_precision(ticker, price)
\ No newline at end of file
+        """호가 단위로 맞춘 가격 문자열. 로컬 마켓 스펙 테이블로 계산합니다."""
+        return market_specs.ensure(self.exchange).price_str(ticker, price)
+
+    def amount_to_precision(self, ticker, amount):
+        """수량 단위로 내림한 수량 문자열. 0이 되면 ccxt와 같이 InvalidOrder를 냅니다."""
+        specs = market_specs.ensure(self.exchange)
+        if specs.round_amount(ticker, amount) <= 0:
+            raise ccxt.InvalidOrder(f"{ticker} amount of {amount} must be greater than minimum amount precision of {specs.spec(ticker)[1]}")
+        return specs.amount_str(ticker, amount)
\ No newline at end of file
@@ -0,0 +1,617 @@
+# exchange_simulator.py
+import json
+import logging
+import threading
+import time
+import ccxt
+import numpy as np
+from config import CONFIG
+from position_book import symbol_id
+from resampler import timeframe_ms
+
+# 캔들 하나를 4개 가격 지점으로 나눠 재생: 양봉은 시가→저가→고가→종가, 음봉은 시가→고가→저가→종가
+TICKS_PER_CANDLE = 4
+DEFAULT_SPEC = (0.01, 0.001, 0.001, 20.0)  # (호가 단위, 수량 단위, 최소 수량, 최소 주문 금액) - ETHUSDT 기준
+ORDER_TYPES = ('LIMIT', 'MARKET', 'STOP_MARKET', 'TRAILING_STOP_MARKET')
+
+
+def _fmt(value):
+    return f"{value:.8f}".rstrip('0').rstrip('.') or '0'
+
+
+class SimulatedExchange:
+    """봇이 쓰는 ccxt binance(USDⓈ-M 선물) 메서드만 구현한 메모리 거래소입니다.
+
+    심볼별 1분봉 (N, 6) 배열을 가격 경로로 재생하며, advance()로 시간을 진행할 때마다
+    미체결 주문(지정가/스탑 마켓/트레일링 스탑)을 체결하고 헤지 모드 포지션, 수수료, 펀딩을 반영합니다.
+    모든 조회는 네트워크 없이 메모리에서 응답하므로 ExchangeHandler와 main.process_tickers를 오프라인으로 돌릴 수 있습니다.
+    """
+
+    def __init__(self, candles, balance=10000.0, specs=None, maker_fee=None, taker_fee=None,
+                 funding_rate=None, leverage=None, hedge_mode=True, timeframe='1m', start=0):
+        self.timeframe = timeframe
+        self.period_ms = timeframe_ms(timeframe)
+        self.candles = {t: np.asarray(rows, dtype=float) for t, rows in candles.items()}
+        self.length = min(len(rows) for rows in self.candles.values())
+        self.maker_fee = maker_fee if maker_fee is not None else CONFIG.get('BACKTEST_MAKER_FEE', 0.0002)
+        self.taker_fee = taker_fee if taker_fee is not None else CONFIG.get('BACKTEST_TAKER_FEE', 0.0005)
+        self.funding_rate = funding_rate if funding_rate is not None else CONFIG.get('BACKTEST_FUNDING_RATE', 0.0001)
+        self.markets = {t: self._make_market(t, (specs or {}).get(t, DEFAULT_SPEC)) for t in self.candles}
+        self.markets_by_id = {m['id']: m for m in self.markets.values()}
+        self.dual_side = hedge_mode
+        self.leverage = {t: leverage or CONFIG['LEVERAGE'] for t in self.candles}
+        self.wallet = float(balance)
+        self.fees_paid = 0.0
+        self.funding_paid = 0.0
+        self.realized_pnl = 0.0
+        self.positions = {(t, side): [0.0, 0.0] for t in self.candles for side in ('LONG', 'SHORT', 'BOTH')}  # [수량, 평단]
+        self.orders = {}  # orderId(int) -> 원본(바이낸스 응답 형식) 주문 dict
+        self.trades = []  # 체결 기록 (ccxt trade 형식)
+        self.incomes = []  # 펀딩비 내역 (바이낸스 income 형식)
+        self.last_response_headers = {}
+        self.requests = 0  # 처리한 API 호출 수 (벤치마크용)
+        self._next_id = 1
+        self._lock = threading.RLock()
+        self.cursor = start  # 현재 캔들 위치
+        self.tick = TICKS_PER_CANDLE - 1  # 현재 캔들 안의 가격 지점 (시작은 종가)
+        self._paths = {t: self._price_paths(rows) for t, rows in self.candles.items()}
+        self._last_funding = self._funding_slot(self.milliseconds())
+
+    # --- 가격 경로 / 시계 ---
+    @staticmethod
+    def _price_paths(rows):
+        """(N, 4) 캔들별 가격 경로"""
+        o, h, l, c = rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4]
+        up = c >= o
+        return np.column_stack([o, np.where(up, l, h), np.where(up, h, l), c])
+
+    def milliseconds(self):
+        """시뮬레이션 시계 (ms). ohlcv_cache 등은 이 값을 거래소 시각으로 씁니다."""
+        return int(self.candles[next(iter(self.candles))][self.cursor, 0]) + self.tick * self.period_ms // TICKS_PER_CANDLE
+
+    def seconds(self):
+        return self.milliseconds() // 1000
+
+    def price(self, ticker):
+        return float(self._paths[ticker][self.cursor, self.tick])
+
+    @property
+    def finished(self):
+        return self.cursor >= self.length - 1 and self.tick == TICKS_PER_CANDLE - 1
+
+    def advance(self, ticks=1):
+        """가격 지점을 ticks개 진행하며 지나간 가격 구간으로 주문을 체결합니다. 더 진행할 수 없으면 False"""
+        with self._lock:
+            for _ in range(ticks):
+                if self.finished:
+                    return False
+                previous = {t: self.price(t) for t in self.candles}
+                self.tick += 1
+                if self.tick == TICKS_PER_CANDLE:
+                    self.cursor += 1
+                    self.tick = 0
+                self._apply_funding()
+                for ticker, start_price in previous.items():
+                    self._match(ticker, start_price, self.price(ticker))
+            return True
+
+    def _funding_slot(self, ms):
+        return ms // (8 * 3_600_000)
+
+    def _apply_funding(self):
+        slot = self._funding_slot(self.milliseconds())
+        if slot == self._last_funding:
+            return
+        self._last_funding = slot
+        for (ticker, side), (qty, _) in self.positions.items():
+            if qty:
+                sign = -1.0 if side == 'SHORT' else 1.0
+                payment = sign * qty * self.price(ticker) * self.funding_rate
+                self.wallet -= payment
+                self.funding_paid += payment
+                self.incomes.append({'symbol': symbol_id(ticker), 'incomeType': 'FUNDING_FEE', 'income': _fmt(-payment),
+                                     'asset': 'USDT', 'time': self.milliseconds(), 'tranId': len(self.incomes) + 1, 'tradeId': ''})
+
+    # --- 마켓 정보 ---
+    def _make_market(self, ticker, spec):
+        tick, step, min_qty, min_notional = spec
+        market_id = symbol_id(ticker)
+        return {
+            'id': market_id, 'symbol': ticker, 'type': 'swap', 'linear': True, 'contract': True, 'contractSize': 1.0,
+            'base': market_id[:-4], 'quote': 'USDT', 'settle': 'USDT', 'active': True,
+            'precision': {'price': tick, 'amount': step},
+            'limits': {'amount': {'min': min_qty}, 'cost': {'min': min_notional}},
+            'info': {'symbol': market_id, 'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': _fmt(tick)},
+                {'filterType': 'LOT_SIZE', 'stepSize': _fmt(step), 'minQty': _fmt(min_qty)},
+                {'filterType': 'MIN_NOTIONAL', 'notional': _fmt(min_notional)},
+            ]},
+        }
+
+    def load_markets(self, reload=False):
+        return self.markets
+
+    def market(self, symbol):
+        market = self.markets.get(symbol) or self.markets_by_id.get(symbol)
+        if market is None:
+            raise ccxt.BadSymbol(f"simulator does not have market symbol {symbol}")
+        return market
+
+    def parse_timeframe(self, timeframe):
+        return timeframe_ms(timeframe) // 1000
+
+    def price_to_precision(self, symbol, price):
+        tick = self.market(symbol)['precision']['price']
+        return _fmt(round(float(price) / tick) * tick)
+
+    def amount_to_precision(self, symbol, amount):
+        market = self.market(symbol)
+        step = market['precision']['amount']
+        value = np.floor(float(amount) / step + 1e-9) * step  # 바이낸스 수량은 내림
+        if value <= 0:
+            raise ccxt.InvalidOrder(f"{symbol} amount of {amount} must be greater than minimum amount precision of {step}")
+        return _fmt(value)
+
+    # --- 시세 ---
+    def fetch_ticker(self, symbol, params={}):
+        self.requests += 1
+        price = self.price(symbol)
+        return {'symbol': symbol, 'timestamp': self.milliseconds(), 'last': price, 'close': price,
+                'bid': price, 'ask': price, 'info': {'symbol': symbol_id(symbol), 'lastPrice': _fmt(price)}}
+
+    def fetch_tickers(self, symbols=None, params={}):
+        return {t: self.fetch_ticker(t) for t in (symbols or self.candles)}
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        """현재 시각까지의 캔들 (마지막은 형성 중 캔들). 상위 타임프레임은 1분봉을 묶어 만듭니다."""
+        self.requests += 1
+        candles = self.candles[symbol]
+        period = timeframe_ms(timeframe)
+        ratio = max(1, period // self.period_ms)
+        # 요청 구간에 해당하는 1분봉만 복사 (전체 이력을 매번 복사하지 않음)
+        if since is not None:
+            start = int(np.searchsorted(candles[:self.cursor + 1, 0], since - since % period))
+        else:
+            start = max(0, self.cursor + 1 - (limit or 500) * ratio - ratio)
+        rows = candles[start:self.cursor + 1].copy()
+        if len(rows) == 0:
+            return []
+        path = self._paths[symbol][self.cursor, :self.tick + 1]
+        rows[-1, 2], rows[-1, 3], rows[-1, 4] = path.max(), path.min(), path[-1]
+        rows[-1, 5] *= (self.tick + 1) / TICKS_PER_CANDLE
+        if period != self.period_ms:
+            rows = self._resample(rows, period)
+        if since is not None:
+            rows = rows[rows[:, 0] >= since]
+            rows = rows[:limit] if limit else rows
+        elif limit:
+            rows = rows[-limit:]
+        return rows.tolist()
+
+    @staticmethod
+    def _resample(rows, period):
+        buckets = rows[:, 0].astype(np.int64) // period
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ends = np.append(starts[1:], len(rows)) - 1
+        return np.column_stack([
+            buckets[starts] * period, rows[starts, 1],
+            np.maximum.reduceat(rows[:, 2], starts), np.minimum.reduceat(rows[:, 3], starts),
+            rows[ends, 4], np.add.reduceat(rows[:, 5], starts),
+        ])
+
+    def fapiPublicGetPremiumIndex(self, params={}):
+        ticker = self.market(params['symbol'])['symbol']
+        return {'symbol': params['symbol'], 'markPrice': _fmt(self.price(ticker)),
+                'lastFundingRate': _fmt(self.funding_rate),
+                'nextFundingTime': (self._last_funding + 1) * 8 * 3_600_000}
+
+    def fetch_funding_rate(self, symbol, params={}):
+        return {'symbol': symbol, 'fundingRate': self.funding_rate, 'markPrice': self.price(symbol),
+                'fundingTimestamp': (self._last_funding + 1) * 8 * 3_600_000}
+
+    # --- 계정 설정 ---
+    def fetch_leverage(self, symbol, params={}):
+        leverage = self.leverage[self.market(symbol)['symbol']]
+        return {'symbol': symbol, 'marginMode': 'cross', 'longLeverage': leverage, 'shortLeverage': leverage}
+
+    def set_leverage(self, leverage, symbol=None, params={}):
+        self.leverage[self.market(symbol)['symbol']] = int(leverage)
+        return {'symbol': symbol_id(symbol), 'leverage': int(leverage)}
+
+    def fapiPrivateGetPositionSideDual(self, params={}):
+        return {'dualSidePosition': self.dual_side}
+
+    def fapiPrivatePostPositionSideDual(self, params={}):
+        dual = str(params.get('dualSidePosition')).lower() == 'true'
+        if dual != self.dual_side and (any(q for q, _ in self.positions.values()) or self.orders):
+            raise ccxt.ExchangeError('binance {"code":-4068,"msg":"Position side cannot be changed if there exists position."}')
+        self.dual_side = dual
+        return {'code': 200, 'msg': 'success'}
+
+    # --- 잔고 / 포지션 ---
+    def _unrealized(self, ticker, side):
+        qty, entry = self.positions[(ticker, side)]
+        if not qty:
+            return 0.0
+        return qty * (self.price(ticker) - entry) * (-1.0 if side == 'SHORT' else 1.0)
+
+    def _position_margin(self):
+        return sum(q * self.price(t) / self.leverage[t] for (t, _), (q, _) in self.positions.items() if q)
+
+    def _order_margin(self):
+        """청산성이 아닌 미체결 지정가 주문이 잡고 있는 증거금"""
+        total = 0.0
+        for o in self.orders.values():
+            if o['type'] == 'LIMIT' and not o['reduceOnly']:
+                ticker = self.markets_by_id[o['symbol']]['symbol']
+                total += (float(o['origQty']) - float(o['executedQty'])) * float(o['price']) / self.leverage[ticker]
+        return total
+
+    def available_balance(self):
+        unrealized = sum(self._unrealized(t, s) for (t, s) in self.positions)
+        return self.wallet + unrealized - self._position_margin() - self._order_margin()
+
+    def _position_info(self, ticker, side):
+        qty, entry = self.positions[(ticker, side)]
+        price = self.price(ticker)
+        amount = -qty if side == 'SHORT' else qty
+        margin = qty * price / self.leverage[ticker]
+        return {
+            'symbol': symbol_id(ticker), 'positionSide': side, 'positionAmt': _fmt(amount), 'entryPrice': _fmt(entry),
+            'markPrice': _fmt(price), 'unrealizedProfit': _fmt(self._unrealized(ticker, side)),
+            'initialMargin': _fmt(margin), 'positionInitialMargin': _fmt(margin), 'openOrderInitialMargin': '0',
+            'maintMargin': _fmt(margin * 0.1), 'leverage': str(self.leverage[ticker]), 'isolated': False,
+            'notional': _fmt(amount * price), 'updateTime': self.milliseconds(),
+        }
+
+    def fetch_balance(self, params={}):
+        self.requests += 1
+        with self._lock:
+            sides = ('LONG', 'SHORT') if self.dual_side else ('BOTH',)
+            positions = [self._position_info(t, s) for t in self.candles for s in sides]
+            unrealized = sum(float(p['unrealizedProfit']) for p in positions)
+            available = self.available_balance()
+        total = self.wallet + unrealized
+        info = {
+            'totalWalletBalance': _fmt(self.wallet), 'totalUnrealizedProfit': _fmt(unrealized),
+            'totalMarginBalance': _fmt(total), 'availableBalance': _fmt(available), 'maxWithdrawAmount': _fmt(available),
+            'assets': [{'asset': 'USDT', 'walletBalance': _fmt(self.wallet), 'marginBalance': _fmt(total),
+                        'availableBalance': _fmt(available)}],
+            'positions': positions,
+        }
+        usdt = {'free': available, 'used': total - available, 'total': total}
+        return {'info': info, 'USDT': usdt, 'free': {'USDT': usdt['free']}, 'used': {'USDT': usdt['used']},
+                'total': {'USDT': usdt['total']}, 'timestamp': self.milliseconds()}
+
+    # --- 주문 ---
+    def parse_order(self, raw, market=None):
+        """바이낸스 원본 주문 응답을 ccxt 주문 dict로 변환합니다."""
+        market = market or self.market(raw['symbol'])
+        amount = float(raw['origQty'])
+        filled = float(raw['executedQty'])
+        status = {'NEW': 'open', 'PARTIALLY_FILLED': 'open', 'FILLED': 'closed'}.get(raw['status'], 'canceled')
+        return {
+            'id': str(raw['orderId']), 'clientOrderId': raw.get('clientOrderId'), 'timestamp': raw['updateTime'],
+            'symbol': market['symbol'], 'type': raw['type'].lower(), 'side': raw['side'].lower(),
+            'price': float(raw['price']), 'stopPrice': float(raw.get('stopPrice') or 0.0),
+            'average': float(raw.get('avgPrice') or 0.0) or None,
+            'amount': amount, 'filled': filled, 'remaining': amount - filled, 'status': status,
+            'reduceOnly': raw['reduceOnly'], 'postOnly': False, 'info': raw,
+        }
+
+    def _error(self, code, msg):
+        return {'code': code, 'msg': msg}
+
+    def _new_order(self, ticker, order_type, side, amount, price, params):
+        """주문을 검증해 등록하고 원본 응답을 반환합니다. 거절되면 {'code', 'msg'}"""
+        market = self.market(ticker)
+        ticker = market['symbol']
+        order_type = order_type.upper()
+        side = side.upper()
+        position_side = params.get('positionSide', 'BOTH')
+        reduce_only = str(params.get('reduceOnly', False)).lower() == 'true' or params.get('closePosition') in (True, 'true')
+        if order_type not in ORDER_TYPES:
+            return self._error(-1116, 'Invalid orderType.')
+        if (position_side == 'BOTH') == self.dual_side:
+            return self._error(-4061, "Order's position side does not match user's setting.")
+        if self.dual_side:
+            # 헤지 모드: 롱 매도/숏 매수는 청산 주문
+            closing = (position_side == 'LONG') == (side == 'SELL')
+            if params.get('reduceOnly') is not None and closing:
+                return self._error(-1106, "Parameter 'reduceonly' sent when not required.")
+            reduce_only = reduce_only or closing
+
+        step, min_qty = market['precision']['amount'], market['limits']['amount']['min']
+        qty = np.floor(float(amount) / step + 1e-9) * step
+        if qty < min_qty:
+            return self._error(-4003, 'Quantity less than or equal to zero.' if qty <= 0 else 'Quantity less than min qty.')
+        current = self.price(ticker)
+        if order_type == 'LIMIT':
+            if price is None or float(price) <= 0:
+                return self._error(-4014, 'Price not increased by tick size.')
+            price = float(self.price_to_precision(ticker, price))
+        reference = price if order_type == 'LIMIT' else current
+        if not reduce_only and qty * reference < market['limits']['cost']['min']:
+            return self._error(-4164, f"Order's notional must be no smaller than {_fmt(market['limits']['cost']['min'])} (unless you choose reduce only).")
+        if not reduce_only and qty * reference / self.leverage[ticker] > self.available_balance():
+            return self._error(-2019, 'Margin is insufficient.')
+
+        stop_price = float(params.get('stopPrice') or 0.0)
+        if order_type == 'STOP_MARKET' and stop_price <= 0:
+            return self._error(-1102, "Mandatory parameter 'stopPrice' was not sent.")
+        callback = float(params.get('callbackRate') or 0.0)
+        if order_type == 'TRAILING_STOP_MARKET' and not 0.1 <= callback <= 10:
+            return self._error(-2007, 'Invalid callBack rate.')
+
+        order_id = self._next_id
+        self._next_id += 1
+        raw = {
+            'orderId': order_id, 'symbol': market['id'], 'status': 'NEW', 'clientOrderId': params.get('newClientOrderId', f"sim_{order_id}"),
+            'price': _fmt(price or 0.0), 'avgPrice': '0', 'origQty': _fmt(qty), 'executedQty': '0', 'cumQuote': '0',
+            'timeInForce': params.get('timeInForce', 'GTC'), 'type': order_type, 'origType': order_type,
+            'reduceOnly': reduce_only, 'closePosition': params.get('closePosition') in (True, 'true'),
+            'side': side, 'positionSide': position_side, 'stopPrice': _fmt(stop_price),
+            'priceRate': _fmt(callback), 'activatePrice': _fmt(float(params.get('activationPrice') or 0.0)),
+            'workingType': 'CONTRACT_PRICE', 'updateTime': self.milliseconds(),
+        }
+        if order_type == 'TRAILING_STOP_MARKET':
+            raw['_extreme'] = None  # 활성화 이후 최고가(매도)/최저가(매수)
+        self.orders[order_id] = raw
+
+        # 즉시 체결 가능한 주문: 시장가, 현재가를 넘어선 지정가
+        if order_type == 'MARKET':
+            self._fill(raw, current, taker=True)
+        elif order_type == 'LIMIT' and ((side == 'BUY' and price >= current) or (side == 'SELL' and price <= current)):
+            self._fill(raw, current, taker=True)
+        return self._public(raw)
+
+    @staticmethod
+    def _public(raw):
+        return {k: v for k, v in raw.items() if not k.startswith('_')}
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self.requests += 1
+        with self._lock:
+            raw = self._new_order(symbol, type, side, amount, price, params)
+        if 'orderId' not in raw:
+            error = ccxt.InsufficientFunds if raw['code'] == -2019 else ccxt.InvalidOrder
+            raise error(f"binance {json.dumps(raw)}")
+        return self.parse_order(raw)
+
+    def create_market_order(self, symbol, side, amount, params={}):
+        return self.create_order(symbol, 'MARKET', side, amount, None, params)
+
+    def _cancel(self, order_id):
+        raw = self.orders.pop(int(order_id), None)
+        if raw is None:
+            return self._error(-2011, 'Unknown order sent.')
+        raw['status'] = 'CANCELED'
+        raw['updateTime'] = self.milliseconds()
+        return self._public(raw)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self.requests += 1
+        with self._lock:
+            raw = self._cancel(id)
+        if 'orderId' not in raw:
+            raise ccxt.OrderNotFound(f"binance {json.dumps(raw)}")
+        return self.parse_order(raw)
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self.requests += 1
+        market_id = self.market(symbol)['id'] if symbol else None
+        with self._lock:
+            return [self.parse_order(self._public(o)) for o in self.orders.values()
+                    if market_id is None or o['symbol'] == market_id]
+
+    def fetch_orders(self, symbol=None, since=None, limit=None, params={}):
+        return self.fetch_open_orders(symbol, since, limit, params)
+
+    def fapiPrivateGetUserTrades(self, params={}):
+        """체결 내역 (바이낸스 원본 형식). fromId가 없으면 최근 limit건"""
+        self.requests += 1
+        market = self.market(params['symbol'])
+        limit = int(params.get('limit', 500))
+        trades = [t for t in self.trades if t['symbol'] == market['symbol'] and int(t['id']) >= int(params.get('fromId', 0))]
+        trades = trades[:limit] if 'fromId' in params else trades[-limit:]
+        return [{
+            'id': int(t['id']), 'orderId': t['info']['orderId'], 'symbol': market['id'], 'side': t['side'].upper(),
+            'positionSide': t['info']['positionSide'], 'price': _fmt(t['price']), 'qty': _fmt(t['amount']),
+            'quoteQty': _fmt(t['cost']), 'commission': _fmt(t['fee']['cost']), 'commissionAsset': 'USDT',
+            'realizedPnl': t['info']['realizedPnl'], 'time': t['timestamp'],
+            'maker': t['takerOrMaker'] == 'maker', 'buyer': t['side'] == 'buy',
+        } for t in trades]
+
+    def fapiPrivateGetIncome(self, params={}):
+        """손익 내역 (펀딩비만 기록). startTime이 없으면 최근 limit건"""
+        self.requests += 1
+        limit = int(params.get('limit', 100))
+        incomes = [i for i in self.incomes if i['symbol'] == params.get('symbol', i['symbol'])
+                   and i['incomeType'] == params.get('incomeType', i['incomeType'])
+                   and i['time'] >= int(params.get('startTime', 0))]
+        return incomes[:limit] if 'startTime' in params else incomes[-limit:]
+
+    # --- 배치 API (바이낸스 원본 형식) ---
+    def fapiPrivatePostBatchOrders(self, params={}):
+        self.requests += 1
+        responses = []
+        with self._lock:
+            for item in json.loads(params['batchOrders']):
+                order_params = {k: item[k] for k in ('positionSide', 'reduceOnly', 'stopPrice', 'callbackRate',
+                                                     'activationPrice', 'timeInForce', 'newClientOrderId') if k in item}
+                responses.append(self._new_order(item['symbol'], item['type'], item['side'], item['quantity'],
+                                                 item.get('price'), order_params))
+        return responses
+
+    def fapiPrivatePutBatchOrders(self, params={}):
+        """미체결 지정가 주문의 가격/수량 수정"""
+        self.requests += 1
+        responses = []
+        with self._lock:
+            for item in json.loads(params['batchOrders']):
+                raw = self.orders.get(int(item['orderId']))
+                if raw is None:
+                    responses.append(self._error(-2013, 'Order does not exist.'))
+                    continue
+                if raw['type'] != 'LIMIT' or raw['side'] != item['side'].upper():
+                    responses.append(self._error(-4028, 'Invalid order modification.'))
+                    continue
+                ticker = self.markets_by_id[raw['symbol']]['symbol']
+                price = float(self.price_to_precision(ticker, item['price']))
+                step = self.markets_by_id[raw['symbol']]['precision']['amount']
+                qty = np.floor(float(item['quantity']) / step + 1e-9) * step
+                if qty <= float(raw['executedQty']):
+                    responses.append(self._error(-4003, 'Quantity less than or equal to zero.'))
+                    continue
+                raw.update(price=_fmt(price), origQty=_fmt(qty), updateTime=self.milliseconds())
+                current = self.price(ticker)
+                if (raw['side'] == 'BUY' and price >= current) or (raw['side'] == 'SELL' and price <= current):
+                    self._fill(raw, current, taker=True)
+                responses.append(self._public(raw))
+        return responses
+
+    def fapiPrivateDeleteBatchOrders(self, params={}):
+        self.requests += 1
+        with self._lock:
+            return [self._cancel(order_id) for order_id in json.loads(params['orderIdList'])]
+
+    # --- 매칭 엔진 ---
+    def _match(self, ticker, start, end):
+        """start → end 가격 구간에서 조건에 닿은 미체결 주문을 체결합니다."""
+        market_id = self.markets[ticker]['id']
+        low, high = min(start, end), max(start, end)
+        for raw in list(self.orders.values()):
+            if raw['symbol'] != market_id:
+                continue
+            order_type, side = raw['type'], raw['side']
+            if order_type == 'LIMIT':
+                price = float(raw['price'])
+                if (side == 'BUY' and low <= price) or (side == 'SELL' and high >= price):
+                    self._fill(raw, price, taker=False)
+            elif order_type == 'STOP_MARKET':
+                stop = float(raw['stopPrice'])
+                if (side == 'BUY' and high >= stop) or (side == 'SELL' and low <= stop):
+                    self._fill(raw, stop, taker=True)
+            elif order_type == 'TRAILING_STOP_MARKET':
+                self._trail(raw, start, end)
+
+    def _trail(self, raw, start, end):
+        """트레일링 스탑: 활성화 가격 이후의 최고가(매도)/최저가(매수)에서 callbackRate% 되돌리면 체결"""
+        rate = float(raw['priceRate']) / 100
+        activation = float(raw['activatePrice'])
+        for price in (start, end):
+            if raw['_extreme'] is None:
+                if activation and ((raw['side'] == 'SELL' and price < activation) or (raw['side'] == 'BUY' and price > activation)):
+                    continue
+                raw['_extreme'] = price
+            if raw['side'] == 'SELL':
+                raw['_extreme'] = max(raw['_extreme'], price)
+                trigger = raw['_extreme'] * (1 - rate)
+                if price <= trigger:
+                    self._fill(raw, trigger, taker=True)
+                    return
+            else:
+                raw['_extreme'] = min(raw['_extreme'], price)
+                trigger = raw['_extreme'] * (1 + rate)
+                if price >= trigger:
+                    self._fill(raw, trigger, taker=True)
+                    return
+
+    def _fill(self, raw, price, taker):
+        """주문 잔량을 price에 체결하고 포지션/지갑/체결 기록을 갱신합니다."""
+        ticker = self.markets_by_id[raw['symbol']]['symbol']
+        qty = float(raw['origQty']) - float(raw['executedQty'])
+        side = raw['side']
+        position_side = raw['positionSide']  # 원웨이 모드(BOTH)는 롱 방향 수량 하나로 단순화
+        position = self.positions[(ticker, position_side)]
+        closing = raw['reduceOnly'] or (position_side == 'LONG' and side == 'SELL') or (position_side == 'SHORT' and side == 'BUY')
+        if closing:
+            qty = min(qty, position[0])
+            if qty <= 0:
+                # 줄일 포지션이 없는 reduceOnly 주문은 거래소처럼 만료 처리
+                self.orders.pop(raw['orderId'], None)
+                raw['status'] = 'EXPIRED'
+                return
+            direction = 1.0 if position_side != 'SHORT' else -1.0
+            pnl = direction * qty * (price - position[1])
+            self.wallet += pnl
+            self.realized_pnl += pnl
+            position[0] -= qty
+            if position[0] <= 1e-12:
+                position[0], position[1] = 0.0, 0.0
+        else:
+            pnl = 0.0
+            position[1] = (position[0] * position[1] + qty * price) / (position[0] + qty)
+            position[0] += qty
+        fee = qty * price * (self.taker_fee if taker else self.maker_fee)
+        self.wallet -= fee
+        self.fees_paid += fee
+
+        executed = float(raw['executedQty']) + qty
+        raw.update(executedQty=_fmt(executed), avgPrice=_fmt(price), cumQuote=_fmt(executed * price),
+                   status='FILLED', updateTime=self.milliseconds())
+        self.orders.pop(raw['orderId'], None)
+        self.trades.append({
+            'id': str(len(self.trades) + 1), 'order': str(raw['orderId']), 'symbol': ticker, 'timestamp': self.milliseconds(),
+            'side': side.lower(), 'price': price, 'amount': qty, 'cost': qty * price, 'takerOrMaker': 'taker' if taker else 'maker',
+            'fee': {'cost': fee, 'currency': 'USDT'},
+            'info': {'positionSide': raw['positionSide'], 'realizedPnl': _fmt(pnl), 'orderId': raw['orderId']},
+        })
+
+    def close(self):
+        pass
+
+
+def run_offline(sim, loops=None, ticks_per_loop=1, symbols=None):
+    """시뮬레이터로 실제 main 루프(process_tickers)를 오프라인 실행합니다. 실행한 루프 수와 초당 루프 수를 반환합니다."""
+    import main
+    from exchange_handler import ExchangeHandler
+
+    symbols = symbols or list(sim.candles)
+    handler = ExchangeHandler(exchange=sim)
+    handler.ensure_hedge_mode()
+    for ticker in symbols:
+        handler.set_leverage(ticker, CONFIG['LEVERAGE'])
+    started = time.time()
+    count = 0
+    while (loops is None or count < loops) and sim.advance(ticks_per_loop):
+        handler.refresh_snapshot()
+        main.process_tickers(handler, symbols)
+        count += 1
+    elapsed = time.time() - started
+    return count, count / elapsed if elapsed > 0 else float('inf')
+
+
+if __name__ == '__main__':
+    # 사용법: python exchange_simulator.py [루프 수]  - 저장된 1분봉(없으면 랜덤 워크)으로 봇을 오프라인 실행
+    import os
+    import sys
+    import tempfile
+    from candle_store import candle_store
+
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    CONFIG.update({'MARKET_STREAM_ENABLED': False, 'ACCOUNT_STREAM_ENABLED': False, 'OHLCV_REFRESH_INTERVAL': 0,
+                   'HISTORY_DIR': tempfile.mkdtemp(prefix='sim_history_'),  # 실제 거래 기록과 섞지 않음
+                   'NOTIFY_TRANSPORT': 'stub'})  # 텔레그램으로 보내지 않음
+    log_dir = tempfile.mkdtemp(prefix='sim_logs_')  # 실제 봇 로그 파일에 쓰지 않음
+    CONFIG.update({'LOG_DIR': log_dir, 'LOG_FILE': os.path.join(log_dir, 'grid_trading.log')})
+    import main  # main이 import 시점에 로깅을 INFO로 설정하므로 레벨은 그 뒤에 낮춘다
+    series = {}
+    for ticker in CONFIG['SYMBOLS']:
+        rows = candle_store.read_last(ticker, '1m', 5000)
+        if len(rows) < 500:
+            rng = np.random.default_rng(0)
+            close = 2500 * np.exp(np.cumsum(rng.normal(0, 0.0008, 5000)))
+            open_ = np.concatenate([[close[0]], close[:-1]])
+            start = int(time.time() * 1000) // 60000 * 60000 - 5000 * 60000
+            rows = np.column_stack([start + np.arange(5000) * 60000.0, open_, np.maximum(open_, close) * 1.0005,
+                                    np.minimum(open_, close) * 0.9995, close, rng.random(5000) * 100])
+        series[ticker] = rows
+    sim = SimulatedExchange(series, start=1000)
+    logging.getLogger().setLevel(logging.WARNING)  # 루프 로그를 줄여 봇 자체 비용을 잰다
+    count, rate = run_offline(sim, loops)
+    print(f"{count} loops, {rate:.0f} loops/s, requests={sim.requests}, fills={len(sim.trades)}, "
+          f"wallet={sim.wallet:.2f}, fees={sim.fees_paid:.2f}, funding={sim.funding_paid:.2f}")
+    import notifier
+    notifier.dispatcher.close()
+    print(f"notifications: {notifier.dispatcher.stats()}")
@@ -0,0 +1,234 @@
+# fill_store.py
+import json
+import logging
+import os
+import threading
+import numpy as np
+from config import CONFIG
+from position_book import symbol_id
+
+# 체결 한 건 = 고정 폭 레코드 (60바이트). 심볼별 파일에 거래 id 순서로 추가만 한다.
+FILL_DTYPE = np.dtype([
+    ('id', '<i8'), ('order_id', '<i8'), ('time', '<i8'),  # 거래 id, 주문 id, 체결 시각(ms)
+    ('price', '<f8'), ('qty', '<f8'), ('fee', '<f8'), ('realized_pnl', '<f8'),  # 수수료는 양수, realized_pnl은 거래소 계산값
+    ('side', 'i1'), ('position_side', 'i1'), ('maker', 'i1'), ('fee_usdt', 'i1'),  # 매수 1/매도 -1, LONG 1/SHORT -1/BOTH 0
+])
+# 펀딩비 한 건 = (거래 id, 시각(ms), 금액). 금액은 받으면 양수, 내면 음수 (income 그대로)
+FUNDING_DTYPE = np.dtype([('tran_id', '<i8'), ('time', '<i8'), ('amount', '<f8')])
+SIDES = {'BUY': 1, 'SELL': -1}
+POSITION_SIDES = {'LONG': 1, 'SHORT': -1, 'BOTH': 0}
+FETCH_LIMIT = 1000  # userTrades 최대 조회 개수
+INCOME_LIMIT = 1000  # income 최대 조회 개수
+CURSOR_FILE = 'cursor.json'
+# 기록 종류별 (dtype, 파일 접미사, 커서 필드): 체결은 거래 id, 펀딩비는 시각으로 이어받는다
+KINDS = {
+    'fills': (FILL_DTYPE, '', 'id'),
+    'funding': (FUNDING_DTYPE, '_funding', 'time'),
+}
+
+
+def to_records(trades):
+    """바이낸스 userTrades 원본 응답 목록을 FILL_DTYPE 배열로 변환합니다."""
+    records = np.zeros(len(trades), dtype=FILL_DTYPE)
+    for i, t in enumerate(trades):
+        records[i] = (
+            int(t['id']), int(t['orderId']), int(t['time']),
+            float(t['price']), float(t['qty']), abs(float(t['commission'])), float(t['realizedPnl']),
+            SIDES[t['side']], POSITION_SIDES[t.get('positionSide', 'BOTH')], bool(t['maker']),
+            t.get('commissionAsset', 'USDT') == 'USDT',
+        )
+    return records
+
+
+def to_funding_records(incomes):
+    """바이낸스 income(FUNDING_FEE) 원본 응답 목록을 FUNDING_DTYPE 배열로 변환합니다."""
+    records = np.zeros(len(incomes), dtype=FUNDING_DTYPE)
+    for i, income in enumerate(incomes):
+        records[i] = (int(income['tranId']), int(income['time']), float(income['income']))
+    return records
+
+
+class FillStore:
+    """심볼별 체결/펀딩비 기록 파일(고정 레코드)과 마지막으로 받은 위치(커서)를 관리합니다.
+
+    ingest()는 커서 다음 id부터만 거래소에 요청하고 id로 중복을 걸러 추가하므로 전체 이력을 다시 받지 않습니다.
+    펀딩비(ingest_funding)는 id 대신 시각을 커서로 씁니다.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._cursors = None
+        self._lock = threading.RLock()
+
+    @property
+    def directory(self):
+        return self._directory or CONFIG.get('FILL_STORE_DIR', 'data/fills')
+
+    def _path(self, ticker, kind='fills'):
+        return os.path.join(self.directory, f"{symbol_id(ticker)}{KINDS[kind][1]}.bin")
+
+    def _cursor_key(self, ticker, kind):
+        return f"{symbol_id(ticker)}{KINDS[kind][1]}"
+
+    # --- 커서 ---
+    def _load_cursors(self):
+        if self._cursors is None:
+            try:
+                with open(os.path.join(self.directory, CURSOR_FILE), 'r') as f:
+                    self._cursors = json.load(f)
+            except FileNotFoundError:
+                self._cursors = {}
+            except (OSError, ValueError) as e:
+                logging.error(f"Fill cursor load failed, rebuilding from store: {e}")
+                self._cursors = {}
+        return self._cursors
+
+    def _save_cursors(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, CURSOR_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._cursors, f)
+        os.replace(tmp, path)
+
+    def cursor(self, ticker, kind='fills'):
+        """마지막으로 저장한 거래 id(펀딩비는 시각). 커서 파일이 기록 직전에 끊겼어도 저장된 마지막 레코드를 기준으로 맞춥니다."""
+        with self._lock:
+            saved = self._load_cursors().get(self._cursor_key(ticker, kind))
+            last = self._last(ticker, kind)
+            last = None if last is None else int(last[KINDS[kind][2]])
+            if saved is None:
+                return last
+            return saved if last is None else max(saved, last)
+
+    def _last(self, ticker, kind):
+        dtype = KINDS[kind][0]
+        path = self._path(ticker, kind)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // dtype.itemsize
+        if count == 0:
+            return None
+        with open(path, 'rb') as f:
+            f.seek((count - 1) * dtype.itemsize)
+            return np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[0]
+
+    # --- 기록 ---
+    def append(self, ticker, records, kind='fills'):
+        """커서보다 새로운 기록만 순서대로 추가하고 커서를 옮깁니다. 추가한 개수를 반환합니다."""
+        dtype, _, field = KINDS[kind]
+        with self._lock:
+            records = np.asarray(records, dtype=dtype)
+            if kind == 'fills':
+                records = records[np.unique(records['id'], return_index=True)[1]]  # id 순 정렬 + 중복 제거
+            else:
+                records = records[np.unique(records['tran_id'], return_index=True)[1]]
+                records = records[np.argsort(records['time'], kind='stable')]
+            last = self.cursor(ticker, kind)
+            if last is not None:
+                if kind == 'fills':
+                    records = records[records['id'] > last]
+                else:
+                    # 같은 시각의 펀딩비가 여러 건일 수 있어 커서 시각은 다시 받고 이미 저장한 id만 거른다
+                    tail = self.read(ticker, since=last, kind=kind)['tran_id']
+                    records = records[(records['time'] > last) | ((records['time'] == last) & ~np.isin(records['tran_id'], tail))]
+            if len(records) == 0:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(ticker, kind)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            torn = size % dtype.itemsize
+            with open(path, 'ab') as f:
+                if torn:
+                    # 쓰다가 끊긴 마지막 레코드를 잘라낸다
+                    logging.warning(f"{ticker} - Fill store truncated torn {kind} record ({torn} bytes)")
+                    f.truncate(size - torn)
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._load_cursors()[self._cursor_key(ticker, kind)] = int(records[field][-1])
+            self._save_cursors()
+            return len(records)
+
+    def ingest(self, exchange, ticker):
+        """커서 이후의 체결을 거래소에서 받아 저장합니다. 첫 실행은 최근 체결부터 시작합니다."""
+        fetched = 0
+        while True:
+            params = {'symbol': symbol_id(ticker), 'limit': FETCH_LIMIT}
+            last = self.cursor(ticker)
+            if last is not None:
+                params['fromId'] = last + 1
+            trades = exchange.fapiPrivateGetUserTrades(params)
+            if not trades:
+                break
+            fetched += self.append(ticker, to_records(trades))
+            if len(trades) < FETCH_LIMIT:
+                break
+        if fetched:
+            logging.info(f"{ticker} - Ingested {fetched} fills")
+        return fetched
+
+    def ingest_funding(self, exchange, ticker):
+        """커서 시각 이후의 펀딩비 내역을 받아 저장합니다. 첫 실행은 최근 내역부터 시작합니다."""
+        fetched = 0
+        while True:
+            params = {'symbol': symbol_id(ticker), 'incomeType': 'FUNDING_FEE', 'limit': INCOME_LIMIT}
+            last = self.cursor(ticker, 'funding')
+            if last is not None:
+                params['startTime'] = last
+            incomes = exchange.fapiPrivateGetIncome(params)
+            if not incomes:
+                break
+            added = self.append(ticker, to_funding_records(incomes), 'funding')
+            fetched += added
+            if len(incomes) < INCOME_LIMIT or not added:
+                break
+        if fetched:
+            logging.info(f"{ticker} - Ingested {fetched} funding payments")
+        return fetched
+
+    # --- 조회 ---
+    def read(self, ticker, since=None, kind='fills'):
+        """저장된 기록 배열(저장 순서). since(ms)를 주면 그 시각 이후만 반환합니다."""
+        dtype = KINDS[kind][0]
+        with self._lock:
+            path = self._path(ticker, kind)
+            count = (os.path.getsize(path) if os.path.exists(path) else 0) // dtype.itemsize
+            if count == 0:
+                return np.zeros(0, dtype=dtype)
+            records = np.memmap(path, dtype=dtype, mode='r', shape=(count,)).view(np.ndarray)
+        if since is not None:
+            records = records[np.searchsorted(records['time'], since):]
+        return records
+
+
+fill_store = FillStore()
+
+
+def ingest_fills(exchange, symbols=None):
+    """모든 심볼의 새 체결과 펀딩비를 받아 저장합니다. {심볼: 추가한 체결 수}"""
+    counts = {}
+    for ticker in symbols or CONFIG['SYMBOLS']:
+        try:
+            counts[ticker] = fill_store.ingest(exchange, ticker)
+            fill_store.ingest_funding(exchange, ticker)
+        except Exception as e:
+            logging.error(f"{ticker} - Fill ingestion failed: {e}")
+    return counts
+
+
+def fills_frame(symbols=None, since=None):
+    """저장된 체결을 보고서용 DataFrame으로 합칩니다. (pandas는 필요할 때만 불러옴)"""
+    import pandas as pd
+
+    frames = []
+    for ticker in symbols or CONFIG['SYMBOLS']:
+        fills = fill_store.read(ticker, since)
+        if len(fills):
+            df = pd.DataFrame(fills)
+            df.insert(0, 'ticker', ticker)
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df['timestamp'] = pd.to_datetime(df['time'], unit='ms')
+    return df.sort_values('time', ascending=False).reset_index(drop=True)
@@ -6,14 +6,19 @@ import pandas as pd
 from datetime import datetime
 import ccxt
 import my_key
+from trade_journal import read_segment
+from fill_store import ingest_fills, fills_frame
+from pnl_engine import pnl_engine
+from config import CONFIG
 
 # --- 설정 ---
 HISTORY_PATH = 'history'
 OUTPUT_HTML_FILE = 'index.html'
 YOUR_BOT_NAME = 'Dynamic Grid Bot'
+FILLS_DISPLAY_ROWS = 200  # 리포트에 표시할 최근 체결 수
 
 def load_trade_history():
-    """history 폴더의 모든 json 거래 기록을 읽어 하나의 데이터프레임으로 합칩니다."""
+    """history 폴더의 모든 거래 기록(이전 .json 배열, 저널 .jsonl)을 읽어 하나의 데이터프레임으로 합칩니다."""
     all_trades = []
     json_files = glob.glob(os.path.join(HISTORY_PATH, '*.json'))
     
@@ -25,6 +30,9 @@ def load_trade_history():
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
 
+    for file_path in sorted(glob.glob(os.path.join(HISTORY_PATH, '*.jsonl')), reverse=True):
+        all_trades.extend(read_segment(file_path))  # 쓰다가 끊긴 줄은 건너뜀
+
     if not all_trades:
         return pd.DataFrame()
 
@@ -34,15 +42,19 @@ def load_trade_history():
     df = df.sort_values(by='timestamp', ascending=False).reset_index(drop=True)
     return df
 
-def get_live_status():
-    """거래소 API에 직접 연결하여 실시간 현황을 가져옵니다."""
+def create_exchange():
+    return ccxt.binance({
+        'apiKey': my_key.binance_api_key,
+        'secret': my_key.binance_secret_key,
+        'options': {'defaultType': 'future'}
+    })
+
+def get_live_status(exchange=None):
+    """거래소 API에 직접 연결하여 실시간 현황을 가져옵니다. exchange를 주면 그 객체(시뮬레이터 등)를 씁니다."""
     print("Connecting to Binance for live status...")
     try:
-        exchange = ccxt.binance({
-            'apiKey': my_key.binance_api_key,
-            'secret': my_key.binance_secret_key,
-            'options': {'defaultType': 'future'}
-        })
+        if exchange is None:
+            exchange = create_exchange()
         
         balance = exchange.fetch_balance(params={"type": "future"})
         
@@ -60,7 +72,7 @@ def get_live_status():
         print(f"Error fetching live status: {e}")
         return None
 
-def generate_html_report(history_df, live_status):
+def generate_html_report(history_df, live_status, fills_df=None, pnl=None):
     """데이터를 바탕으로 최종 HTML 리포트를 생성합니다."""
     
     # 마지막 업데이트 시간
@@ -112,6 +124,31 @@ def generate_html_report(history_df, live_status):
         df_display['수량'] = df_display['수량'].apply(lambda x: f"{x:.4f}")
         history_html = df_display.to_html(classes='styled-table history-table', index=False, escape=False)
 
+    # 체결 내역 HTML 생성 (체결 저장소 기준)
+    fills_html = "<h3>체결 내역이 없습니다.</h3>"
+    if fills_df is not None and not fills_df.empty:
+        pnl = pnl or {'realized': fills_df['realized_pnl'].sum(), 'fees': fills_df['fee'].sum(), 'funding': 0.0}
+        net = pnl['realized'] - pnl['fees'] + pnl['funding']
+        df_display = fills_df.head(FILLS_DISPLAY_ROWS)[['timestamp', 'ticker', 'side', 'position_side', 'price', 'qty', 'fee', 'realized_pnl']].copy()
+        df_display.columns = ['시간', '심볼', '방향', '포지션', '가격', '수량', '수수료', '실현 손익']
+        df_display['시간'] = df_display['시간'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        df_display['방향'] = df_display['방향'].map({1: '매수', -1: '매도'})
+        df_display['포지션'] = df_display['포지션'].map({1: 'LONG', -1: 'SHORT', 0: 'BOTH'})
+        df_display['가격'] = df_display['가격'].apply(lambda x: f"${x:,.2f}")
+        df_display['수량'] = df_display['수량'].apply(lambda x: f"{x:.4f}")
+        df_display['수수료'] = df_display['수수료'].apply(lambda x: f"${x:,.4f}")
+        df_display['실현 손익'] = df_display['실현 손익'].apply(lambda x: f"${x:,.2f}")
+        fills_html = f"""
+            <div class="status-grid">
+                <div><span>체결 수</span><strong>{len(fills_df):,}</strong></div>
+                <div><span>순 실현 손익 (수수료·펀딩 반영)</span><strong class="{'text-green' if net > 0 else 'text-red' if net < 0 else ''}">${net:,.2f}</strong></div>
+                <div><span>실현 손익</span><strong>${pnl['realized']:,.2f}</strong></div>
+                <div><span>수수료 합계</span><strong>${pnl['fees']:,.2f}</strong></div>
+                <div><span>펀딩비 합계</span><strong>${pnl['funding']:,.2f}</strong></div>
+            </div>
+            {df_display.to_html(classes='styled-table history-table', index=False, escape=False)}
+        """
+
     # 최종 HTML 템플릿
     html_template = f"""
     <!DOCTYPE html>
@@ -149,7 +186,10 @@ def generate_html_report(history_df, live_status):
             <h2>실시간 현황</h2>
             {status_html}
 
-            <h2>거래 기록</h2>
+            <h2>체결 내역</h2>
+            {fills_html}
+
+            <h2>주문 기록</h2>
             {history_html}
         </div>
     </body>
@@ -162,9 +202,18 @@ def main():
     print("Generating trading report...")
     
     history_df = load_trade_history()
-    live_status = get_live_status()
+    exchange = create_exchange()
+    ingest_fills(exchange)  # 저장된 커서 이후 체결만 받아온다
+    live_status = get_live_status(exchange)
+    
+    pnl = {'realized': 0.0, 'fees': 0.0, 'funding': 0.0}
+    for ticker in CONFIG['SYMBOLS']:
+        pnl_engine.update(ticker)
+        for key, value in pnl_engine.summary(ticker).items():
+            if key in pnl:
+                pnl[key] += value
     
-    html_content = generate_html_report(history_df, live_status)
+    html_content = generate_html_report(history_df, live_status, fills_frame(), pnl)
     
     with open(OUTPUT_HTML_FILE, 'w', encoding='utf-8') as f:
         f.write(html_content)
@@ -0,0 +1,149 @@
+# grid_reconciler.py
+import logging
+import uuid
+from config import CONFIG
+
+# 그리드 그룹 키: (side, positionSide) - 롱 그리드는 ('buy', 'LONG'), 숏 그리드는 ('sell', 'SHORT')
+GRID_GROUPS = (('buy', 'LONG'), ('sell', 'SHORT'))
+_anchors = {}  # ticker -> (그리드 기준가, 그리드 간격): 가격이 한 칸 이상 움직일 때만 다시 잡는다
+
+
+def build_grid_ladder(current_price, interval_pct, amount, steps=None):
+    """현재가 기준 목표 그리드(레벨, 사이드, 수량)를 만듭니다.
+
+    롱은 현재가 아래 매수, 숏은 현재가 위 매도로 각각 steps개씩 배치합니다.
+    """
+    steps = steps or CONFIG['MAX_STEPS']
+    ladder = []
+    if current_price <= 0 or interval_pct <= 0 or amount <= 0:
+        return ladder
+    for step in range(1, steps + 1):
+        ladder.append({'side': 'buy', 'position_side': 'LONG', 'amount': amount,
+                       'price': current_price * (1 - interval_pct * step), 'action': 'Grid Buy'})
+        ladder.append({'side': 'sell', 'position_side': 'SHORT', 'amount': amount,
+                       'price': current_price * (1 + interval_pct * step), 'action': 'Grid Sell'})
+    return ladder
+
+
+def _order_group(order):
+    info = order.get('info') or {}
+    return order.get('side'), info.get('positionSide', order.get('positionSide'))
+
+
+def grid_client_id():
+    """그리드 주문에 붙일 clientOrderId를 만듭니다. (바이낸스 제한 36자 이내)"""
+    return f"{CONFIG.get('GRID_CLIENT_ID_PREFIX', 'grid_')}{uuid.uuid4().hex[:24]}"
+
+
+def is_grid_order(order):
+    client_id = order.get('clientOrderId') or (order.get('info') or {}).get('clientOrderId') or ''
+    return client_id.startswith(CONFIG.get('GRID_CLIENT_ID_PREFIX', 'grid_'))
+
+
+def grid_orders(open_orders):
+    """미체결 주문 중 그리드 주문만 고릅니다.
+
+    이 모듈이 낸 주문(clientOrderId 접두어)만 대상으로 하므로, 비율 조정 주문, 수동 주문, 이전 프로세스가 남긴 주문과
+    청산(reduceOnly) 주문은 수정/취소하지 않습니다.
+    """
+    return [o for o in open_orders if not o.get('reduceOnly') and _order_group(o) in GRID_GROUPS and is_grid_order(o)]
+
+
+def diff_grid(target, live, price_tolerance, amount_tolerance=None, allow_amend=None):
+    """목표 그리드와 미체결 주문을 비교해 최소 변경 집합을 계산합니다.
+
+    가격 차이가 price_tolerance 이내이고 수량 차이가 amount_tolerance(비율) 이내인 주문은 그대로 둡니다.
+    남은 주문은 같은 그룹의 남은 목표 레벨과 가격순으로 짝지어 수정(amend)하고,
+    짝이 없는 주문은 취소, 짝이 없는 레벨은 신규 주문합니다.
+    반환값: {'keep': [order], 'cancel': [order], 'create': [level], 'amend': [(order, level)]}
+    """
+    amount_tolerance = amount_tolerance if amount_tolerance is not None else CONFIG.get('GRID_AMOUNT_TOLERANCE', 0.1)
+    allow_amend = allow_amend if allow_amend is not None else CONFIG.get('GRID_AMEND_ENABLED', True)
+    changes = {'keep': [], 'cancel': [], 'create': [], 'amend': []}
+
+    for group in GRID_GROUPS:
+        levels = [lv for lv in target if (lv['side'], lv['position_side']) == group]
+        orders = [o for o in live if _order_group(o) == group]
+
+        # 허용 범위 안의 (주문, 레벨) 쌍을 가격 차이가 작은 순서로 짝짓는다
+        pairs = []
+        for i, order in enumerate(orders):
+            price = float(order['price'])
+            amount = float(order.get('remaining') or order.get('amount') or 0.0)
+            for j, level in enumerate(levels):
+                distance = abs(price - level['price'])
+                if distance <= price_tolerance and abs(amount - level['amount']) <= level['amount'] * amount_tolerance:
+                    pairs.append((distance, i, j))
+        pairs.sort()
+        matched_orders, matched_levels = set(), set()
+        for _, i, j in pairs:
+            if i in matched_orders or j in matched_levels:
+                continue
+            matched_orders.add(i)
+            matched_levels.add(j)
+            changes['keep'].append(orders[i])
+
+        stale = sorted((o for i, o in enumerate(orders) if i not in matched_orders), key=lambda o: float(o['price']))
+        missing = sorted((lv for j, lv in enumerate(levels) if j not in matched_levels), key=lambda lv: lv['price'])
+        paired = min(len(stale), len(missing)) if allow_amend else 0
+        changes['amend'] += list(zip(stale[:paired], missing[:paired]))
+        changes['cancel'] += stale[paired:]
+        changes['create'] += missing[paired:]
+    return changes
+
+
+def apply_grid_changes(exchange_handler, ticker, changes, notify_type='grid'):
+    """변경 집합을 취소 → 수정 → 신규 순서로 배치 실행합니다. 실행한 요청 건수를 반환합니다."""
+    if changes['cancel']:
+        exchange_handler.cancel_orders([o['id'] for o in changes['cancel']], ticker)
+    if changes['amend']:
+        amends = [{'id': order['id'], 'side': level['side'], 'position_side': level['position_side'],
+                   'amount': level['amount'], 'price': level['price']} for order, level in changes['amend']]
+        exchange_handler.amend_orders(ticker, amends)
+    if changes['create']:
+        exchange_handler.place_orders(ticker, [dict(level, client_id=grid_client_id()) for level in changes['create']], notify_type)
+    return len(changes['cancel']) + len(changes['amend']) + len(changes['create'])
+
+
+def grid_anchor(ticker, current_price, interval_pct):
+    """그리드를 깔 기준가와 간격을 반환합니다.
+
+    매 루프 현재가로 다시 깔면 작은 움직임에도 모든 레벨이 허용 오차를 벗어나 주문을 계속 고치므로,
+    현재가가 기준가에서 한 칸(간격) 이상 벗어나거나 간격이 허용 오차 비율 이상 바뀔 때만 기준을 옮깁니다.
+    """
+    anchor = _anchors.get(ticker)
+    if anchor is not None and keeps_anchor(anchor[0], anchor[1], current_price, interval_pct):
+        return anchor
+    anchor = _anchors[ticker] = (current_price, interval_pct)
+    return anchor
+
+
+def keeps_anchor(anchor_price, anchor_interval, current_price, interval_pct, tolerance=None):
+    """기준가를 그대로 둘지 판단합니다. 현재가가 기준가에서 한 칸 안이고 간격 변화가 허용 오차 비율 안이면 True (백테스트도 같은 규칙 사용)"""
+    tolerance = tolerance if tolerance is not None else CONFIG.get('GRID_PRICE_TOLERANCE', 0.3)
+    return (abs(current_price - anchor_price) < anchor_price * anchor_interval
+            and abs(interval_pct - anchor_interval) < anchor_interval * tolerance)
+
+
+def reset_grid_anchor(ticker=None):
+    """그리드 기준가를 지웁니다. (다음 조정 때 현재가로 다시 잡음)"""
+    if ticker is None:
+        _anchors.clear()
+    else:
+        _anchors.pop(ticker, None)
+
+
+def reconcile_grid(exchange_handler, ticker, current_price, open_orders, interval_pct, amount, steps=None):
+    """목표 그리드에 맞게 미체결 그리드 주문을 최소 변경으로 맞춥니다. 변경 건수를 반환합니다."""
+    anchor_price, anchor_interval = grid_anchor(ticker, current_price, interval_pct)
+    target = build_grid_ladder(anchor_price, anchor_interval, amount, steps)
+    if not target:
+        return 0
+    # 허용 오차는 그리드 한 칸 간격의 비율로 정한다
+    price_tolerance = anchor_price * anchor_interval * CONFIG.get('GRID_PRICE_TOLERANCE', 0.3)
+    changes = diff_grid(target, grid_orders(open_orders), price_tolerance)
+    logging.info(f"{ticker} - Grid reconcile @ {anchor_price:.2f}: keep={len(changes['keep'])}, amend={len(changes['amend'])}, "
+                 f"cancel={len(changes['cancel'])}, create={len(changes['create'])}")
+    if not (changes['cancel'] or changes['amend'] or changes['create']):
+        return 0
+    return apply_grid_changes(exchange_handler, ticker, changes)
@@ -0,0 +1,137 @@
+# indicator_memo.py
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import CONFIG
+import signal_kernel
+
+_MISSING = object()
+
+
+class LRUMemo:
+    """크기 제한이 있는 LRU 결과 캐시. 적중/실패/축출 횟수를 셉니다."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or CONFIG.get('INDICATOR_MEMO_SIZE', 512)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def lookup(self, key, default=None):
+        """저장된 값을 반환합니다. 없으면 default (적중/실패 횟수에 반영)"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+
+    def store(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.lookup(key, _MISSING)
+        if value is _MISSING:
+            value = compute()  # 계산은 잠금 밖에서 (같은 키를 동시에 계산해도 결과는 같다)
+            self.store(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+memo = LRUMemo()
+
+
+def candle_key(ohlcv):
+    """캔들 데이터의 식별 키.
+
+    ohlcv_cache가 만든 DataFrame은 attrs['candle_key'] = (심볼, 타임프레임, 개수, 마지막 시각, 버퍼 revision)을 그대로 씁니다.
+    이 키는 버퍼를 잠그고 복사한 시점의 revision이라 복사본의 내용과 항상 일치합니다.
+    그 밖의 DataFrame/배열은 전체 값의 해시로 만들어, 내용이 하나라도 다르면 키도 다릅니다.
+    """
+    attrs = getattr(ohlcv, 'attrs', None)
+    if attrs and 'candle_key' in attrs:
+        key = attrs['candle_key']
+        # attrs는 슬라이싱/복사에도 따라오므로 행 수와 마지막 시각이 같을 때만 신뢰한다
+        if len(ohlcv) == key[2] and len(ohlcv) and ohlcv.index[-1].value // 1_000_000 == key[3]:
+            return key
+    if hasattr(ohlcv, 'index'):
+        values = ohlcv[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+        index = ohlcv.index.asi8 if hasattr(ohlcv.index, 'asi8') else np.asarray(ohlcv.index)
+        return ('frame', values.shape, _digest(values, index))
+    values = np.asarray(ohlcv, dtype=float)
+    return ('array', values.shape, _digest(values))
+
+
+def _digest(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.digest()
+
+
+def _memoized(name, func, ohlcv, *args):
+    key = (name, candle_key(ohlcv), args)
+    return memo.get_or_compute(key, lambda: func(ohlcv, *args))
+
+
+def compute_signals(ohlcv, **periods):
+    """signal_kernel.compute_signals의 메모이즈 버전 (DataFrame이면 open~volume 값으로 계산)"""
+    def compute(data, _):
+        return signal_kernel.compute_signals(data.to_numpy() if hasattr(data, 'to_numpy') else data, **periods)
+    return _memoized('signals', compute, ohlcv, tuple(sorted(periods.items())))
+
+
+def compute_symbol_signals(buffers, count):
+    """{심볼: CandleBuffer}의 최근 count개 캔들 지표를 {심볼: Signals}로 반환합니다.
+
+    심볼마다 (심볼, 타임프레임, 개수, 마지막 시각, revision)이 지난번과 같으면 저장된 결과를 쓰고,
+    캔들이 바뀐 심볼만 모아 signal_kernel.compute_symbol_signals 한 번으로 계산합니다.
+    """
+    signals, missing, keys = {}, {}, {}
+    for ticker, buf in buffers.items():
+        rows, revision = buf.snapshot(count)
+        if len(rows) == 0:
+            continue
+        keys[ticker] = ('symbol_signals', *buf.key, len(rows), int(rows[-1, 0]), revision)
+        cached = memo.lookup(keys[ticker])
+        if cached is None:
+            missing[ticker] = rows
+        else:
+            signals[ticker] = cached
+    for ticker, value in signal_kernel.compute_symbol_signals(missing, count).items():
+        memo.store(keys[ticker], value)
+        signals[ticker] = value
+    return signals
+
+
+def log_stats():
+    stats = memo.stats()
+    logging.info(f"Indicator memo: size={stats['size']}, hits={stats['hits']}, misses={stats['misses']}, "
+                 f"evictions={stats['evictions']}, hit_rate={stats['hit_rate']:.1%}")
+    return stats
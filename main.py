@@ -3,6 +3,7 @@ import logging
 from logging.handlers import RotatingFileHandler
 import os
 import time
+import asyncio
 import schedule
 import pytz
 from datetime import datetime
@@ -11,10 +12,20 @@ from datetime import datetime
 from config import CONFIG
 import utils
 from exchange_handler import ExchangeHandler
+from async_exchange_handler import AsyncExchangeHandler
 import risk_manager
 import strategy_logic
 import monitoring
 import myBinance as mb
+import ohlcv_cache
+import market_stream
+import market_specs
+import indicator_memo
+import resampler
+import candle_store
+from trade_journal import trade_journal
+import notifier
+import fill_store
 
 # --- 로깅 및 디렉토리 설정 ---
 os.makedirs(CONFIG['LOG_DIR'], exist_ok=True)
@@ -29,33 +40,63 @@ logging.basicConfig(
     handlers=[log_handler, logging.StreamHandler()] # 파일 및 콘솔 출력
 )
 
-def process_ticker(exchange_handler, ticker):
-    """단일 심볼에 대한 트레이딩 로직을 처리합니다."""
-    try:
+SIGNAL_CANDLES = 100  # 지표 계산에 쓰는 1분봉 개수
+
+
+def base_candle_count():
+    """조회할 1분봉 개수. 상위 타임프레임 확인을 쓰면 리샘플링에 필요한 만큼 더 보관합니다."""
+    if not CONFIG.get('TIMEFRAME_CONFIRMATION', False):
+        return SIGNAL_CANDLES
+    return max(SIGNAL_CANDLES, resampler.base_candles_needed(CONFIG['CONFIRMATION_TIMEFRAMES'], CONFIG['MA_PERIOD']))
+
+
+def batch_signals(symbols):
+    """캐시된 1분봉으로 모든 심볼의 지표를 구합니다. 캔들이 바뀐 심볼만 한 번의 2차원 배열 계산으로 다시 계산합니다. {심볼: Signals}"""
+    buffers = {t: ohlcv_cache.ohlcv_cache.buffer(t, '1m') for t in symbols}
+    return indicator_memo.compute_symbol_signals(buffers, SIGNAL_CANDLES)
+
+
+def process_tickers(exchange_handler, symbols):
+    """모든 심볼의 현재가/캔들을 모은 뒤 지표를 일괄 계산하고 심볼별 전략을 실행합니다."""
+    market_data = {}
+    for ticker in symbols:
+        try:
+            current_price = market_stream.get_price(exchange_handler.exchange, ticker)
+            df = ohlcv_cache.get_ohlcv(exchange_handler.exchange, ticker, '1m', base_candle_count())
+            market_data[ticker] = (current_price, df.iloc[-SIGNAL_CANDLES:])
+        except Exception as e:
+            utils.handle_exception(ticker, "Fetching market data", e, "ticker_error")
+
+    signals = batch_signals(list(market_data))
+    for ticker, (current_price, df) in market_data.items():
         logging.info(f"--- Processing {ticker} ---")
-        
-        # 데이터 가져오기 및 기본 지표 계산
-        current_price = mb.GetCoinNowPrice(exchange_handler.exchange, ticker)
-        if current_price <= 0:
+        if current_price is None or current_price <= 0:
             logging.warning(f"Invalid price for {ticker}: {current_price}")
-            return
+            continue
+        evaluate_ticker(exchange_handler, ticker, current_price, df, signals.get(ticker))
+
 
-        df = mb.GetOhlcv(exchange_handler.exchange, ticker, '1m', 100)
+def evaluate_ticker(exchange_handler, ticker, current_price, df, signals=None):
+    """조회된 현재가와 캔들로 지표 계산, 전략 판단, 주문까지 처리합니다.
+
+    signals(일괄 계산된 Signals)가 없으면 df로 계산합니다.
+    """
+    try:
         if df.empty or len(df) < CONFIG['MA_PERIOD']:
             logging.warning(f"Insufficient data for {ticker}")
             return
             
-        ma = mb.GetMA(df, CONFIG['MA_PERIOD'], -1)
-        rsi = mb.GetRSI(df, CONFIG['RSI_PERIOD'], -1)
-        atr = strategy_logic.calculate_atr(df)
+        if signals is None:
+            signals = indicator_memo.compute_signals(df)
+        ma, rsi, atr = signals.ma, signals.rsi, signals.atr
 
         # 포지션 및 주문 정보
-        balance = exchange_handler.fetch_balance()
-        long_amt = exchange_handler.get_position_amount(balance, ticker, 'LONG')
-        short_amt = exchange_handler.get_position_amount(balance, ticker, 'SHORT')
-        long_value = mb.GetCoinRealMoney(balance, ticker, 'LONG')
-        short_value = mb.GetCoinRealMoney(balance, ticker, 'SHORT')
-        existing_orders = exchange_handler.fetch_open_orders(ticker)
+        snapshot = exchange_handler.snapshot()
+        long_amt = snapshot.position_amount(ticker, 'LONG')
+        short_amt = snapshot.position_amount(ticker, 'SHORT')
+        long_value = snapshot.position_value(ticker, 'LONG')
+        short_value = snapshot.position_value(ticker, 'SHORT')
+        existing_orders = snapshot.orders(ticker)
         
         logging.info(f"{ticker} - Price: ${current_price:.2f}, MA: ${ma:.2f}, RSI: {rsi:.1f}, Long: {long_amt:.4f}, Short: {short_amt:.4f}")
 
@@ -65,14 +106,14 @@ def process_ticker(exchange_handler, ticker):
         # --- 전략 로직 실행 ---
         # 진입/청산 조건 확인
         entry_signal = strategy_logic.check_entry_conditions(exchange_handler, ticker, df, current_price, ma, rsi)
+        if CONFIG.get('TIMEFRAME_CONFIRMATION', False):
+            entry_signal = strategy_logic.confirm_timeframes(ticker, entry_signal)
         # exit_signal, _ = strategy_logic.check_exit_conditions(...)
         
-        # 그리드 조정
-        grid_interval = strategy_logic.calculate_dynamic_grid_interval(ticker, current_price, atr, existing_orders)
+        # 그리드 조정 (간격은 ATR로 정하고, 목표 그리드와 다른 주문만 변경)
+        grid_interval = strategy_logic.calculate_dynamic_grid_interval(ticker, current_price, atr)
         amount = risk_manager.calculate_position_size(exchange_handler, ticker, current_price)
-        
-        if len(existing_orders) < CONFIG['MAX_STEPS'] * 2:
-            strategy_logic.progressive_grid_adjustment(exchange_handler, ticker, current_price, existing_orders, grid_interval, amount)
+        strategy_logic.progressive_grid_adjustment(exchange_handler, ticker, current_price, existing_orders, grid_interval, amount)
 
         # ... (기타 모든 process_ticker 내 로직을 여기에 모듈화된 함수 호출로 변경) ...
 
@@ -84,6 +125,79 @@ def process_ticker(exchange_handler, ticker):
         utils.handle_exception(ticker, "Processing ticker", e, "ticker_error")
 
 
+async def process_tickers_async(async_handler, exchange_handler, symbols):
+    """모든 심볼의 잔고/주문/현재가/캔들을 동시에 조회한 뒤 심볼별 전략을 실행합니다."""
+    if exchange_handler.account_state is not None:
+        # 스트림 상태는 메모리에서 만들지만 REST 재동기화가 일어날 수 있으므로 이벤트 루프를 막지 않도록 스레드에서 실행
+        await asyncio.to_thread(exchange_handler.refresh_snapshot)
+    else:
+        exchange_handler.refresh_snapshot(await async_handler.fetch_snapshot(symbols))
+
+    count = base_candle_count()
+    results = await asyncio.gather(*(async_handler.fetch_market_data(t, '1m', count) for t in symbols), return_exceptions=True)
+    market_data = {}
+    for ticker, data in zip(symbols, results):
+        if isinstance(data, Exception):
+            utils.handle_exception(ticker, "Fetching market data", data, "ticker_error")
+            continue
+        current_price, df = data
+        market_data[ticker] = (current_price, df.iloc[-SIGNAL_CANDLES:])
+
+    signals = batch_signals(list(market_data))
+    # 주문은 기존 동기 핸들러로 처리하므로 심볼별 평가를 스레드에서 동시에 실행 (동시 실행 수는 세마포어로 제한)
+    semaphore = asyncio.Semaphore(CONFIG.get('ASYNC_EVAL_CONCURRENCY', 4))
+
+    async def evaluate(ticker, current_price, df):
+        logging.info(f"--- Processing {ticker} ---")
+        if current_price is None or current_price <= 0:
+            logging.warning(f"Invalid price for {ticker}: {current_price}")
+            return
+        async with semaphore:
+            await asyncio.to_thread(evaluate_ticker, exchange_handler, ticker, current_price, df, signals.get(ticker))
+
+    await asyncio.gather(*(evaluate(t, price, df) for t, (price, df) in market_data.items()))
+
+
+async def run_scheduler(interval=1.0):
+    """예약 작업(보고서, 체결 수집, 캔들 저장)을 스레드에서 실행해 트레이딩 루프를 막지 않습니다."""
+    while True:
+        try:
+            await asyncio.to_thread(schedule.run_pending)
+        except Exception as e:
+            logging.error(f"Scheduled job failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+async def main_async(exchange):
+    """비동기 메인 루프. 심볼 수와 무관하게 한 번의 동시 조회로 루프를 처리합니다."""
+    async_handler = AsyncExchangeHandler()
+    scheduler = asyncio.create_task(run_scheduler())
+    try:
+        while True:
+            try:
+                started = time.time()
+                await process_tickers_async(async_handler, exchange, CONFIG['SYMBOLS'])
+                logging.info(f"Main loop finished in {time.time() - started:.2f}s. Waiting for {CONFIG['SLEEP_TIME']} seconds...")
+                await asyncio.sleep(CONFIG['SLEEP_TIME'])
+            except Exception as e:
+                logging.error(f"An unexpected error occurred in the async main loop: {e}", exc_info=True)
+                await asyncio.sleep(60)
+    finally:
+        scheduler.cancel()
+        await async_handler.close()
+
+
+def shutdown(exchange):
+    """스트림을 닫고 보관 중인 캔들과 거래 기록을 저장소에 기록합니다. 대기 중인 알림도 보냅니다."""
+    market_stream.stop_market_stream()
+    exchange.stop_account_stream()
+    trade_journal.close()
+    notifier.dispatcher.close()
+    if CONFIG.get('CANDLE_STORE_ENABLED', False):
+        candle_store.persist_buffers('1m')
+        candle_store.candle_store.close()
+
+
 def main():
     """메인 트레이딩 루프"""
     logging.info("=== Dynamic Grid Trading Bot Start ===")
@@ -92,29 +206,50 @@ def main():
     utils.clear_all_cache()
     exchange = ExchangeHandler()
     exchange.ensure_hedge_mode()
+    market_specs.market_specs.load(exchange.exchange)  # 호가/수량 단위는 시작 시 한 번 읽고 TTL마다 갱신
     
     for ticker in CONFIG['SYMBOLS']:
         exchange.set_leverage(ticker, CONFIG['LEVERAGE'])
         # strategy_logic.startup_grid_optimization(exchange, ticker) # 시작 시 그리드 최적화
+        if CONFIG.get('CANDLE_STORE_ENABLED', False):
+            # 저장된 캔들로 버퍼를 채우고 빠진 구간만 내려받는다
+            candle_store.warm_start(exchange.exchange, ticker, '1m', base_candle_count())
+
+    if CONFIG.get('MARKET_STREAM_ENABLED', False):
+        market_stream.start_market_stream(CONFIG['SYMBOLS'], CONFIG.get('MARKET_STREAM_URL'))
+    if CONFIG.get('ACCOUNT_STREAM_ENABLED', False):
+        exchange.start_account_stream(CONFIG['SYMBOLS'])
     
     # 스케줄 설정
     schedule.every().day.at("00:00", "Asia/Seoul").do(monitoring.send_daily_pnl, exchange_handler=exchange)
     schedule.every(6).hours.do(monitoring.send_status_report, exchange_handler=exchange)
+    if CONFIG.get('CANDLE_STORE_ENABLED', False):
+        schedule.every(CONFIG.get('CANDLE_STORE_PERSIST_MINUTES', 10)).minutes.do(candle_store.persist_buffers, timeframe='1m')
+    fill_store.ingest_fills(exchange.exchange)  # 마지막 커서 이후 체결만 받아온다
+    schedule.every(CONFIG.get('FILL_INGEST_MINUTES', 5)).minutes.do(fill_store.ingest_fills, exchange=exchange.exchange)
     logging.info("Scheduled tasks are set.")
 
+    if CONFIG.get('ASYNC_ENABLED', False):
+        try:
+            asyncio.run(main_async(exchange))
+        except KeyboardInterrupt:
+            logging.info("Bot stopped by user.")
+        shutdown(exchange)
+        return
+
     while True:
         try:
             schedule.run_pending()
+            exchange.refresh_snapshot()  # 루프당 한 번 계정 정보 조회
             
-            for ticker in CONFIG['SYMBOLS']:
-                process_ticker(exchange, ticker)
-                time.sleep(1) # API 레이트 리밋 방지
+            process_tickers(exchange, CONFIG['SYMBOLS'])  # 레이트 리밋은 rate_limiter가 요청 단위로 관리
             
             logging.info(f"Main loop finished. Waiting for {CONFIG['SLEEP_TIME']} seconds...")
             time.sleep(CONFIG['SLEEP_TIME'])
             
         except KeyboardInterrupt:
             logging.info("Bot stopped by user.")
+            shutdown(exchange)
             break
         except Exception as e:
             logging.error(f"An unexpected error occurred in the main loop: {e}", exc_info=True)
@@ -0,0 +1,126 @@
+# market_specs.py
+import logging
+import math
+import threading
+import time
+import numpy as np
+from config import CONFIG
+from position_book import symbol_id
+
+# 스펙 배열 컬럼: 호가 단위, 수량 단위, 최소 수량, 최소 주문 금액
+SPEC_FIELDS = ('tick_size', 'step_size', 'min_qty', 'min_notional')
+_EPSILON = 1e-9  # 부동소수 나눗셈 오차 보정
+
+
+def _decimals(unit):
+    """단위(0.001 등)를 표현하는 데 필요한 소수 자릿수"""
+    if unit <= 0:
+        return 8
+    return len(f"{unit:.10f}".rstrip('0').split('.')[1])
+
+
+def parse_market_spec(market):
+    """ccxt 마켓 정보에서 (tick, step, min_qty, min_notional)을 뽑습니다. 바이낸스 원본 필터를 우선 사용합니다."""
+    filters = {f.get('filterType'): f for f in (market.get('info') or {}).get('filters', [])}
+    limits = market.get('limits') or {}
+    precision = market.get('precision') or {}
+
+    def unit(value):
+        # 정수면 소수 자릿수(DECIMAL_PLACES 모드), 아니면 단위 자체(TICK_SIZE 모드)
+        if value is None:
+            return 0.0
+        value = float(value)
+        return 10 ** -value if value >= 1 and value == int(value) else value
+
+    tick = float(filters.get('PRICE_FILTER', {}).get('tickSize') or unit(precision.get('price')))
+    step = float(filters.get('LOT_SIZE', {}).get('stepSize') or unit(precision.get('amount')))
+    min_qty = float(filters.get('LOT_SIZE', {}).get('minQty') or (limits.get('amount') or {}).get('min') or step)
+    min_notional = float(filters.get('MIN_NOTIONAL', {}).get('notional') or (limits.get('cost') or {}).get('min') or 0.0)
+    return tick, step, min_qty, min_notional
+
+
+class MarketSpecs:
+    """심볼별 호가/수량 단위와 최소 주문 조건을 (N, 4) 배열로 보관하고 네트워크 없이 계산합니다."""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else CONFIG.get('MARKET_SPECS_TTL', 3600)
+        self.table = np.zeros((0, len(SPEC_FIELDS)))
+        self._index = {}  # 심볼ID -> 행 번호
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, exchange, reload=False):
+        """거래소 마켓 정보로 테이블을 만듭니다. reload=True면 마켓 정보를 다시 받습니다."""
+        markets = exchange.load_markets(reload)
+        index, rows = {}, []
+        for market in markets.values():
+            if market.get('type', 'swap') not in ('swap', 'future') or not market.get('id'):
+                continue
+            try:
+                rows.append(parse_market_spec(market))
+            except (TypeError, ValueError) as e:
+                logging.warning(f"{market.get('symbol')} - Market spec parse failed: {e}")
+                continue
+            index[market['id']] = len(rows) - 1
+        with self._lock:
+            self.table = np.array(rows, dtype=float).reshape(-1, len(SPEC_FIELDS))
+            self._index = index
+            self.loaded_at = time.time()
+        logging.info(f"Market specs loaded: {len(index)} symbols")
+        return self
+
+    def ensure(self, exchange):
+        """비어 있거나 TTL이 지났으면 다시 읽습니다."""
+        if not self._index or time.time() - self.loaded_at > self.ttl:
+            self.load(exchange, reload=bool(self._index))
+        return self
+
+    def spec(self, ticker):
+        """(tick_size, step_size, min_qty, min_notional) 행. 없으면 None"""
+        i = self._index.get(symbol_id(ticker))
+        return None if i is None else self.table[i]
+
+    def _require(self, ticker):
+        row = self.spec(ticker)
+        if row is None:
+            raise KeyError(f"Unknown market: {ticker}")
+        return row
+
+    def min_amount(self, ticker, price):
+        """price에서 최소 수량과 최소 주문 금액을 모두 만족하는 가장 작은 주문 수량"""
+        _, step, min_qty, min_notional = self._require(ticker)
+        amount = min_qty
+        if min_notional > 0 and price > 0:
+            steps = math.ceil(min_notional / (price * step) - _EPSILON) if step > 0 else 0
+            amount = max(amount, steps * step)
+        return round(amount, _decimals(step))
+
+    def round_price(self, ticker, price):
+        """호가 단위에 가장 가까운 가격"""
+        tick = self._require(ticker)[0]
+        if tick <= 0:
+            return price
+        return round(round(price / tick) * tick, _decimals(tick))
+
+    def round_amount(self, ticker, amount):
+        """수량 단위로 내림한 수량 (거래소 정밀도 처리와 동일하게 절사)"""
+        step = self._require(ticker)[1]
+        if step <= 0:
+            return amount
+        return round(math.floor(amount / step + _EPSILON) * step, _decimals(step))
+
+    def price_str(self, ticker, price):
+        """주문 요청에 넣을 가격 문자열 (price_to_precision 대체)"""
+        return f"{self.round_price(ticker, price):.{_decimals(self._require(ticker)[0])}f}"
+
+    def amount_str(self, ticker, amount):
+        """주문 요청에 넣을 수량 문자열 (amount_to_precision 대체)"""
+        return f"{self.round_amount(ticker, amount):.{_decimals(self._require(ticker)[1])}f}"
+
+
+market_specs = MarketSpecs()
+
+
+def get_min_amount(exchange, ticker, price):
+    """mb.GetMinimumAmount의 로컬 계산 버전. 마켓 정보는 TTL마다 한 번만 읽습니다."""
+    return market_specs.ensure(exchange).min_amount(ticker, price)
@@ -0,0 +1,275 @@
+# market_stream.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from config import CONFIG
+import myBinance as mb
+from ohlcv_cache import ohlcv_cache
+
+try:
+    import websockets
+except ImportError:  # 스트림 없이도 REST 폴링으로 동작
+    websockets = None
+
+KLINE_INTERVAL_MS = 60 * 1000
+
+
+def stream_symbol(ticker):
+    """ccxt 심볼을 웹소켓 스트림 이름으로 변환합니다. (ETH/USDT:USDT -> ethusdt)"""
+    return ticker.replace("/", "").replace(":USDT", "").lower()
+
+
+class StreamConnection:
+    """전용 스레드의 이벤트 루프에서 웹소켓 연결 하나를 유지하고, 끊기면 재연결합니다."""
+
+    def __init__(self, url, on_message, name='stream'):
+        self.url = url
+        self.on_message = on_message
+        self.name = name
+        self.connected = False
+        self.last_message_time = 0.0
+        self._loop = None
+        self._thread = None
+        self._stopping = False
+        self._reconnect = False
+
+    def start(self):
+        if websockets is None:
+            logging.warning(f"[{self.name}] websockets 패키지가 없어 스트림을 시작하지 않습니다.")
+            return False
+        self._stopping = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._run(),), name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def reconnect(self, url=None):
+        """현재 연결을 끊고 (필요하면 새 URL로) 다시 연결합니다."""
+        if url is not None:
+            self.url = url
+        self._reconnect = True
+
+    async def _run(self):
+        backoff = 1
+        while not self._stopping:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, close_timeout=1) as ws:
+                    self.connected = True
+                    backoff = 1
+                    logging.info(f"[{self.name}] connected: {self.url[:80]}")
+                    self._reconnect = False
+                    while not self._stopping and not self._reconnect:
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                        except asyncio.TimeoutError:
+                            continue
+                        self.last_message_time = time.time()
+                        try:
+                            self.on_message(json.loads(raw))
+                        except Exception as e:
+                            logging.error(f"[{self.name}] message handling error: {e}")
+            except Exception as e:
+                logging.warning(f"[{self.name}] disconnected: {e} (retry in {backoff}s)")
+            self.connected = False
+            if not self._stopping and not self._reconnect:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+class MarketStream:
+    """하나의 멀티플렉스 연결로 심볼별 체결가, 마크 가격, 1분봉을 로컬 상태로 유지합니다."""
+
+    def __init__(self, symbols, url=None, stale_after=None):
+        self.symbols = list(symbols)
+        self.stale_after = stale_after if stale_after is not None else CONFIG.get('STREAM_STALE_SECONDS', 10)
+        self._tickers = {stream_symbol(t): t for t in self.symbols}
+        self._state = {t: {} for t in self.symbols}
+        streams = []
+        for name in self._tickers:
+            streams += [f"{name}@ticker", f"{name}@markPrice@1s", f"{name}@kline_1m"]
+        base_url = url or CONFIG.get('MARKET_STREAM_URL', 'wss://fstream.binance.com/stream')
+        self.connection = StreamConnection(f"{base_url}?streams={'/'.join(streams)}", self._on_message, 'market-stream')
+
+    def start(self):
+        return self.connection.start()
+
+    def stop(self):
+        self.connection.stop()
+
+    def _on_message(self, message):
+        data = message.get('data', message)
+        ticker = self._tickers.get(str(data.get('s', '')).lower())
+        if ticker is None:
+            return
+        state = self._state[ticker]
+        now = time.time()
+        event = data.get('e')
+        if event == '24hrTicker':
+            state['price'] = float(data['c'])
+            state['price_time'] = now
+        elif event == 'markPriceUpdate':
+            state['mark_price'] = float(data['p'])
+            state['funding_rate'] = float(data.get('r') or 0.0)
+            state['mark_time'] = now
+        elif event == 'kline':
+            self._apply_kline(ticker, data['k'], now)
+
+    def _apply_kline(self, ticker, k, now):
+        """1분봉을 OHLCV 캐시에 반영합니다. 공백이 생기면 REST 증분 조회가 메우도록 둡니다."""
+        buf = ohlcv_cache.buffer(ticker, '1m')
+        start = int(k['t'])
+        with buf.lock:  # 확인과 반영 사이에 REST 재조회가 버퍼를 바꾸지 않도록
+            last_ts = buf.last_timestamp
+            if last_ts is None or start > last_ts + KLINE_INTERVAL_MS:
+                return
+            buf.upsert([[start, float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])]])
+            buf.last_refresh = now
+        if k.get('x'):
+            self._state[ticker]['closed_kline_time'] = start
+
+    def _fresh(self, ticker, key):
+        state = self._state.get(ticker, {})
+        return self.connection.connected and time.time() - state.get(key, 0) < self.stale_after
+
+    def last_price(self, ticker):
+        """최신 체결가. 스트림이 끊겼거나 오래되면 None을 반환합니다."""
+        return self._state[ticker].get('price') if self._fresh(ticker, 'price_time') else None
+
+    def mark_price(self, ticker):
+        return self._state[ticker].get('mark_price') if self._fresh(ticker, 'mark_time') else None
+
+    def funding_rate(self, ticker):
+        return self._state[ticker].get('funding_rate') if self._fresh(ticker, 'mark_time') else None
+
+
+_market_stream = None
+
+
+def start_market_stream(symbols, url=None):
+    """프로세스 전역 마켓 스트림을 시작합니다."""
+    global _market_stream
+    if _market_stream is not None:
+        return _market_stream
+    _market_stream = MarketStream(symbols, url)
+    if not _market_stream.start():
+        _market_stream = None
+    return _market_stream
+
+
+def stop_market_stream():
+    global _market_stream
+    if _market_stream is not None:
+        _market_stream.stop()
+        _market_stream = None
+
+
+def stream_price(ticker):
+    """스트림의 최신 체결가. 스트림이 없거나 오래되면 None (네트워크 호출 없음)."""
+    if _market_stream is not None and ticker in _market_stream._state:
+        return _market_stream.last_price(ticker)
+    return None
+
+
+def get_price(binance, ticker):
+    """스트림 가격을 우선 사용하고, 스트림이 없거나 오래되면 REST로 조회합니다."""
+    price = stream_price(ticker)
+    if price is not None:
+        return price
+    return mb.GetCoinNowPrice(binance, ticker)
+
+
+def stream_mark_price(ticker):
+    """스트림의 마크 가격. 스트림이 없거나 오래되면 None (네트워크 호출 없음)."""
+    if _market_stream is not None and ticker in _market_stream._state:
+        return _market_stream.mark_price(ticker)
+    return None
+
+
+def get_mark_price(binance, ticker):
+    price = stream_mark_price(ticker)
+    if price is not None:
+        return price
+    return float(binance.fapiPublicGetPremiumIndex({'symbol': stream_symbol(ticker).upper()})['markPrice'])
+
+
+class LocalStreamServer:
+    """오프라인 테스트용 로컬 스트림 서버. 바이낸스 결합 스트림 형식으로 메시지를 방송합니다.
+
+    사용 예:
+        server = LocalStreamServer(port=8765); server.start()
+        start_market_stream(CONFIG['SYMBOLS'], url=server.url)
+        server.publish_ticker('ETH/USDT:USDT', 2500.0)
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.host = host
+        self.port = port
+        self.url = f"ws://{host}:{port}/stream"
+        self._clients = set()
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stop_event = None
+
+    def start(self):
+        if websockets is None:
+            raise RuntimeError("LocalStreamServer requires the websockets package")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),), name='local-stream-server', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self):
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+            self._thread.join(timeout=5)
+
+    async def _serve(self):
+        self._stop_event = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port):
+            self._ready.set()
+            await self._stop_event.wait()
+
+    async def _handler(self, websocket, path=None):
+        self._clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._clients.discard(websocket)
+
+    def publish(self, stream, data):
+        """결합 스트림 메시지 하나를 연결된 모든 클라이언트에 보냅니다. (임의 스레드에서 호출 가능)"""
+        raw = json.dumps({'stream': stream, 'data': data})
+
+        async def _broadcast():
+            for ws in list(self._clients):
+                try:
+                    await ws.send(raw)
+                except Exception:
+                    self._clients.discard(ws)
+
+        asyncio.run_coroutine_threadsafe(_broadcast(), self._loop).result(timeout=5)
+
+    def publish_ticker(self, ticker, price):
+        name = stream_symbol(ticker)
+        self.publish(f"{name}@ticker", {'e': '24hrTicker', 'E': int(time.time() * 1000), 's': name.upper(), 'c': str(price)})
+
+    def publish_mark_price(self, ticker, mark_price, funding_rate=0.0001):
+        name = stream_symbol(ticker)
+        self.publish(f"{name}@markPrice@1s", {'e': 'markPriceUpdate', 'E': int(time.time() * 1000), 's': name.upper(),
+                                              'p': str(mark_price), 'r': str(funding_rate)})
+
+    def publish_kline(self, ticker, row, closed=False):
+        """row: (start_ms, open, high, low, close, volume)"""
+        name = stream_symbol(ticker)
+        start, o, h, l, c, v = row
+        self.publish(f"{name}@kline_1m", {'e': 'kline', 'E': int(time.time() * 1000), 's': name.upper(), 'k': {
+            't': int(start), 'T': int(start) + KLINE_INTERVAL_MS - 1, 's': name.upper(), 'i': '1m',
+            'o': str(o), 'h': str(h), 'l': str(l), 'c': str(c), 'v': str(v), 'x': closed}})
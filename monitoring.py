@@ -1,25 +1,33 @@
 # monitoring.py
 import logging
-from line_alert import SendMessage
-from utils import cumulative_funding, handle_exception
+from notifier import notify
+from utils import handle_exception, get_cached_data, funding_cache, symbol_tags
+import cache
 import myBinance as mb
 from config import CONFIG
+import indicator_memo
+import fill_store
+from pnl_engine import pnl_engine
 
 def send_daily_pnl(exchange_handler):
-    """일일 PnL 보고서를 전송합니다."""
+    """일일 PnL 보고서를 전송합니다. (최근 24시간 체결의 실현 손익 - 수수료 + 펀딩비)"""
     try:
         total_pnl = 0
         message = "[일일 PnL 보고]\n"
+        snapshot = exchange_handler.refresh_snapshot()
+        fill_store.ingest_fills(exchange_handler.exchange)  # 보고 직전까지의 체결 반영
+        since = exchange_handler.exchange.milliseconds() - 86400 * 1000  # 최근 24시간 (거래소 시계)
         
         for ticker in CONFIG['SYMBOLS']:
-            long_value = mb.GetCoinRealMoney(exchange_handler.fetch_balance(), ticker, 'LONG')
-            short_value = mb.GetCoinRealMoney(exchange_handler.fetch_balance(), ticker, 'SHORT')
-            ticker_pnl = long_value + short_value - cumulative_funding.get(ticker, 0)
-            total_pnl += ticker_pnl
-            message += f"- {ticker}: {ticker_pnl:.2f} USDT\n"
+            pnl_engine.update(ticker, {side: snapshot.position_amount(ticker, side) for side in ('LONG', 'SHORT')})
+            current_price = mb.GetCoinNowPrice(exchange_handler.exchange, ticker)
+            day = pnl_engine.summary(ticker, current_price, since)
+            total_pnl += day['net']
+            message += (f"- {ticker}: {day['net']:.2f} USDT (실현 {day['realized']:.2f}, 수수료 {day['fees']:.2f}, "
+                        f"펀딩 {day['funding']:.2f}, 체결 {day['fills']}건, 미실현 {day['unrealized']:.2f})\n")
 
         message += f"💰 총 PnL: {total_pnl:.2f} USDT"
-        SendMessage(message)
+        notify(message)
         logging.info("Daily PnL report sent.")
     except Exception as e:
         handle_exception("System", "Daily PnL report", e, "daily_pnl_error")
@@ -29,12 +37,14 @@ def send_status_report(exchange_handler):
     try:
         logging.info("6시간 상태 보고 시작")
         report = ""
+        snapshot = exchange_handler.refresh_snapshot()
         for ticker in CONFIG['SYMBOLS']:
             current_price = mb.GetCoinNowPrice(exchange_handler.exchange, ticker)
-            long_value = mb.GetCoinRealMoney(exchange_handler.fetch_balance(), ticker, 'LONG')
-            short_value = mb.GetCoinRealMoney(exchange_handler.fetch_balance(), ticker, 'SHORT')
-            orders = exchange_handler.fetch_open_orders(ticker)
-            funding_rate = exchange_handler.exchange.fetch_funding_rate(ticker)['fundingRate']
+            long_value = snapshot.position_value(ticker, 'LONG')
+            short_value = snapshot.position_value(ticker, 'SHORT')
+            orders = snapshot.orders(ticker)
+            funding_rate = get_cached_data(funding_cache, ticker, lambda: exchange_handler.exchange.fetch_funding_rate(ticker)['fundingRate'],
+                                           tags=symbol_tags(ticker))
             
             report += f"""
 📊 {ticker} 상태 보고
@@ -44,7 +54,9 @@ def send_status_report(exchange_handler):
 - 활성 주문: {len(orders)}개
 - 펀딩비: {funding_rate*100:.4f}%
 """
-        SendMessage(report)
+        notify(report)
+        indicator_memo.log_stats()
+        cache.log_stats()
         logging.info("6시간 상태 보고 완료")
     except Exception as e:
         logging.error(f"Error sending status report: {e}")
@@ -4,6 +4,8 @@ import pandas as pd
 import pprint
 import numpy
 import datetime
+import position_book
+import market_specs
 from cryptography.fernet import Fernet
 
 
@@ -189,13 +191,8 @@ def GetStoch(ohlcv,period,st):
 
 #분봉/일봉 캔들 정보를 가져온다 첫번째: 바이낸스 객체, 두번째: 코인 티커, 세번째: 기간 (1d,4h,1h,15m,5m ...), 네번째: 데이터 개수
 def GetOhlcv(binance, Ticker, period, count=500):
-    #데이터 샘플을 가져와서 시간 간격 계산
-    initial_data = binance.fetch_ohlcv(Ticker, period, limit=2)
-    if len(initial_data) < 2:
-        return pd.DataFrame()
-    
-    # 연속된 두 캔들 사이의 시간 간격 계산
-    timeframe_ms = initial_data[1][0] - initial_data[0][0]
+    # 타임프레임 문자열로 캔들 간격 계산 (샘플 요청 없이)
+    timeframe_ms = binance.parse_timeframe(period) * 1000
     
     # 현재 시간을 마지막 타임스탬프로 사용
     last_timestamp = int(datetime.datetime.now().timestamp() * 1000)
@@ -216,7 +213,6 @@ def GetOhlcv(binance, Ticker, period, count=500):
         final_list.extend(ohlcv_data)
         date_start_ms = ohlcv_data[-1][0] + timeframe_ms
         remaining_count -= len(ohlcv_data)
-        time.sleep(0.1)
     
     # 정확한 개수만큼 데이터 자르기
     final_list = final_list[:count]
@@ -243,8 +239,6 @@ def GetOhlcv(binance, Ticker, period, count=500):
 #네번째 웹훅 알림에서 사용할때는 마지막 파라미터를 False로 넘겨서 사용한다. 트레이딩뷰 웹훅 강의 참조..
 def SetStopLoss(binance, Ticker, cut_rate, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
         
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
@@ -260,24 +254,20 @@ def SetStopLoss(binance, Ticker, cut_rate, Rest = True):
     #스탑로스 주문이 없다면 주문을 건다!
     if StopLossOk == False:
 
-        if Rest == True:
-            time.sleep(10.0)
 
         #잔고 데이타를 가지고 온다.
         balance = binance.fetch_balance(params={"type": "future"})
 
-        if Rest == True:
-            time.sleep(0.1)
                                 
         amt = 0
         entryPrice = 0
         leverage = 0
         #평균 매입단가와 수량을 가지고 온다.
-        for posi in balance['info']['positions']:
-            if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", ""):
-                entryPrice = float(posi['entryPrice'])
-                amt = float(posi['positionAmt'])
-                leverage = float(posi['leverage'])
+        posi = position_book.get_book(balance).find(Ticker)
+        if posi is not None:
+            entryPrice = float(posi['entryPrice'])
+            amt = float(posi['positionAmt'])
+            leverage = float(posi['leverage'])
 
 
         #롱일땐 숏을 잡아야 되고
@@ -315,8 +305,6 @@ def SetStopLoss(binance, Ticker, cut_rate, Rest = True):
 #네번째 웹훅 알림에서 사용할때는 마지막 파라미터를 False로 넘겨서 사용한다. 트레이딩뷰 웹훅 강의 참조..
 def SetStopLossPrice(binance, Ticker, StopPrice, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
         
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
@@ -332,23 +320,19 @@ def SetStopLossPrice(binance, Ticker, StopPrice, Rest = True):
     #스탑로스 주문이 없다면 주문을 건다!
     if StopLossOk == False:
 
-        if Rest == True:
-            time.sleep(10.0)
 
         #잔고 데이타를 가지고 온다.
         balance = binance.fetch_balance(params={"type": "future"})
 
-        if Rest == True:
-            time.sleep(0.1)
                                 
         amt = 0
         entryPrice = 0
 
         #평균 매입단가와 수량을 가지고 온다.
-        for posi in balance['info']['positions']:
-            if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", ""):
-                entryPrice = float(posi['entryPrice'])
-                amt = float(posi['positionAmt'])
+        posi = position_book.get_book(balance).find(Ticker)
+        if posi is not None:
+            entryPrice = float(posi['entryPrice'])
+            amt = float(posi['positionAmt'])
           
 
         #롱일땐 숏을 잡아야 되고
@@ -379,8 +363,6 @@ def SetStopLossPrice(binance, Ticker, StopPrice, Rest = True):
 #스탑로스를 걸어놓는다. 해당 가격에 해당되면 바로 손절한다. 첫번째: 바이낸스 객체, 두번째: 코인 티커, 세번째: 손절 수익율 (1.0:마이너스100% 청산, 0.9:마이너스 90%, 0.5: 마이너스 50%)
 def SetStopLossLong(binance, Ticker, cut_rate, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
 
@@ -391,13 +373,9 @@ def SetStopLossLong(binance, Ticker, cut_rate, Rest = True):
 
             break
 
-    if Rest == True:
-        time.sleep(2.0)
 
     #잔고 데이타를 가지고 온다.
     balance = binance.fetch_balance(params={"type": "future"})
-    if Rest == True:
-        time.sleep(0.1)
                             
 
 
@@ -406,13 +384,11 @@ def SetStopLossLong(binance, Ticker, cut_rate, Rest = True):
     leverage = 0
 
     #롱잔고
-    for posi in balance['info']['positions']:
-        if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", "")  and posi['positionSide'] == 'LONG':
-
-            amt_b = float(posi['positionAmt'])
-            entryPrice_b = float(posi['entryPrice'])
-            leverage = float(posi['leverage'])
-            break
+    posi = position_book.get_book(balance).get(Ticker, 'LONG')
+    if posi is not None:
+        amt_b = float(posi['positionAmt'])
+        entryPrice_b = float(posi['entryPrice'])
+        leverage = float(posi['leverage'])
 
 
     #롱일땐 숏을 잡아야 되고
@@ -452,8 +428,6 @@ def SetStopLossLong(binance, Ticker, cut_rate, Rest = True):
 #스탑로스를 걸어놓는다. 해당 가격에 해당되면 바로 손절한다. 첫번째: 바이낸스 객체, 두번째: 코인 티커, 세번째: 손절 수익율 (1.0:마이너스100% 청산, 0.9:마이너스 90%, 0.5: 마이너스 50%)
 def SetStopLossShort(binance, Ticker, cut_rate, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
 
@@ -462,13 +436,9 @@ def SetStopLossShort(binance, Ticker, cut_rate, Rest = True):
         if order['status'] == "open" and order['type'] == 'stop_market' and order['info']['positionSide'] == "SHORT":
             binance.cancel_order(order['id'],Ticker)
 
-    if Rest == True:
-        time.sleep(2.0)
 
     #잔고 데이타를 가지고 온다.
     balance = binance.fetch_balance(params={"type": "future"})
-    if Rest == True:
-        time.sleep(0.1)
                             
 
 
@@ -478,14 +448,11 @@ def SetStopLossShort(binance, Ticker, cut_rate, Rest = True):
     leverage = 0
 
     #숏잔고
-    for posi in balance['info']['positions']:
-        if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", "") and posi['positionSide'] == 'SHORT':
-
-            amt_s = float(posi['positionAmt'])
-            entryPrice_s= float(posi['entryPrice'])
-            leverage = float(posi['leverage'])
-
-            break
+    posi = position_book.get_book(balance).get(Ticker, 'SHORT')
+    if posi is not None:
+        amt_s = float(posi['positionAmt'])
+        entryPrice_s= float(posi['entryPrice'])
+        leverage = float(posi['leverage'])
 
 
 
@@ -532,8 +499,6 @@ def SetStopLossShort(binance, Ticker, cut_rate, Rest = True):
 #스탑로스를 걸어놓는다. 해당 가격에 해당되면 바로 손절한다. 첫번째: 바이낸스 객체, 두번째: 코인 티커, 세번째: 손절 가격
 def SetStopLossLongPrice(binance, Ticker, StopPrice, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
 
@@ -544,13 +509,9 @@ def SetStopLossLongPrice(binance, Ticker, StopPrice, Rest = True):
 
             break
 
-    if Rest == True:
-        time.sleep(2.0)
 
     #잔고 데이타를 가지고 온다.
     balance = binance.fetch_balance(params={"type": "future"})
-    if Rest == True:
-        time.sleep(0.1)
                             
 
 
@@ -558,12 +519,10 @@ def SetStopLossLongPrice(binance, Ticker, StopPrice, Rest = True):
     entryPrice_b = 0 #평균 매입 단가. 따라서 물을 타면 변경 된다.
 
     #롱잔고
-    for posi in balance['info']['positions']:
-        if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", "")  and posi['positionSide'] == 'LONG':
-
-            amt_b = float(posi['positionAmt'])
-            entryPrice_b = float(posi['entryPrice'])
-            break
+    posi = position_book.get_book(balance).get(Ticker, 'LONG')
+    if posi is not None:
+        amt_b = float(posi['positionAmt'])
+        entryPrice_b = float(posi['entryPrice'])
 
 
     #롱일땐 숏을 잡아야 되고
@@ -597,8 +556,6 @@ def SetStopLossLongPrice(binance, Ticker, StopPrice, Rest = True):
 #스탑로스를 걸어놓는다. 해당 가격에 해당되면 바로 손절한다. 첫번째: 바이낸스 객체, 두번째: 코인 티커, 세번째: 손절 가격
 def SetStopLossShortPrice(binance, Ticker, StopPrice, Rest = True):
 
-    if Rest == True:
-        time.sleep(0.1)
     #주문 정보를 읽어온다.
     orders = binance.fetch_orders(Ticker)
 
@@ -607,13 +564,9 @@ def SetStopLossShortPrice(binance, Ticker, StopPrice, Rest = True):
         if order['status'] == "open" and order['type'] == 'stop_market' and order['info']['positionSide'] == "SHORT":
             binance.cancel_order(order['id'],Ticker)
 
-    if Rest == True:
-        time.sleep(2.0)
 
     #잔고 데이타를 가지고 온다.
     balance = binance.fetch_balance(params={"type": "future"})
-    if Rest == True:
-        time.sleep(0.1)
                             
 
 
@@ -622,13 +575,10 @@ def SetStopLossShortPrice(binance, Ticker, StopPrice, Rest = True):
     entryPrice_s = 0 #평균 매입 단가. 따라서 물을 타면 변경 된다.
 
     #숏잔고
-    for posi in balance['info']['positions']:
-        if posi['symbol'] == Ticker.replace("/", "").replace(":USDT", "") and posi['positionSide'] == 'SHORT':
-
-            amt_s = float(posi['positionAmt'])
-            entryPrice_s= float(posi['entryPrice'])
-
-            break
+    posi = position_book.get_book(balance).get(Ticker, 'SHORT')
+    if posi is not None:
+        amt_s = float(posi['positionAmt'])
+        entryPrice_s= float(posi['entryPrice'])
 
 
 
@@ -713,27 +663,20 @@ def GetHasCoinCnt(binance):
 
     #잔고 데이타 가져오기 
     balances = binance.fetch_balance(params={"type": "future"})
-    time.sleep(0.1)
 
     #선물 마켓에서 거래중인 코인을 가져옵니다.
     Tickers = binance.fetch_tickers()
 
     
+    open_symbols = position_book.get_book(balances).open_symbols()
+
     CoinCnt = 0
     #모든 선물 거래가능한 코인을 가져온다.
     for ticker in Tickers:
 
         if "/USDT" in ticker:
-            Target_Coin_Symbol = ticker.replace("/", "").replace(":USDT", "")
-
-            amt = 0
-            #실제로 잔고 데이타의 포지션 정보 부분에서 해당 코인에 해당되는 정보를 넣어준다.
-            for posi in balances['info']['positions']:
-                if posi['symbol'] == Target_Coin_Symbol:
-                    amt = float(posi['positionAmt'])
-                    break
-
-            if amt != 0:
+            #포지션이 있는 코인 집합에서 바로 확인한다.
+            if position_book.symbol_id(ticker) in open_symbols:
                 CoinCnt += 1
 
 
@@ -907,51 +850,15 @@ def create_trailing_buy_order_Short(binance, Ticker, amount, activationPrice=Non
 # 최소 주문 단위 금액 구하는 함수
 # https://blog.naver.com/zhanggo2/222722244744 
 # 이 함수는 이곳을 참고하세요 
-def GetMinimumAmount(binance, ticker):
+# 마켓 스펙 테이블(market_specs)로 계산하므로 price를 넘기면 네트워크 요청이 없습니다.
+def GetMinimumAmount(binance, ticker, price=None):
 
-    
     t_ticker = ticker.replace(":USDT","")
 
-    limit_values = None
-
-    try:
-        limit_values = binance.markets[t_ticker+":USDT"]['limits']
-    except Exception as e:
-        limit_values = binance.markets[t_ticker]['limits']
-
-
-
-    min_amount = float(limit_values['amount']['min'])
-    min_cost = float(limit_values['cost']['min'])
-    min_price = float(limit_values['price']['min'])
-
-    coin_info = binance.fetch_ticker(t_ticker)
+    if price is None:
+        price = binance.fetch_ticker(t_ticker)['last']
 
-    coin_price = coin_info['last']
-
-    print("min_cost: ",min_cost)
-    print("min_amount: ",min_amount)
-    print("min_price: ",min_price)
-    print("coin_price: ",coin_price)
-
-    # get mininum unit price to be able to order
-    if min_price < coin_price:
-        min_price = coin_price
-
-    # order cost = price * amount
-    min_order_cost = min_price * min_amount
-
-    num_min_amount = 1
-
-    if min_cost is not None and min_order_cost < min_cost:
-        # if order cost is smaller than min cost
-        # increase the order cost bigger than min cost
-        # by the multiple number of minimum amount
-        while min_order_cost < min_cost:
-            num_min_amount = num_min_amount + 1
-            min_order_cost = min_price * (num_min_amount * min_amount)
-
-    return num_min_amount * min_amount
+    return market_specs.get_min_amount(binance, ticker, price)
 
 
 
@@ -965,11 +872,6 @@ def GetTotalRealMoney(balance):
 #코인의 평가 금액을 구한다!
 def GetCoinRealMoney(balance,ticker,posiSide):
 
-    Money = 0
-
-    for posi in balance['info']['positions']:
-        if posi['symbol'] == ticker.replace("/", "").replace(":USDT", "") and posi['positionSide'] == posiSide:
-            Money = float(posi['initialMargin']) + float(posi['unrealizedProfit'])
-            break
+    Money = position_book.get_book(balance).value_of(ticker, posiSide)
 
     return Money
\ No newline at end of file
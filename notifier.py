@@ -0,0 +1,201 @@
+# notifier.py
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from config import CONFIG
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class StubTransport:
+    """보낸 메시지를 메모리에 모으는 로컬 전송 (테스트/시뮬레이터용)."""
+
+    def __init__(self, echo=False):
+        self.sent = []
+        self.echo = echo
+
+    def __call__(self, text):
+        self.sent.append(text)
+        if self.echo:
+            print(text)
+
+
+def line_alert_transport(text):
+    """line_alert의 채널(텔레그램 등)로 보냅니다. 디스패처 스레드의 이벤트 루프에서 실행됩니다."""
+    import line_alert  # 텔레그램 등 전송 의존성은 실제로 보낼 때만 불러옴
+    line_alert.SendMessage(text)
+
+
+def create_transport(name=None):
+    name = name or CONFIG.get('NOTIFY_TRANSPORT', 'line_alert')
+    if name == 'stub':
+        return StubTransport()
+    if name == 'line_alert':
+        return line_alert_transport
+    raise ValueError(f"Unknown notify transport: {name}")
+
+
+class NotificationDispatcher:
+    """알림을 제한된 큐에 넣기만 하고, 백그라운드 스레드가 모아서 보내는 디스패처입니다.
+
+    배치 창(NOTIFY_BATCH_WINDOW) 안에 들어온 알림은 한 메시지로 묶고, 같은 키(심볼, 이벤트 종류)는
+    한 줄로 합쳐 횟수만 표시합니다. 큐가 가득 차면 NOTIFY_OVERFLOW 정책(drop_newest/drop_oldest/block)을 따릅니다.
+    """
+
+    def __init__(self, transport=None, maxsize=None, window=None, overflow=None):
+        self._transport = transport
+        self.window = window if window is not None else CONFIG.get('NOTIFY_BATCH_WINDOW', 2.0)
+        self.overflow = overflow or CONFIG.get('NOTIFY_OVERFLOW', 'drop_oldest')
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown notify overflow policy: {self.overflow}")
+        self.max_length = CONFIG.get('NOTIFY_MAX_LENGTH', 4000)  # 텔레그램 메시지 길이 제한 (4096자) 이내
+        self._queue = queue.Queue(maxsize or CONFIG.get('NOTIFY_QUEUE_SIZE', 1000))
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._suppressed = {}  # 키 -> 쿨다운으로 억제된 횟수 (같은 키의 다음 실제 알림에 붙여 보낸 뒤 비움)
+        self._suppressed_lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            self._transport = create_transport()
+        return self._transport
+
+    # --- 호출 경로 (큐에 넣기만 함) ---
+    def notify(self, message, key=None):
+        """알림을 큐에 넣습니다. key가 같은 알림은 배치 안에서 한 줄로 합쳐집니다."""
+        self._put((key, message))
+
+    def suppressed(self, key):
+        """쿨다운으로 보내지 않은 알림을 셉니다. 횟수는 같은 키의 다음 실제 알림에 붙고, 이것만으로는 보내지 않습니다."""
+        with self._suppressed_lock:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+
+    def _put(self, item):
+        self._ensure_thread()
+        self.submitted += 1
+        try:
+            if self.overflow == 'block':
+                self._queue.put(item, timeout=CONFIG.get('NOTIFY_BLOCK_TIMEOUT', 0.05))
+            else:
+                self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == 'drop_oldest':
+            try:
+                self._queue.get_nowait()  # 가장 오래된 알림을 버리고 새 알림을 넣는다
+                self._queue.task_done()
+                self._queue.put_nowait(item)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+                self._thread.start()
+
+    # --- 백그라운드 전송 ---
+    def _run(self):
+        # 텔레그램 전송(asyncio)이 이 스레드의 이벤트 루프를 쓰도록 한다
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.time() + self.window
+                while batch[-1] is not None:  # 배치 창이 끝날 때까지 모은다 (None은 종료 신호)
+                    remaining = deadline - time.time()
+                    try:
+                        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                items = [item for item in batch if item is not None]
+                if items:
+                    with self._suppressed_lock:
+                        text = digest(items, self._suppressed)
+                    self._send(text)
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            loop.close()
+
+    def _send(self, text):
+        if not text:
+            return
+        for start in range(0, len(text), self.max_length):
+            try:
+                self.transport(text[start:start + self.max_length])
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Failed to send notification: {e}")
+
+    def flush(self):
+        """큐에 남은 알림을 모두 보낼 때까지 기다립니다."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """남은 알림을 보내고 스레드를 멈춥니다."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        return {'submitted': self.submitted, 'dropped': self.dropped, 'sent': self.sent,
+                'failed': self.failed, 'queued': self._queue.qsize()}
+
+
+def digest(items, suppressed=None):
+    """(키, 메시지) 목록을 한 메시지로 묶습니다. 같은 키(키가 없으면 같은 문구)는 한 줄로 합칩니다.
+
+    suppressed(키 -> 쿨다운 억제 횟수)에서 같은 키의 횟수를 꺼내 그 줄에 붙입니다. 알림이 없는 키의 횟수는 남겨 둡니다.
+    """
+    suppressed = {} if suppressed is None else suppressed
+    lines = OrderedDict()  # 키 -> [첫 메시지, 횟수]
+    for key, message in items:
+        entry_key = key if key is not None else message
+        entry = lines.get(entry_key)
+        if entry is None:
+            entry = lines[entry_key] = [message, 0]
+        entry[1] += 1
+
+    out = []
+    for entry_key, (message, count) in lines.items():
+        extra = [f"×{count}"] if count > 1 else []
+        skipped = suppressed.pop(entry_key, 0)
+        if skipped:
+            extra.append(f"쿨다운 억제 {skipped}건")
+        out.append(f"{message} ({', '.join(extra)})" if extra else message)
+    if len(out) == 1:
+        return out[0]
+    return f"[알림 {sum(count for _, count in lines.values())}건]\n" + "\n".join(out)
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.close)
+
+
+def notify(message, key=None):
+    dispatcher.notify(message, key)
+
+
+def notify_suppressed(key):
+    dispatcher.suppressed(key)
@@ -0,0 +1,226 @@
+# ohlcv_cache.py
+import itertools
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import CONFIG
+from utils import log_debug_as_info
+
+# 캔들 행 레이아웃: (timestamp_ms, open, high, low, close, volume) - 전부 float64
+OHLCV_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+MAX_FETCH_LIMIT = 1000  # 바이낸스 선물 fetch_ohlcv 1회 최대 개수
+_revisions = itertools.count(1)  # 모든 버퍼가 함께 쓰는 revision 번호 (버퍼를 새로 만들어도 번호가 겹치지 않음)
+
+
+class CandleBuffer:
+    """단일 (심볼, 타임프레임)의 캔들을 보관하는 링 버퍼입니다.
+
+    용량의 2배 크기 배열에 행을 이어 붙이고 끝에 닿으면 최근 capacity개만 앞으로 당깁니다.
+    스트림 스레드와 메인 루프가 함께 쓰므로 변경과 읽기는 lock 안에서 하고, 읽기는 복사본을 돌려줍니다.
+    """
+
+    def __init__(self, capacity, key=None):
+        self.capacity = capacity
+        self.key = key  # (심볼, 타임프레임)
+        self._data = np.full((capacity * 2, 6), np.nan)
+        self._start = 0
+        self._end = 0
+        self.last_refresh = 0.0  # 마지막으로 거래소와 동기화한 시각 (거래소 시계, 초)
+        self.revision = 0  # 내용이 바뀔 때마다 새 번호로 바뀜
+        self.history_exhausted = False  # 전체 조회가 요청보다 적게 왔음 (상장 직후 등 거래소에 더 오래된 캔들이 없음)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_timestamp(self):
+        with self.lock:
+            if self._end == self._start:
+                return None
+            return int(self._data[self._end - 1, 0])
+
+    def clear(self):
+        with self.lock:
+            self._start = 0
+            self._end = 0
+            self.revision = next(_revisions)
+
+    def _compact(self):
+        size = self._end - self._start
+        self._data[:size] = self._data[self._start:self._end]
+        self._start = 0
+        self._end = size
+
+    def upsert(self, rows):
+        """캔들 행을 반영합니다. 같은 시각의 캔들은 제자리에서 갱신하고 더 새로운 캔들만 추가합니다."""
+        with self.lock:
+            return self._upsert(rows)
+
+    def _upsert(self, rows):
+        changed = False
+        for row in rows:
+            ts = float(row[0])
+            if self._end > self._start:
+                last_ts = self._data[self._end - 1, 0]
+                if ts < last_ts:
+                    # 이미 보관 중인 과거 캔들이면 해당 위치만 갱신
+                    timestamps = self._data[self._start:self._end, 0]
+                    idx = int(np.searchsorted(timestamps, ts))
+                    if idx < len(timestamps) and timestamps[idx] == ts:
+                        self._data[self._start + idx] = row[:6]
+                        changed = True
+                    continue
+                if ts == last_ts:
+                    # 아직 형성 중인 마지막 캔들 갱신
+                    self._data[self._end - 1] = row[:6]
+                    changed = True
+                    continue
+            if self._end == len(self._data):
+                self._compact()
+            self._data[self._end] = row[:6]
+            self._end += 1
+            if self._end - self._start > self.capacity:
+                self._start += 1
+            changed = True
+        if changed:
+            self.revision = next(_revisions)
+        return changed
+
+    def snapshot(self, count=None):
+        """최근 count개 캔들의 읽기 전용 (N, 6) 복사본과 그때의 revision을 함께 반환합니다.
+
+        스트림 스레드가 형성 중인 캔들을 제자리에서 바꾸거나 앞으로 당겨도 복사본은 바뀌지 않습니다.
+        """
+        with self.lock:
+            start = self._start if count is None else max(self._start, self._end - count)
+            rows = self._data[start:self._end].copy()
+            revision = self.revision
+        rows.flags.writeable = False
+        return rows, revision
+
+    def since(self, timestamp):
+        """timestamp 이후(포함) 캔들만 읽기 전용 복사본으로 반환합니다. 버퍼 전체를 복사하지 않습니다.
+
+        timestamp가 버퍼의 첫 캔들보다 이전이면(이어지지 않으면) None을 반환합니다.
+        """
+        with self.lock:
+            timestamps = self._data[self._start:self._end, 0]
+            if len(timestamps) == 0 or timestamp < timestamps[0]:
+                return None
+            idx = int(np.searchsorted(timestamps, timestamp))
+            rows = self._data[self._start + idx:self._end].copy()
+        rows.flags.writeable = False
+        return rows
+
+    def array(self, count=None):
+        """최근 count개 캔들의 읽기 전용 (N, 6) 배열(복사본)을 반환합니다."""
+        return self.snapshot(count)[0]
+
+    def frame(self, count=None):
+        """GetOhlcv와 같은 형태(datetime 인덱스, open~volume 컬럼)의 DataFrame을 반환합니다."""
+        rows, revision = self.snapshot(count)
+        index = pd.DatetimeIndex(pd.to_datetime(rows[:, 0].astype('int64'), unit='ms'), name='datetime')
+        frame = pd.DataFrame(rows[:, 1:], index=index, columns=OHLCV_FIELDS, copy=False)
+        if self.key is not None:
+            # 지표 메모이즈 키: 복사한 시점의 revision이므로 내용과 항상 일치한다
+            last_ts = int(rows[-1, 0]) if len(rows) else None
+            frame.attrs['candle_key'] = (*self.key, len(rows), last_ts, revision)
+        return frame
+
+
+class OhlcvCache:
+    """(심볼, 타임프레임)별 CandleBuffer를 관리하고 새 캔들만 증분으로 가져옵니다."""
+
+    def __init__(self, capacity=None, refresh_interval=None):
+        self.capacity = capacity or CONFIG.get('OHLCV_CACHE_SIZE', 1000)
+        self.refresh_interval = refresh_interval if refresh_interval is not None else CONFIG.get('OHLCV_REFRESH_INTERVAL', 2)
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, ticker, timeframe, min_capacity=0):
+        """버퍼를 조회하고 없거나 작으면 새로 만듭니다."""
+        key = (ticker, timeframe)
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is None or buf.capacity < min_capacity:
+                buf = CandleBuffer(max(self.capacity, min_capacity), key)
+                self._buffers[key] = buf
+            return buf
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def plan(self, buf, count, timeframe_ms, now):
+        """필요한 조회를 계산합니다. 갱신이 필요 없으면 None, 아니면 (전체 재조회 여부, since, limit)"""
+        # 거래소에 count개만큼의 과거 캔들이 없으면 모자란 채로 두고 증분 갱신만 한다
+        enough = len(buf) >= count or buf.history_exhausted
+        if enough and now - buf.last_refresh < self.refresh_interval:
+            return None
+        now_ms = int(now * 1000)
+        last_ts = buf.last_timestamp
+        if last_ts is None or not enough or (now_ms - last_ts) // timeframe_ms + 1 > MAX_FETCH_LIMIT:
+            # 보관분이 부족하거나 공백이 너무 크면 전체를 다시 받는다
+            return True, now_ms - timeframe_ms * count, count
+        # 마지막 보관 캔들(형성 중일 수 있음)부터 이후 캔들만 받는다
+        return False, last_ts, min(MAX_FETCH_LIMIT, (now_ms - last_ts) // timeframe_ms + 1)
+
+    def apply(self, buf, rows, full, now, limit=None):
+        """plan에 따라 받은 캔들을 버퍼에 반영합니다. 전체 조회가 limit개보다 적게 오면 과거 캔들이 더 없다고 기록합니다."""
+        with buf.lock:  # 전체 재조회 중에 스트림이 빈 버퍼를 보지 않도록 한 번에 교체
+            if full:
+                buf.clear()
+                buf.history_exhausted = limit is not None and len(rows) < limit
+            buf.upsert(rows)
+            buf.last_refresh = now
+        return buf
+
+    def refresh(self, binance, ticker, timeframe, count):
+        """버퍼가 count개 이상의 최신 캔들을 갖도록 필요한 구간만 거래소에서 가져옵니다."""
+        buf = self.buffer(ticker, timeframe, count)
+        now = binance.milliseconds() / 1000  # 거래소 시계 (시뮬레이터 재생 시각과 맞춤)
+        timeframe_ms = binance.parse_timeframe(timeframe) * 1000
+        plan = self.plan(buf, count, timeframe_ms, now)
+        if plan is None:
+            return buf
+        full, since, limit = plan
+        if full:
+            rows = fetch_ohlcv_range(binance, ticker, timeframe, since, limit, timeframe_ms)
+        else:
+            rows = binance.fetch_ohlcv(ticker, timeframe, since=since, limit=limit)
+        log_debug_as_info(f"{ticker} {timeframe} - OHLCV {'full' if full else 'incremental'} fetch: {len(rows)} candles")
+        return self.apply(buf, rows, full, now, limit)
+
+
+def fetch_ohlcv_range(binance, ticker, timeframe, since, count, timeframe_ms):
+    """since부터 최대 count개의 캔들을 페이지 단위로 가져옵니다."""
+    rows = []
+    remaining = count
+    while remaining > 0:
+        page = binance.fetch_ohlcv(ticker, timeframe, since=since, limit=min(MAX_FETCH_LIMIT, remaining))
+        if not page:
+            break
+        rows.extend(page)
+        since = page[-1][0] + timeframe_ms
+        remaining -= len(page)
+    return rows[:count]
+
+
+ohlcv_cache = OhlcvCache()
+
+
+def get_ohlcv(binance, ticker, timeframe, count=500):
+    """mb.GetOhlcv의 캐시 버전. 최근 count개 캔들을 DataFrame으로 반환합니다."""
+    try:
+        return ohlcv_cache.refresh(binance, ticker, timeframe, count).frame(count)
+    except Exception as e:
+        logging.error(f"{ticker} - OHLCV cache refresh failed: {e}")
+        return pd.DataFrame(columns=OHLCV_FIELDS)
+
+
+def get_ohlcv_array(binance, ticker, timeframe, count=500):
+    """최근 count개 캔들을 (N, 6) 읽기 전용 배열로 반환합니다."""
+    return ohlcv_cache.refresh(binance, ticker, timeframe, count).array(count)
@@ -0,0 +1,279 @@
+# param_sweep.py
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from config import CONFIG
+import backtester
+from resampler import timeframe_ms
+
+CACHE_VERSION = 3  # 백테스트 엔진 규칙이 바뀌면 올려서 이전 결과를 무효화
+# 결과에 영향을 주는 CONFIG 키. 스윕하지 않는 값이 바뀌어도 캐시가 섞이지 않도록 키에 포함한다
+# (MA_PERIOD/RSI_PERIOD는 BacktestData가 지표 시계열을 만들 때 한 번 읽으므로 파라미터로는 스윕할 수 없다)
+CACHE_KEYS = ('MA_PERIOD', 'RSI_PERIOD') + backtester.EQUITY_KEYS + backtester.SIGNAL_KEYS
+
+# 기본 스윕 범위: 값 목록 또는 (시작, 끝, 간격) - 끝 포함
+DEFAULT_RANGES = {
+    'GRID_INTERVAL_MIN': (0.0008, 0.0016, 0.0004),
+    'GRID_INTERVAL_MAX': (0.0016, 0.0032, 0.0008),
+    'MAX_STEPS': [4, 6, 8],
+    'POSITION_SIZE': [0.005, 0.01, 0.02],
+}
+
+
+def expand_range(spec):
+    """값 목록 또는 (시작, 끝, 간격) 범위를 값 리스트로 만듭니다."""
+    if isinstance(spec, tuple) and len(spec) == 3:
+        start, stop, step = spec
+        count = int(round((stop - start) / step)) + 1
+        values = [start + step * i for i in range(count)]
+        return [int(v) if isinstance(start, int) and isinstance(step, int) else round(v, 10) for v in values]
+    return list(spec)
+
+
+def param_grid(ranges):
+    """{CONFIG 키: 범위}의 모든 조합 파라미터 dict 리스트"""
+    keys = sorted(ranges)
+    combos = itertools.product(*(expand_range(ranges[k]) for k in keys))
+    grid = [dict(zip(keys, values)) for values in combos]
+    # 최소 간격이 최대 간격보다 큰 조합은 의미가 없으므로 제외
+    return [p for p in grid if p.get('GRID_INTERVAL_MIN', 0) <= p.get('GRID_INTERVAL_MAX', float('inf'))]
+
+
+def check_sweep_keys(keys):
+    """백테스트가 읽지 않는 키는 거부하고, 신호 통계에만 쓰이는 키는 경고합니다.
+
+    신호 전용 키는 수익률/낙폭이 모든 값에서 같아 기본 objective로는 best_params가 동점 중 아무 값이나 고릅니다.
+    """
+    unused = sorted(k for k in keys if k not in backtester.EQUITY_KEYS and k not in backtester.SIGNAL_KEYS)
+    if unused:
+        raise ValueError(f"sweep keys not used by the backtest: {unused}")
+    signal_only = sorted(k for k in keys if k in backtester.SIGNAL_KEYS)
+    if signal_only:
+        logging.warning(f"Sweep keys {signal_only} only change signal stats; return/max_drawdown are identical across their values")
+
+
+def cache_key(params, data_range, ticker=None, timeframe=None):
+    """(효력 있는 CONFIG 값 + 파라미터, 심볼/타임프레임, 데이터 구간 + 지표 워밍업 시작 시각)의 해시"""
+    effective = {k: CONFIG.get(k) for k in CACHE_KEYS}
+    effective.update(params)
+    payload = json.dumps({'v': CACHE_VERSION, 'params': effective, 'ticker': ticker, 'timeframe': timeframe,
+                          'range': list(data_range)}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """백테스트 요약을 (파라미터, 데이터 구간) 해시로 보관하는 추가 전용 JSONL 캐시입니다."""
+
+    def __init__(self, path=None):
+        self.path = path or CONFIG.get('SWEEP_CACHE_FILE', 'data/backtest_cache.jsonl')
+        self._results = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._results is None:
+            self._results = {}
+            try:
+                with open(self.path, 'r') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            self._results[record['key']] = record['summary']
+                        except (ValueError, KeyError):
+                            continue  # 쓰다가 끊긴 마지막 줄 등은 건너뜀
+            except FileNotFoundError:
+                pass
+        return self._results
+
+    def __len__(self):
+        return len(self._load())
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key, summary):
+        with self._lock:
+            self._load()[key] = summary
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'key': key, 'summary': summary}, default=str) + '\n')
+
+
+result_cache = ResultCache()
+
+
+# --- 공유 메모리: 캔들과 지표 시계열을 한 블록에 담아 워커가 복사 없이 붙는다 ---
+class SharedData:
+    """BacktestData의 캔들(N, 6)과 지표 시계열(K, N)을 공유 메모리 한 블록에 올립니다."""
+
+    def __init__(self, data):
+        self.names = sorted(data.series)
+        n = len(data)
+        self.shape = (n, 6 + len(self.names))
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, n * self.shape[1] * 8))
+        table = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        table[:, :6] = data.candles
+        for i, name in enumerate(self.names):
+            table[:, 6 + i] = data.series[name]
+        self.spec = (self.shm.name, self.shape, self.names, data.timeframe, data.ticker, data.origin)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+_worker = {}  # 워커 프로세스의 공유 메모리 핸들과 BacktestData
+
+
+def _attach(spec):
+    """워커 초기화: 공유 메모리에 붙어 복사 없는 BacktestData를 만듭니다."""
+    name, shape, names, timeframe, ticker, origin = spec
+    shm = shared_memory.SharedMemory(name=name)  # 해제(unlink)는 만든 부모가 한다
+    table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    series = {n: table[:, 6 + i] for i, n in enumerate(names)}
+    _worker['shm'] = shm
+    _worker['data'] = backtester.BacktestData(table[:, :6], timeframe, ticker, series, origin)
+
+
+def _run_task(params, start, end):
+    data = _worker['data'].slice(start, end)
+    return backtester.run_backtest(data, params).summary
+
+
+def run_pairs(data, pairs, workers=None, cache=None):
+    """(params, (start, end)) 쌍들을 백테스트합니다. 구간은 캔들 위치입니다.
+
+    캐시에 있는 쌍은 건너뛰고 새 쌍만 프로세스 풀에서 계산합니다. 워커는 공유 메모리의 캔들/지표를 복사 없이 씁니다.
+    반환값: [(params, (start, end), summary)] - 입력 순서
+    """
+    cache = cache if cache is not None else result_cache
+    workers = workers or CONFIG.get('SWEEP_WORKERS') or os.cpu_count() or 1
+
+    tasks, results, pending = [], {}, []
+    for params, (start, end) in pairs:
+        key = cache_key(params, data.slice(start, end).range, data.ticker, data.timeframe)
+        tasks.append((params, (start, end), key))
+        if key in results:
+            continue
+        summary = cache.get(key)
+        if summary is None:
+            results[key] = None
+            pending.append((params, start, end, key))
+        else:
+            results[key] = summary
+    logging.info(f"Sweep: {len(tasks)} runs, {len(tasks) - len(pending)} cached, {len(pending)} to compute ({workers} workers)")
+
+    started = time.time()
+    if pending and (workers <= 1 or len(pending) == 1):
+        for params, start, end, key in pending:
+            results[key] = backtester.run_backtest(data.slice(start, end), params).summary
+            cache.put(key, results[key])
+    elif pending:
+        shared = SharedData(data)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.spec,)) as pool:
+                futures = [(key, pool.submit(_run_task, params, start, end)) for params, start, end, key in pending]
+                for key, future in futures:
+                    results[key] = future.result()
+                    cache.put(key, results[key])
+        finally:
+            shared.close()
+    if pending:
+        logging.info(f"Sweep: computed {len(pending)} runs in {time.time() - started:.1f}s")
+    return [(params, window, results[key]) for params, window, key in tasks]
+
+
+def sweep(data, ranges, windows=None, workers=None, cache=None):
+    """파라미터 범위({CONFIG 키: 범위}) 또는 파라미터 목록의 모든 조합을 각 구간(기본은 전체)에서 백테스트합니다."""
+    grid = ranges if isinstance(ranges, list) else param_grid(ranges)
+    check_sweep_keys({k for params in grid for k in params})
+    windows = windows or [(0, len(data))]
+    return run_pairs(data, [(params, window) for params in grid for window in windows], workers, cache)
+
+
+def objective(summary):
+    """파라미터 선택 기준: 수익률 / 최대 낙폭 (청산되면 -inf)"""
+    if summary.get('liquidated_at') is not None:
+        return float('-inf')
+    return summary['return'] / max(summary['max_drawdown'], 0.01)
+
+
+def best_params(results, score=None):
+    """sweep 결과 중 score가 가장 높은 (params, summary)"""
+    score = score or objective
+    params, _, summary = max(results, key=lambda r: score(r[2]))
+    return params, summary
+
+
+def walk_forward_windows(length, train_bars, test_bars, step_bars=None):
+    """[(학습 구간, 검증 구간)] 캔들 위치 목록. 구간은 step_bars(기본 test_bars)씩 앞으로 굴러갑니다."""
+    step_bars = step_bars or test_bars
+    windows = []
+    start = 0
+    while start + train_bars + test_bars <= length:
+        train = (start, start + train_bars)
+        windows.append((train, (train[1], train[1] + test_bars)))
+        start += step_bars
+    return windows
+
+
+def walk_forward(data, ranges, train_days=None, test_days=None, workers=None, cache=None, score=None):
+    """롤링 워크포워드: 학습 구간 스윕으로 고른 파라미터를 바로 다음 검증 구간에 적용합니다.
+
+    모든 학습 구간의 스윕을 한 번에 풀로 보내고, 구간별로 고른 파라미터의 검증 실행도 한 번에 보냅니다.
+    반환값: {'windows': [구간별 결과], 'oos_return': 검증 구간 수익률을 이어 붙인 누적 수익률}
+    """
+    bars_per_day = 86_400_000 // timeframe_ms(data.timeframe)
+    train_bars = int((train_days or CONFIG.get('WALK_FORWARD_TRAIN_DAYS', 30)) * bars_per_day)
+    test_bars = int((test_days or CONFIG.get('WALK_FORWARD_TEST_DAYS', 7)) * bars_per_day)
+    windows = walk_forward_windows(len(data), train_bars, test_bars)
+    if not windows:
+        raise ValueError(f"not enough candles for walk-forward ({len(data)} < {train_bars + test_bars})")
+
+    grid = param_grid(ranges)
+    train_results = sweep(data, grid, [train for train, _ in windows], workers, cache)
+    chosen = []
+    for train, test in windows:
+        best, train_summary = best_params([r for r in train_results if r[1] == train], score)
+        chosen.append((train, test, best, train_summary))
+
+    # 검증 구간은 구간마다 고른 파라미터로 한 번에 실행
+    test_results = run_pairs(data, [(best, test) for _, test, best, _ in chosen], workers, cache)
+
+    report = []
+    growth = 1.0
+    for (train, test, best, train_summary), (_, _, test_summary) in zip(chosen, test_results):
+        growth *= 1.0 + test_summary['return']
+        report.append({'train': train, 'test': test, 'params': best,
+                       'train_summary': train_summary, 'test_summary': test_summary})
+        logging.info(f"Walk-forward {_window_label(data, train)} -> {_window_label(data, test)}: {best}, "
+                     f"train {train_summary['return']:+.2%}, test {test_summary['return']:+.2%}")
+    return {'windows': report, 'oos_return': growth - 1.0}
+
+
+def _window_label(data, window):
+    start, end = window
+    first = time.strftime('%Y-%m-%d', time.gmtime(data.candles[start, 0] / 1000))
+    last = time.strftime('%Y-%m-%d', time.gmtime(data.candles[end - 1, 0] / 1000))
+    return f"{first}~{last}"
+
+
+if __name__ == '__main__':
+    # 사용법: python param_sweep.py [심볼] [일수]  - 저장소 캔들로 DEFAULT_RANGES 워크포워드 실행
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ticker = sys.argv[1] if len(sys.argv) > 1 else CONFIG['SYMBOLS'][0]
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 90
+    now_ms = int(time.time() * 1000)
+    data = backtester.load_data(ticker, '1m', now_ms - int(days * 86_400_000))
+    result = walk_forward(data, DEFAULT_RANGES)
+    logging.info(f"Walk-forward out-of-sample return: {result['oos_return']:+.2%}")
@@ -0,0 +1,215 @@
+# pnl_engine.py
+import logging
+import threading
+import numpy as np
+from config import CONFIG
+import utils
+from fill_store import fill_store
+
+METHODS = ('fifo', 'average')  # 선입선출 / 평균단가 (바이낸스 realizedPnl은 평균단가)
+SIDES = (('LONG', 1), ('SHORT', -1))  # (포지션 방향, 진입 체결의 side 부호 = 손익 방향)
+RENORMALIZE_LOG = 600.0  # 누적곱의 로그가 이만큼 줄면 구간을 나눠 다시 정규화 (exp 오버플로 방지)
+EPSILON = 1e-12
+
+
+def linear_recurrence(a, b, x0=0.0):
+    """x_t = a_t * x_{t-1} + b_t (0 <= a_t <= 1)를 반복문 없이 누적곱/누적합으로 계산합니다.
+
+    x_t = A_t * (x0 + Σ b_k / A_k) (A_t = a_1…a_t) 를 쓰되, A가 너무 작아지는 지점마다 구간을 나눠 다시 시작합니다.
+    """
+    n = len(a)
+    out = np.empty(n)
+    total = np.concatenate([[0.0], np.cumsum(np.log(np.maximum(a, 1e-300)))])  # total[k] = a_1…a_k 로그 누적
+    descent = -total  # 단조 증가 (searchsorted용)
+    start, x = 0, x0
+    while start < n:
+        # 로그 누적이 -RENORMALIZE_LOG 아래로 내려가기 전까지를 한 구간으로
+        count = int(np.searchsorted(descent[start + 1:], RENORMALIZE_LOG + descent[start], side='left'))
+        if count == 0:  # a_t가 0(전량 청산)이거나 아주 작으면 한 칸만 직접 계산
+            x = a[start] * x + b[start]
+            out[start] = x
+            start += 1
+            continue
+        logs = total[start + 1:start + count + 1] - total[start]
+        out[start:start + count] = np.exp(logs) * (x + np.cumsum(b[start:start + count] * np.exp(-logs)))
+        x = out[start + count - 1]
+        start += count
+    return out
+
+
+def match_fills(price, qty, opening, method='fifo', lots=None):
+    """한 포지션 방향의 체결을 순서대로 로트에 매칭합니다.
+
+    lots는 이전까지 남은 로트 (K, 2) [수량, 가격]이며 체결보다 먼저 연 것으로 봅니다.
+    반환: (체결별 청산 손익(롱 기준, 진입 체결은 0), 체결 후 수량, 체결 후 보유 원가, 남은 로트)
+    """
+    lots = np.zeros((0, 2)) if lots is None else np.asarray(lots, dtype=float).reshape(-1, 2)
+    k = len(lots)
+    price = np.concatenate([lots[:, 1], price])
+    qty = np.concatenate([lots[:, 0], qty])
+    opening = np.concatenate([np.ones(k, dtype=bool), opening])
+    position = np.cumsum(np.where(opening, qty, -qty))
+    opened_cost = np.cumsum(np.where(opening, qty * price, 0.0))
+
+    if method == 'fifo':
+        # 먼저 연 수량부터 청산: 누적 청산 수량 위치의 누적 진입 원가(구간 선형)가 곧 청산된 원가
+        opened = np.cumsum(np.where(opening, qty, 0.0))
+        closed = np.cumsum(np.where(opening, 0.0, qty))
+        xp = np.concatenate([[0.0], opened[opening]])
+        consumed = np.interp(closed, xp, np.concatenate([[0.0], opened_cost[opening]]))
+        cost = opened_cost - consumed
+        removed = np.diff(consumed, prepend=0.0)
+        first = int(np.searchsorted(xp[1:], closed[-1] + EPSILON, side='right')) if len(closed) else 0
+        remaining = np.column_stack([qty[opening][first:], price[opening][first:]])
+        if len(remaining):
+            remaining[0, 0] = xp[first + 1] - closed[-1]
+    elif method == 'average':
+        # 평균단가: 진입은 원가를 더하고, 청산은 남은 수량 비율만큼 원가를 줄인다
+        before = position - np.where(opening, qty, -qty)
+        ratio = np.divide(position, before, out=np.zeros_like(position), where=before > EPSILON)
+        cost = linear_recurrence(np.where(opening, 1.0, np.clip(ratio, 0.0, 1.0)), np.where(opening, qty * price, 0.0))
+        removed = np.where(opening, 0.0, np.concatenate([[0.0], cost[:-1]]) - cost)
+        remaining = np.array([[position[-1], cost[-1] / position[-1]]]) if len(position) and position[-1] > EPSILON else np.zeros((0, 2))
+    else:
+        raise ValueError(f"Unknown PnL method: {method}")
+
+    gross = np.where(opening, 0.0, qty * price - removed)
+    remaining = remaining[remaining[:, 0] > EPSILON]
+    return gross[k:], position[k:], cost[k:], remaining
+
+
+def seed_lots(price, qty, opening, realized_pnl, direction, lots, held=None):
+    """저장 이전에 연 포지션이 있으면(보유 로트보다 많이 청산하거나 held보다 적게 보유) 모자란 수량을 로트로 앞에 채웁니다.
+
+    held는 거래소의 현재 포지션 수량. 로트 가격은 첫 청산 체결의 거래소 실현 손익(평균단가 기준)에서
+    그 시점 평단을 역산한 뒤, 그 사이 진입 체결을 빼서 구합니다.
+    """
+    held_lots = lots[:, 0].sum() if len(lots) else 0.0
+    position = held_lots + np.cumsum(np.where(opening, qty, -qty))
+    deficit = -position.min() if len(position) else 0.0
+    if held is not None and len(position):
+        deficit = max(deficit, held - position[-1])
+    if deficit <= EPSILON:
+        return lots
+    closes = np.flatnonzero(~opening)
+    if not len(closes):
+        return np.vstack([[[deficit, price[0]]], lots])  # 평단을 알 수 없으면 첫 체결가로 근사
+    first = closes[0]
+    average = price[first] - direction * realized_pnl[first] / qty[first]
+    opened_qty = qty[:first].sum()
+    opened_cost = (qty[:first] * price[:first]).sum() + ((lots[:, 0] * lots[:, 1]).sum() if len(lots) else 0.0)
+    entry = (average * (deficit + held_lots + opened_qty) - opened_cost) / deficit
+    return np.vstack([[[deficit, entry if entry > 0 else average]], lots])
+
+
+def _empty_book():
+    return {'lots': np.zeros((0, 2)), 'time': np.zeros(0, dtype=np.int64), 'realized': np.zeros(0),
+            'fee': np.zeros(0), 'position': np.zeros(0), 'cost': np.zeros(0)}
+
+
+class PnlEngine:
+    """체결 저장소의 체결을 (심볼, LONG/SHORT)별 로트에 매칭해 실현/미실현 손익을 계산합니다.
+
+    update()는 마지막으로 처리한 체결 이후만 이어서 계산하고 남은 로트를 상태로 보관하므로,
+    몇 달치 체결도 처음 한 번만 전체를 벡터 연산하고 이후에는 새 체결만 처리합니다.
+    """
+
+    def __init__(self, method=None, store=None):
+        self.method = method or CONFIG.get('PNL_METHOD', 'average')
+        if self.method not in METHODS:
+            raise ValueError(f"Unknown PnL method: {self.method}")
+        self.store = store if store is not None else fill_store
+        self._state = {}  # 심볼 -> {'fills': 처리한 체결 수, 'funding': (시각, 금액) 배열, 'sides': {방향: 장부}}
+        self._lock = threading.Lock()
+
+    def _ticker_state(self, ticker):
+        state = self._state.get(ticker)
+        if state is None:
+            state = self._state[ticker] = {'fills': 0, 'funding_time': np.zeros(0, dtype=np.int64), 'funding': np.zeros(0),
+                                           'sides': {side: _empty_book() for side, _ in SIDES}}
+        return state
+
+    def update(self, ticker, held=None):
+        """저장소에 새로 들어온 체결과 펀딩비를 장부에 반영합니다. 처리한 체결 수를 반환합니다.
+
+        held({'LONG': 수량, 'SHORT': 수량})는 거래소의 현재 포지션으로, 첫 반영 때 저장 이전에 연 포지션을 채우는 데 씁니다.
+        """
+        with self._lock:
+            state = self._ticker_state(ticker)
+            fills = self.store.read(ticker)
+            new = fills[state['fills']:]
+            for side, direction in SIDES:
+                batch = new[new['position_side'] == direction]
+                if len(batch):
+                    initial = held.get(side) if held and state['fills'] == 0 else None
+                    self._apply(state['sides'][side], batch, direction, initial)
+            if np.any(new['position_side'] == 0):
+                logging.warning(f"{ticker} - One-way (BOTH) fills are not matched into lots")
+            state['fills'] = len(fills)
+
+            funding = self.store.read(ticker, kind='funding')
+            if len(funding) > len(state['funding']):
+                state['funding_time'] = funding['time'].copy()
+                state['funding'] = funding['amount'].copy()
+            utils.cumulative_funding[ticker] = -float(state['funding'].sum())  # 낸 펀딩비 누계 (받으면 음수)
+            return len(new)
+
+    def _apply(self, book, batch, direction, held=None):
+        price, qty = batch['price'], batch['qty']
+        opening = batch['side'] == direction  # 롱은 매수, 숏은 매도가 진입
+        lots = seed_lots(price, qty, opening, batch['realized_pnl'], direction, book['lots'], held)
+        gross, position, cost, book['lots'] = match_fills(price, qty, opening, self.method, lots)
+        fee = np.where(batch['fee_usdt'] == 1, batch['fee'], 0.0)  # USDT 외 자산(BNB) 수수료는 제외
+        for key, values in (('time', batch['time']), ('realized', direction * gross), ('fee', fee),
+                            ('position', position), ('cost', cost)):
+            book[key] = np.concatenate([book[key], values])
+
+    # --- 조회 ---
+    def summary(self, ticker, mark_price=None, since=None):
+        """since(ms) 이후의 실현 손익, 수수료, 펀딩비, 순손익과 현재 미실현 손익을 반환합니다."""
+        with self._lock:
+            state = self._ticker_state(ticker)
+            result = {'realized': 0.0, 'fees': 0.0, 'funding': 0.0, 'unrealized': 0.0, 'fills': 0}
+            for side, direction in SIDES:
+                book = state['sides'][side]
+                start = int(np.searchsorted(book['time'], since)) if since is not None else 0
+                result['realized'] += float(book['realized'][start:].sum())
+                result['fees'] += float(book['fee'][start:].sum())
+                result['fills'] += len(book['time']) - start
+                if mark_price is not None and len(book['lots']):
+                    lots = book['lots']
+                    result['unrealized'] += direction * float((lots[:, 0] * (mark_price - lots[:, 1])).sum())
+            start = int(np.searchsorted(state['funding_time'], since)) if since is not None else 0
+            result['funding'] = float(state['funding'][start:].sum())
+        result['net'] = result['realized'] - result['fees'] + result['funding']
+        return result
+
+    def realized_series(self, ticker):
+        """(시각, 누적 순실현 손익) 배열. 체결의 실현 손익 - 수수료와 펀딩비를 시각 순으로 누적합니다."""
+        with self._lock:
+            state = self._ticker_state(ticker)
+            books = state['sides'].values()
+            times = np.concatenate([b['time'] for b in books] + [state['funding_time']])
+            values = np.concatenate([b['realized'] - b['fee'] for b in books] + [state['funding']])
+        order = np.argsort(times, kind='stable')
+        return times[order], np.cumsum(values[order])
+
+    def unrealized_series(self, ticker, times, prices):
+        """주어진 시각/가격(예: 캔들 종가)마다 그 시점 보유 로트의 미실현 손익 합계를 계산합니다."""
+        times = np.asarray(times)
+        prices = np.asarray(prices, dtype=float)
+        total = np.zeros(len(times))
+        with self._lock:
+            for side, direction in SIDES:
+                book = self._ticker_state(ticker)['sides'][side]
+                if not len(book['time']):
+                    continue
+                idx = np.searchsorted(book['time'], times, side='right') - 1
+                held = idx >= 0
+                position = np.where(held, book['position'][idx], 0.0)
+                cost = np.where(held, book['cost'][idx], 0.0)
+                total += direction * (position * prices - cost)
+        return total
+
+
+pnl_engine = PnlEngine()
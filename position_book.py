@@ -0,0 +1,84 @@
+# position_book.py
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def symbol_id(ticker):
+    """ccxt 심볼을 거래소 심볼 ID로 변환합니다. (ETH/USDT:USDT -> ETHUSDT)"""
+    return ticker.replace("/", "").replace(":USDT", "")
+
+
+class PositionBook:
+    """balance['info']['positions']를 한 번만 파싱해 (심볼ID, 사이드) O(1) 조회와 수치 배열을 제공합니다."""
+
+    def __init__(self, positions):
+        self.positions = positions
+        size = len(positions)
+        self._index = {}
+        self._last_by_symbol = {}
+        self.amount = np.zeros(size)  # 부호 있는 포지션 수량
+        self.entry_price = np.zeros(size)
+        self.margin = np.zeros(size)  # initialMargin
+        self.unrealized = np.zeros(size)
+        self.mark_price = np.zeros(size)
+        for i, p in enumerate(positions):
+            self._index[(p['symbol'], p['positionSide'])] = i
+            self._last_by_symbol[p['symbol']] = i
+            self.amount[i] = float(p.get('positionAmt') or 0.0)
+            self.entry_price[i] = float(p.get('entryPrice') or 0.0)
+            self.margin[i] = float(p.get('initialMargin') or 0.0)
+            self.unrealized[i] = float(p.get('unrealizedProfit') or 0.0)
+            self.mark_price[i] = float(p.get('markPrice') or 0.0) or self.entry_price[i]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _row(self, ticker, position_side):
+        return self._index.get((symbol_id(ticker), position_side))
+
+    def get(self, ticker, position_side):
+        """(심볼, 사이드)의 원본 포지션 dict. 없으면 None"""
+        i = self._row(ticker, position_side)
+        return None if i is None else self.positions[i]
+
+    def find(self, ticker):
+        """사이드 구분 없이 심볼의 포지션 (원웨이 모드용, 여러 개면 마지막 항목)"""
+        i = self._last_by_symbol.get(symbol_id(ticker))
+        return None if i is None else self.positions[i]
+
+    def amount_of(self, ticker, position_side):
+        """포지션 수량 (항상 양수)"""
+        i = self._row(ticker, position_side)
+        return 0.0 if i is None else abs(float(self.amount[i]))
+
+    def value_of(self, ticker, position_side):
+        """포지션 평가 금액 (증거금 + 미실현 손익)"""
+        i = self._row(ticker, position_side)
+        return 0.0 if i is None else float(self.margin[i] + self.unrealized[i])
+
+    def open_symbols(self):
+        """수량이 0이 아닌 포지션의 심볼ID 집합"""
+        return {self.positions[i]['symbol'] for i in np.flatnonzero(self.amount)}
+
+    def total_exposure(self):
+        """전체 포지션 명목 가치 합 (|수량| x 마크 가격)"""
+        return float(np.abs(self.amount) @ self.mark_price)
+
+    def total_value(self):
+        """전체 포지션 평가 금액 합 (증거금 + 미실현 손익)"""
+        return float(self.margin.sum() + self.unrealized.sum())
+
+
+_last_book = (None, None)  # (positions 리스트, PositionBook)
+
+
+def get_book(balance):
+    """잔고 객체의 PositionBook을 반환합니다. 같은 잔고 payload에 대해서는 한 번만 만듭니다."""
+    global _last_book
+    positions = balance.get('info', {}).get('positions', [])
+    last_positions, book = _last_book
+    if positions is not last_positions or book is None:
+        book = PositionBook(positions)
+        _last_book = (positions, book)
+    return book
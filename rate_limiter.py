@@ -0,0 +1,213 @@
+# rate_limiter.py
+import asyncio
+import json
+import logging
+import threading
+import time
+import ccxt
+from config import CONFIG
+
+# 바이낸스 USDⓈ-M 선물 엔드포인트 가중치: (path, method) -> (symbol 지정 시, 미지정 시)
+ENDPOINT_WEIGHTS = {
+    ('ticker/24hr', 'GET'): (1, 40),
+    ('ticker/price', 'GET'): (1, 2),
+    ('ticker/bookTicker', 'GET'): (2, 5),
+    ('premiumIndex', 'GET'): (1, 10),
+    ('fundingRate', 'GET'): (1, 1),
+    ('exchangeInfo', 'GET'): (1, 1),
+    ('openOrders', 'GET'): (1, 40),
+    ('allOrders', 'GET'): (5, 5),
+    ('userTrades', 'GET'): (5, 5),
+    ('income', 'GET'): (30, 30),
+    ('account', 'GET'): (5, 5),
+    ('balance', 'GET'): (5, 5),
+    ('positionRisk', 'GET'): (5, 5),
+    ('positionSide/dual', 'GET'): (30, 30),
+    ('positionSide/dual', 'POST'): (1, 1),
+    ('leverage', 'POST'): (1, 1),
+    ('leverageBracket', 'GET'): (1, 1),
+    ('order', 'POST'): (1, 1),
+    ('order', 'PUT'): (1, 1),
+    ('order', 'DELETE'): (1, 1),
+    ('order', 'GET'): (1, 1),
+    ('batchOrders', 'POST'): (5, 5),
+    ('batchOrders', 'PUT'): (5, 5),
+    ('batchOrders', 'DELETE'): (1, 1),
+    ('allOpenOrders', 'DELETE'): (1, 1),
+    ('listenKey', 'POST'): (1, 1),
+    ('listenKey', 'PUT'): (1, 1),
+}
+RATE_LIMIT_ERRORS = (ccxt.RateLimitExceeded, ccxt.DDoSProtection)  # 429 / 418 (IP 차단)
+KLINE_PATHS = ('klines', 'continuousKlines', 'indexPriceKlines', 'markPriceKlines')
+ORDER_PATHS = ('order', 'batchOrders')
+
+
+def kline_weight(limit):
+    """캔들 조회 가중치는 limit 구간에 따라 달라진다."""
+    limit = int(limit or 500)
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def request_cost(path, method, params, default=1):
+    """요청 하나의 (가중치, 주문 수)를 계산합니다."""
+    params = params or {}
+    if path in KLINE_PATHS:
+        return kline_weight(params.get('limit')), 0
+    weights = ENDPOINT_WEIGHTS.get((path, method))
+    weight = default if weights is None else weights[0 if 'symbol' in params else 1]
+    orders = 0
+    if path in ORDER_PATHS and method in ('POST', 'PUT'):
+        orders = 1
+        if path == 'batchOrders':
+            batch = params.get('batchOrders', [])
+            try:
+                orders = len(json.loads(batch) if isinstance(batch, str) else batch)
+            except ValueError:
+                orders = 5
+    return weight, orders
+
+
+class TokenBucket:
+    """초당 rate로 채워지고 capacity까지 쌓이는 토큰 버킷. 토큰은 음수까지 예약할 수 있습니다."""
+
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """amount만큼 예약하고, 토큰이 양수가 될 때까지 기다려야 하는 시간(초)을 반환합니다."""
+        self._refill(now)
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def sync_used(self, used, now):
+        """거래소가 알려준 사용량을 반영해 남은 토큰을 보정합니다."""
+        self._refill(now)
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class WeightRateLimiter:
+    """요청 가중치(1분), 주문 수(10초/1분) 한도를 지키도록 요청 시점을 조절하는 공용 제한기입니다.
+
+    응답 헤더(X-MBX-USED-WEIGHT-1M, X-MBX-ORDER-COUNT-*)로 실제 사용량을 보정하고,
+    429/418 응답 시 Retry-After 동안 모든 요청을 멈춥니다.
+    """
+
+    def __init__(self, weight_limit=None, order_limit_10s=None, order_limit_1m=None, safety=None):
+        safety = safety if safety is not None else CONFIG.get('RATE_LIMIT_SAFETY', 0.9)
+        self.weight = TokenBucket((weight_limit or CONFIG.get('RATE_LIMIT_WEIGHT_1M', 2400)) * safety, 60)
+        self.orders_10s = TokenBucket((order_limit_10s or CONFIG.get('RATE_LIMIT_ORDERS_10S', 300)) * safety, 10)
+        self.orders_1m = TokenBucket((order_limit_1m or CONFIG.get('RATE_LIMIT_ORDERS_1M', 1200)) * safety, 60)
+        self.blocked_until = 0.0
+        self.total_weight = 0
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, weight, orders):
+        with self._lock:
+            now = time.monotonic()
+            delay = self.weight.reserve(weight, now)
+            if orders:
+                delay = max(delay, self.orders_10s.reserve(orders, now), self.orders_1m.reserve(orders, now))
+            delay = max(delay, self.blocked_until - now)
+            self.total_weight += weight
+            self.total_wait += delay
+            return delay
+
+    def acquire(self, weight=1, orders=0):
+        delay = self._reserve(weight, orders)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, weight=1, orders=0):
+        delay = self._reserve(weight, orders)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def observe(self, headers):
+        """응답 헤더의 사용량으로 버킷을 보정합니다."""
+        if not headers:
+            return
+        headers = {str(k).lower(): v for k, v in headers.items()}
+        with self._lock:
+            now = time.monotonic()
+            used = headers.get('x-mbx-used-weight-1m')
+            if used is not None:
+                self.weight.sync_used(float(used), now)
+            count_10s = headers.get('x-mbx-order-count-10s')
+            if count_10s is not None:
+                self.orders_10s.sync_used(float(count_10s), now)
+            count_1m = headers.get('x-mbx-order-count-1m')
+            if count_1m is not None:
+                self.orders_1m.sync_used(float(count_1m), now)
+
+    def on_rate_limited(self, headers=None, default_wait=None):
+        """429/418 응답 이후 Retry-After 동안 요청을 멈추도록 표시합니다. 호출자는 바로 반환합니다."""
+        wait = default_wait if default_wait is not None else CONFIG.get('RATE_LIMIT_BACKOFF', 30)
+        if headers:
+            headers = {str(k).lower(): v for k, v in headers.items()}
+            try:
+                wait = float(headers.get('retry-after', wait))
+            except (TypeError, ValueError):
+                pass
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+            self.weight.tokens = min(self.weight.tokens, 0.0)
+        logging.warning(f"Rate limit hit, pausing requests for {wait:.0f}s")
+        return wait
+
+    def blocked_for(self):
+        """요청이 멈춰 있는 남은 시간(초)"""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+limiter = WeightRateLimiter()
+
+
+def install(exchange, rate_limiter=None):
+    """ccxt exchange의 모든 REST 요청이 가중치 제한기를 거치도록 fetch2를 감쌉니다.
+
+    ccxt 자체의 고정 간격 스로틀(enableRateLimit)은 끄고 이 제한기가 대신합니다.
+    어떤 요청이든 429/418을 받으면 예외를 그대로 올리기 전에 모든 호출자의 요청을 Retry-After 동안 멈춥니다.
+    """
+    rate_limiter = rate_limiter or limiter
+    original_fetch2 = exchange.fetch2
+    exchange.enableRateLimit = False
+
+    if asyncio.iscoroutinefunction(original_fetch2):
+        async def fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+            weight, orders = request_cost(path, method, params, config.get('cost', 1) if isinstance(config, dict) else 1)
+            await rate_limiter.acquire_async(weight, orders)
+            try:
+                return await original_fetch2(path, api, method, params, headers, body, config)
+            except RATE_LIMIT_ERRORS:
+                rate_limiter.on_rate_limited(getattr(exchange, 'last_response_headers', None))
+                raise
+            finally:
+                rate_limiter.observe(getattr(exchange, 'last_response_headers', None))
+    else:
+        def fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+            weight, orders = request_cost(path, method, params, config.get('cost', 1) if isinstance(config, dict) else 1)
+            rate_limiter.acquire(weight, orders)
+            try:
+                return original_fetch2(path, api, method, params, headers, body, config)
+            except RATE_LIMIT_ERRORS:
+                rate_limiter.on_rate_limited(getattr(exchange, 'last_response_headers', None))
+                raise
+            finally:
+                rate_limiter.observe(getattr(exchange, 'last_response_headers', None))
+
+    exchange.fetch2 = fetch2
+    return exchange
@@ -0,0 +1,113 @@
+# resampler.py
+import threading
+from config import CONFIG
+from ohlcv_cache import ohlcv_cache, CandleBuffer
+
+BASE_TIMEFRAME = '1m'
+_UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000}
+
+
+def timeframe_ms(timeframe):
+    """'5m', '1h', '1d' 같은 타임프레임 길이(ms)"""
+    return int(timeframe[:-1]) * _UNIT_MS[timeframe[-1]]
+
+
+def base_candles_needed(timeframes, bars):
+    """모든 타임프레임에서 확정 캔들 bars개와 형성 중 캔들을 만들 수 있는 1분봉 개수"""
+    base = timeframe_ms(BASE_TIMEFRAME)
+    return max((timeframe_ms(tf) // base) * (bars + 1) for tf in timeframes)
+
+
+class Resampler:
+    """1분봉 버퍼에서 상위 타임프레임 캔들을 증분으로 만듭니다.
+
+    현재 구간은 확정된 1분봉의 집계(open, high, low, close, volume)와 형성 중인 1분봉 하나로 유지하므로,
+    1분봉이 갱신되거나 새로 생길 때마다 O(1)로 상위 캔들(마지막은 미완성 캔들)을 갱신합니다.
+    """
+
+    def __init__(self, ticker, timeframe, capacity=None):
+        self.ticker = ticker
+        self.timeframe = timeframe
+        self.period_ms = timeframe_ms(timeframe)
+        # ohlcv_cache의 REST 버퍼와 메모이즈 키가 겹치지 않도록 별도 키 사용
+        self.buffer = CandleBuffer(capacity or CONFIG.get('OHLCV_CACHE_SIZE', 1000), (ticker, f"{timeframe}@{BASE_TIMEFRAME}"))
+        self._reset()
+
+    def _reset(self):
+        self.buffer.clear()
+        self._bucket = None  # 현재 상위 캔들 시작 시각
+        self._closed = None  # 현재 구간의 확정 1분봉 집계 [open, high, low, close, volume]
+        self._pending = None  # 형성 중(마지막) 1분봉 행
+        self._skip_until = None  # 시작 구간이 잘려 있으면 다음 경계까지 건너뜀
+        self._base_revision = None  # 마지막으로 반영한 1분봉 버퍼 revision (같으면 할 일 없음)
+
+    def _bar(self):
+        row = self._pending
+        if self._closed is None:
+            return [self._bucket, row[1], row[2], row[3], row[4], row[5]]
+        o, h, l, _, v = self._closed
+        return [self._bucket, o, max(h, row[2]), min(l, row[3]), row[4], v + row[5]]
+
+    def _commit_pending(self):
+        row = self._pending
+        if self._closed is None:
+            self._closed = [row[1], row[2], row[3], row[4], row[5]]
+        else:
+            c = self._closed
+            self._closed = [c[0], max(c[1], row[2]), min(c[2], row[3]), row[4], c[4] + row[5]]
+
+    def _apply(self, row):
+        ts = int(row[0])
+        bucket = ts - ts % self.period_ms
+        if self._skip_until is None:
+            # 첫 구간이 중간부터 시작하면 open/volume이 틀리므로 다음 경계부터 만든다
+            self._skip_until = bucket if ts == bucket else bucket + self.period_ms
+        if ts < self._skip_until:
+            return
+        if self._pending is not None and ts > int(self._pending[0]):
+            if bucket == self._bucket:
+                self._commit_pending()
+            else:
+                self._closed = None
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._closed = None
+        self._pending = row
+        self.buffer.upsert([self._bar()])
+
+    def sync(self, base_buf):
+        """1분봉 버퍼에서 아직 반영하지 않은 캔들만 읽어 상위 캔들을 갱신합니다.
+
+        마지막으로 반영한 1분봉(형성 중일 수 있음)부터만 복사하므로 루프당 비용은 새 1분봉 수에 비례합니다.
+        """
+        if base_buf.revision == self._base_revision:
+            return self.buffer
+        revision = base_buf.revision
+        if self._pending is not None:
+            rows = base_buf.since(self._pending[0])
+            if rows is not None and len(rows) and rows[0, 0] == self._pending[0]:
+                for row in rows.tolist():
+                    self._apply(row)
+                self._base_revision = revision
+                return self.buffer
+        # 처음이거나 1분봉 버퍼가 다시 채워져 이어지지 않으면 처음부터 다시 만든다
+        self._reset()
+        for row in base_buf.array().tolist():
+            self._apply(row)
+        self._base_revision = revision
+        return self.buffer
+
+
+_resamplers = {}
+_lock = threading.Lock()
+
+
+def get_resampled(ticker, timeframe, count=None):
+    """캐시된 1분봉으로 만든 상위 타임프레임 최근 count개 캔들 DataFrame(마지막은 미완성 캔들). API 요청은 없습니다."""
+    key = (ticker, timeframe)
+    with _lock:
+        resampler = _resamplers.get(key)
+        if resampler is None:
+            resampler = _resamplers[key] = Resampler(ticker, timeframe)
+        buf = resampler.sync(ohlcv_cache.buffer(ticker, BASE_TIMEFRAME))
+        return buf.frame(count)
@@ -0,0 +1,429 @@
+# signal_kernel.py
+import warnings
+from collections import namedtuple
+import numpy as np
+from config import CONFIG
+
+# compute_signals 결과. 모든 값은 마지막 캔들 기준(mb.GetXXX(..., -1)과 같은 값)의 float
+Signals = namedtuple('Signals', [
+    'close', 'ma', 'rsi', 'atr',
+    'macd', 'macd_signal', 'macd_hist',
+    'fast_k', 'slow_d',
+    'bb_ma', 'bb_upper', 'bb_lower',
+    'conversion', 'base', 'span_a', 'span_b',
+])
+
+EWM_BLOCK = 64  # 블록 단위 EWM 계산 크기 (decay^-BLOCK이 넘치지 않는 범위)
+
+
+def ewm_series(x, alpha):
+    """pandas ewm(alpha, adjust=True).mean() 전체 시계열을 블록 단위 누적합으로 계산합니다.
+
+    블록 안에서는 decay^-i 가중 누적합으로 한 번에 계산하고, 블록 사이에는 (가중합, 가중치합) 상태만 넘깁니다.
+    2차원 입력은 행(심볼)마다 독립적으로 계산하며, 앞쪽 nan(데이터 없음)은 가중치 0으로 건너뜁니다.
+    """
+    x = np.asarray(x, dtype=float)
+    decay = 1.0 - alpha
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0.0)
+    n = x.shape[-1]
+    out = np.empty(x.shape)
+    powers = decay ** np.arange(EWM_BLOCK)
+    inverse = 1.0 / powers
+    num = np.zeros(x.shape[:-1] + (1,))
+    den = np.zeros(x.shape[:-1] + (1,))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, n, EWM_BLOCK):
+            size = min(EWM_BLOCK, n - start)
+            p, inv = powers[:size], inverse[:size]
+            carry = decay * p  # 이전 블록 상태가 각 위치까지 감쇠되는 비율
+            block_num = p * np.cumsum(values[..., start:start + size] * inv, axis=-1) + carry * num
+            block_den = p * np.cumsum(valid[..., start:start + size] * inv, axis=-1) + carry * den
+            out[..., start:start + size] = block_num / block_den
+            num, den = block_num[..., -1:], block_den[..., -1:]
+    return out
+
+
+def ewm_last(x, alpha, min_periods=0):
+    """adjusted EWM의 마지막 값만 가중 내적 한 번으로 계산합니다. 유효 값이 min_periods개 미만이면 nan"""
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    weights = (1.0 - alpha) ** np.arange(x.shape[-1] - 1, -1, -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = (np.where(valid, x, 0.0) @ weights) / (valid @ weights)
+    return np.where(valid.sum(axis=-1) >= max(min_periods, 1), result, np.nan)
+
+
+def _midpoint(high, low, end, window):
+    """[end-window, end) 구간 고가/저가의 중간값. 구간이 모자라면 nan"""
+    start = end - window
+    if start < 0 or end > high.shape[-1]:
+        return np.full(high.shape[:-1], np.nan)
+    return (high[..., start:end].max(axis=-1) + low[..., start:end].min(axis=-1)) / 2
+
+
+def stack_candles(arrays, count=None):
+    """심볼별 (N_i, 6) 캔들 배열을 앞쪽을 nan으로 채운 (심볼 수, count, 6) 행렬로 쌓습니다."""
+    count = count or max((len(a) for a in arrays), default=0)
+    stacked = np.full((len(arrays), count, 6), np.nan)
+    for i, a in enumerate(arrays):
+        rows = np.asarray(a, dtype=float)[-count:]
+        if len(rows):
+            stacked[i, count - len(rows):, 6 - rows.shape[1]:] = rows  # timestamp 없는 (N, 5) 배열은 뒤쪽 5개 컬럼에
+    return stacked
+
+
+def compute_signals_batch(candles, ma_period=None, rsi_period=None, atr_period=14, stoch_period=None, bb_period=None):
+    """(심볼 수, N, 6) 캔들 행렬에서 모든 심볼의 지표를 한 번에 계산합니다.
+
+    결과는 필드마다 (심볼 수,) 배열을 담은 Signals입니다. 캔들이 모자란 심볼(앞쪽 nan)은 해당 지표가 nan입니다.
+    """
+    ma_period = ma_period or CONFIG['MA_PERIOD']
+    rsi_period = rsi_period or CONFIG['RSI_PERIOD']
+    stoch_period = stoch_period or CONFIG['RSI_PERIOD']
+    bb_period = bb_period or ma_period
+
+    data = np.asarray(candles, dtype=float)
+    n = data.shape[1]
+    high, low, close = data[..., 2], data[..., 3], data[..., 4]
+    counts = (~np.isnan(close)).sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 전부 nan인 구간의 nanmax/nanmean 경고
+
+        # 이동평균 / 볼린저 밴드 (모표준편차, 2배 폭. 캔들이 모자라면 있는 만큼 사용)
+        ma = close[:, -ma_period:].mean(axis=1) if n >= ma_period else np.full(len(data), np.nan)
+        window = close[:, -bb_period:]
+        bb_ma = np.nanmean(window, axis=1)
+        band = 2.0 * np.nanstd(window, axis=1)
+
+        # RSI: 상승/하락폭의 adjusted EWM (alpha=1/period)
+        delta = np.diff(close, axis=1)
+        gain = ewm_last(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), 1.0 / rsi_period, rsi_period)
+        loss = ewm_last(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), 1.0 / rsi_period, rsi_period)
+        rsi = np.where(loss > 0, 100.0 - 100.0 / (1.0 + gain / loss), np.where(gain > 0, 100.0, np.nan))
+
+        # ATR: 최근 atr_period개 True Range의 평균 (첫 캔들은 고가-저가)
+        prev_close = np.concatenate([np.full((len(data), 1), np.nan), close[:, :-1]], axis=1)[:, -atr_period:]
+        h, l = high[:, -atr_period:], low[:, -atr_period:]
+        tr = np.fmax(h - l, np.fmax(np.abs(h - prev_close), np.abs(l - prev_close)))
+        atr = tr.mean(axis=1) if n >= atr_period else np.full(len(data), np.nan)
+
+        # MACD(12, 26, 9): 시그널선은 MACD 시계열 전체가 필요해 블록 단위 EWM 사용
+        macd_line = ewm_series(close, 2.0 / 13) - ewm_series(close, 2.0 / 27)
+        macd = macd_line[:, -1]
+        macd_signal = ewm_last(macd_line, 2.0 / 10)
+
+        # 스토캐스틱: 마지막 3개 캔들의 fast %K와 그 평균
+        fast_ks = []
+        for end in range(max(1, n - 2), n + 1):
+            start = max(0, end - stoch_period)
+            hh, ll = np.nanmax(high[:, start:end], axis=1), np.nanmin(low[:, start:end], axis=1)
+            fast_ks.append(np.where(hh != ll, (close[:, end - 1] - ll) / (hh - ll) * 100, np.nan))
+        fast_ks = np.column_stack(fast_ks)
+        slow_d = np.nanmean(fast_ks, axis=1)
+
+    # 일목균형표 (mb.GetIC와 같은 기준: 전환선/기준선은 현재, 선행스팬은 26캔들 전 값)
+    lead_end = n - 25
+    signals = Signals(
+        close=close[:, -1], ma=ma, rsi=rsi, atr=atr,
+        macd=macd, macd_signal=macd_signal, macd_hist=macd - macd_signal,
+        fast_k=fast_ks[:, -1], slow_d=slow_d,
+        bb_ma=bb_ma, bb_upper=bb_ma + band, bb_lower=bb_ma - band,
+        conversion=_midpoint(high, low, n, 9),
+        base=_midpoint(high, low, n, 26),
+        span_a=(_midpoint(high, low, lead_end, 9) + _midpoint(high, low, lead_end, 26)) / 2,
+        span_b=_midpoint(high, low, lead_end, 52),
+    )
+    # 캔들이 하나도 없는 심볼은 결과 전체를 nan으로
+    return Signals(*(np.where(counts > 0, field, np.nan) for field in signals))
+
+
+def unstack_signals(batch):
+    """배치 결과를 심볼별 Signals(float 필드) 리스트로 나눕니다."""
+    return [Signals(*(float(field[i]) for field in batch)) for i in range(len(batch.close))]
+
+
+def compute_signals(ohlcv, ma_period=None, rsi_period=None, atr_period=14, stoch_period=None, bb_period=None):
+    """(N, 6) 캔들 배열(timestamp, open, high, low, close, volume)에서 모든 지표를 한 번에 계산합니다.
+
+    timestamp 없는 (N, 5) 배열(GetOhlcv DataFrame의 values)도 받습니다.
+    입력 배열은 읽기만 하며 pandas 객체를 만들지 않습니다. 캔들이 없으면 None을 반환합니다.
+    """
+    data = np.asarray(ohlcv, dtype=float)
+    if len(data) == 0:
+        return None
+    batch = compute_signals_batch(stack_candles([data]), ma_period, rsi_period, atr_period, stoch_period, bb_period)
+    return unstack_signals(batch)[0]
+
+
+def compute_symbol_signals(symbol_candles, count=None, **periods):
+    """{심볼: (N, 6) 캔들 배열}을 한 번의 배치 계산으로 {심볼: Signals}로 만듭니다. 캔들이 없는 심볼은 제외합니다."""
+    symbols = [t for t, rows in symbol_candles.items() if len(rows)]
+    if not symbols:
+        return {}
+    batch = compute_signals_batch(stack_candles([symbol_candles[t] for t in symbols], count), **periods)
+    return dict(zip(symbols, unstack_signals(batch)))
+
+
+def adx_last(high, low, close, period=14):
+    """마지막 ADX와 +DI, -DI. 방향 이동/True Range를 alpha=1/period EWM으로 평활합니다."""
+    if len(close) < period * 2:
+        return np.nan, np.nan, np.nan
+    up = np.diff(high)
+    down = -np.diff(low)
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    tr = np.maximum(high[1:] - low[1:], np.maximum(np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])))
+    alpha = 1.0 / period
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr = ewm_series(tr, alpha)
+        plus_di = 100 * ewm_series(plus_dm, alpha) / atr
+        minus_di = 100 * ewm_series(minus_dm, alpha) / atr
+        dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    adx = ewm_last(np.nan_to_num(dx), alpha, period)
+    return float(adx), float(plus_di[-1]), float(minus_di[-1])
+
+
+def cci_last(high, low, close, period=20):
+    """마지막 CCI = (TP - TP 이동평균) / (0.015 x 평균 절대 편차)"""
+    if len(close) < period:
+        return np.nan
+    tp = (high[-period:] + low[-period:] + close[-period:]) / 3
+    mean = tp.mean()
+    deviation = np.abs(tp - mean).mean()
+    return float((tp[-1] - mean) / (0.015 * deviation)) if deviation > 0 else 0.0
+
+
+def mfi_last(high, low, close, volume, period=14):
+    """마지막 MFI. 대표가격이 오른 캔들의 자금 흐름 비율로 계산합니다."""
+    if len(close) <= period:
+        return np.nan
+    tp = (high[-period - 1:] + low[-period - 1:] + close[-period - 1:]) / 3
+    flow = tp[1:] * volume[-period:]
+    change = np.diff(tp)
+    positive = flow[change > 0].sum()
+    negative = flow[change < 0].sum()
+    if negative == 0:
+        return 100.0 if positive > 0 else 50.0
+    return float(100 - 100 / (1 + positive / negative))
+
+
+def bb_width_ratio(close, period=20, lookback=20):
+    """현재 볼린저 밴드 폭 / 직전 lookback개 캔들의 평균 밴드 폭 (밴드 확장 정도)"""
+    if len(close) < period + lookback:
+        return np.nan
+    windows = np.lib.stride_tricks.sliding_window_view(close[-(period + lookback):], period)
+    widths = 4.0 * windows.std(axis=1) / windows.mean(axis=1)  # (upper - lower) / 중심선
+    previous = widths[:-1].mean()
+    return float(widths[-1] / previous) if previous > 0 else np.nan
+
+
+def volume_spike_ratio(volume, lookback=5):
+    """마지막 캔들 거래량 / 그 이전 lookback개 평균 거래량
+
+    확정 캔들 배열로 호출하면 mb.IsVolumePung(형성 중 캔들 제외, 직전 캔들 기준)과 같은 비율입니다.
+    """
+    if len(volume) < lookback + 1:
+        return np.nan
+    average = volume[-lookback - 1:-1].mean()
+    return float(volume[-1] / average) if average > 0 else np.nan
+
+
+# --- 전체 시계열 지표 (백테스트용): 각 위치의 값은 그 캔들까지의 데이터로 계산한 값, 데이터가 모자라면 nan ---
+def _windows(x, window):
+    """x[t-window+1..t] 구간 뷰 (N-window+1, window). 복사 없음"""
+    return np.lib.stride_tricks.sliding_window_view(x, window)
+
+
+def _pad(values, n):
+    """앞쪽을 nan으로 채워 길이 n으로 맞춥니다."""
+    out = np.full(n, np.nan)
+    if len(values):
+        out[n - len(values):] = values
+    return out
+
+
+def rolling_mean(x, window):
+    x = np.asarray(x, dtype=float)
+    if len(x) < window:
+        return np.full(len(x), np.nan)
+    return _pad(_windows(x, window).mean(axis=1), len(x))
+
+
+def rolling_std(x, window):
+    """모표준편차 (ddof=0)"""
+    x = np.asarray(x, dtype=float)
+    if len(x) < window:
+        return np.full(len(x), np.nan)
+    return _pad(_windows(x, window).std(axis=1), len(x))
+
+
+def rsi_series(close, period):
+    delta = np.diff(close, prepend=np.nan)
+    gain = ewm_series(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), 1.0 / period)
+    loss = ewm_series(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), 1.0 / period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = np.where(loss > 0, 100.0 - 100.0 / (1.0 + gain / loss), np.where(gain > 0, 100.0, np.nan))
+    rsi[:period] = np.nan  # 유효 변화량이 period개 미만
+    return rsi
+
+
+def true_range(high, low, close):
+    """True Range (첫 캔들은 고가-저가)"""
+    prev_close = np.concatenate([[np.nan], close[:-1]])
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr_series(high, low, close, period=14):
+    return rolling_mean(true_range(high, low, close), period)
+
+
+def macd_hist_series(close):
+    macd_line = ewm_series(close, 2.0 / 13) - ewm_series(close, 2.0 / 27)
+    return macd_line - ewm_series(macd_line, 2.0 / 10)
+
+
+def stoch_series(high, low, close, period):
+    """fast %K와 최근 3개 fast %K 평균(slow %D)"""
+    n = len(close)
+    if n < period:
+        return np.full(n, np.nan), np.full(n, np.nan)
+    hh = _pad(_windows(high, period).max(axis=1), n)
+    ll = _pad(_windows(low, period).min(axis=1), n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fast_k = np.where(hh != ll, (close - ll) / (hh - ll) * 100, np.nan)
+    return fast_k, rolling_mean(fast_k, 3)
+
+
+def adx_series(high, low, close, period=14):
+    """ADX, +DI, -DI 시계열 (adx_last와 같은 alpha=1/period EWM 평활)"""
+    n = len(close)
+    up = np.diff(high, prepend=np.nan)
+    down = -np.diff(low, prepend=np.nan)
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    tr = true_range(high, low, close)
+    tr[0] = np.nan  # adx_last처럼 두 번째 캔들부터
+    plus_dm[0] = minus_dm[0] = np.nan
+    alpha = 1.0 / period
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr = ewm_series(tr, alpha)
+        plus_di = 100 * ewm_series(plus_dm, alpha) / atr
+        minus_di = 100 * ewm_series(minus_dm, alpha) / atr
+        dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    dx[0] = np.nan
+    adx = ewm_series(np.where(np.isnan(plus_di), np.nan, np.nan_to_num(dx)), alpha)
+    adx[:min(n, period * 2 - 1)] = np.nan  # adx_last는 캔들 period*2개 이상에서만 계산
+    return adx, plus_di, minus_di
+
+
+def cci_series(high, low, close, period=20):
+    n = len(close)
+    if n < period:
+        return np.full(n, np.nan)
+    tp = (high + low + close) / 3
+    windows = _windows(tp, period)
+    mean = windows.mean(axis=1)
+    deviation = np.abs(windows - mean[:, None]).mean(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cci = np.where(deviation > 0, (tp[period - 1:] - mean) / (0.015 * deviation), 0.0)
+    return _pad(cci, n)
+
+
+def mfi_series(high, low, close, volume, period=14):
+    n = len(close)
+    if n <= period:
+        return np.full(n, np.nan)
+    tp = (high + low + close) / 3
+    change = np.diff(tp)
+    flow = tp[1:] * volume[1:]
+    positive = _windows(np.where(change > 0, flow, 0.0), period).sum(axis=1)
+    negative = _windows(np.where(change < 0, flow, 0.0), period).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mfi = np.where(negative == 0, np.where(positive > 0, 100.0, 50.0), 100 - 100 / (1 + positive / negative))
+    return _pad(mfi, n)
+
+
+def bb_width_ratio_series(close, period=20, lookback=20):
+    """bb_width_ratio 시계열"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        widths = 4.0 * rolling_std(close, period) / rolling_mean(close, period)
+        previous = np.concatenate([[np.nan], rolling_mean(widths, lookback)[:-1]])
+        return np.where(previous > 0, widths / previous, np.nan)
+
+
+def volume_spike_ratio_series(volume, lookback=5):
+    """volume_spike_ratio 시계열 (직전 lookback개 평균 대비)"""
+    previous = np.concatenate([[np.nan], rolling_mean(volume, lookback)[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(previous > 0, volume / previous, np.nan)
+
+
+def entry_value_series(candles, ma_period=None, rsi_period=None):
+    """(N, 6) 캔들에서 진입 조건(strategy_logic.candle_conditions/price_conditions)에 쓰는 지표 시계열을 한 번에 계산합니다.
+
+    EWM 계열(RSI, MACD, ADX)은 전체 시계열로 평활하므로 실시간(최근 100개 캔들) 값과 소수점 아래 미세한 차이만 있습니다.
+    """
+    ma_period = ma_period or CONFIG['MA_PERIOD']
+    rsi_period = rsi_period or CONFIG['RSI_PERIOD']
+    data = np.asarray(candles, dtype=float)
+    high, low, close, volume = data[:, 2], data[:, 3], data[:, 4], data[:, 5]
+    adx, plus_di, minus_di = adx_series(high, low, close)
+    fast_k, slow_d = stoch_series(high, low, close, rsi_period)
+    bb_ma, band = rolling_mean(close, ma_period), 2.0 * rolling_std(close, ma_period)
+    return {
+        'close': close, 'ma': rolling_mean(close, ma_period), 'rsi': rsi_series(close, rsi_period),
+        'atr': atr_series(high, low, close),
+        'adx': adx, 'plus_di': plus_di, 'minus_di': minus_di,
+        'cci': cci_series(high, low, close), 'mfi': mfi_series(high, low, close, volume),
+        'fast_k': fast_k, 'slow_d': slow_d,
+        'bb_lower': bb_ma - band, 'bb_upper': bb_ma + band, 'macd_hist': macd_hist_series(close),
+        'bb_ratio': bb_width_ratio_series(close, ma_period), 'volume_ratio': volume_spike_ratio_series(volume),
+    }
+
+
+def _legacy_signals(df):
+    """기존 pandas 함수들로 같은 지표를 계산합니다. (벤치마크 비교용)"""
+    import myBinance as mb
+    import strategy_logic
+    frame = df.copy()  # GetMACD/GetIC가 입력에 컬럼을 추가하므로 복사본 사용
+    mb.GetMA(frame, CONFIG['MA_PERIOD'], -1)
+    mb.GetRSI(frame, CONFIG['RSI_PERIOD'], -1)
+    strategy_logic.calculate_atr(frame)
+    mb.GetMACD(frame, -1)
+    mb.GetStoch(frame, CONFIG['RSI_PERIOD'], -1)
+    mb.GetBB(frame, CONFIG['MA_PERIOD'], -1)
+    mb.GetIC(frame, -1)
+
+
+if __name__ == '__main__':
+    import timeit
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    for size in (100, 500, 1000):
+        close = 2000 + np.cumsum(rng.normal(0, 2, size))
+        candles = np.column_stack([
+            np.arange(size) * 60000.0, close,
+            close + rng.random(size) * 3, close - rng.random(size) * 3, close, rng.random(size) * 100,
+        ])
+        df = pd.DataFrame(candles[:, 1:], columns=['open', 'high', 'low', 'close', 'volume'])
+        runs = 200
+        fused = timeit.timeit(lambda: compute_signals(candles), number=runs) / runs
+        legacy = timeit.timeit(lambda: _legacy_signals(df), number=runs) / runs
+        print(f"{size:5d} candles: kernel {fused * 1e6:8.1f}us, pandas {legacy * 1e6:8.1f}us, x{legacy / fused:.1f}")
+
+    # 심볼 50개 일괄 계산 vs 심볼별 pandas 계산
+    symbols = 50
+    candles = {}
+    for i in range(symbols):
+        close = 100 + np.cumsum(rng.normal(0, 1, 100))
+        candles[f"S{i}"] = np.column_stack([
+            np.arange(100) * 60000.0, close, close + rng.random(100), close - rng.random(100), close, rng.random(100),
+        ])
+    frames = [pd.DataFrame(c[:, 1:], columns=['open', 'high', 'low', 'close', 'volume']) for c in candles.values()]
+    runs = 20
+    batched = timeit.timeit(lambda: compute_symbol_signals(candles, 100), number=runs) / runs
+    legacy = timeit.timeit(lambda: [_legacy_signals(df) for df in frames], number=runs) / runs
+    print(f"{symbols} symbols x 100 candles: batch {batched * 1e3:.2f}ms, pandas {legacy * 1e3:.2f}ms, x{legacy / batched:.1f}")
@@ -1,4 +1,6 @@
 # strategy_logic.py
+import math
+import numpy as np
 import pandas as pd
 import logging
 import time
@@ -6,6 +8,10 @@ from config import CONFIG
 import myBinance as mb
 from utils import log_debug_as_info
 import risk_manager
+import grid_reconciler
+import signal_kernel
+import indicator_memo
+import resampler
 
 def calculate_atr(df, period=14):
     """ATR을 계산합니다."""
@@ -21,31 +27,139 @@ def calculate_atr(df, period=14):
     except Exception:
         return df['close'].iloc[-1] * 0.01
 
+_entry_score_cache = {}  # ticker -> (마지막 확정 캔들 시각, 캔들 기반 조건/지표)
+
+
+def candle_conditions(v):
+    """캔들 지표 값(v)으로 캔들 기반 롱/숏 조건을 만듭니다. 값이 배열이면 조건도 캔들별 bool 배열입니다."""
+    trending = v['adx'] > CONFIG['ADX_THRESHOLD']
+    return {
+        # 롱
+        'adx_trend_up': trending & (v['plus_di'] > v['minus_di']),
+        'cci_oversold': v['cci'] < -CONFIG['CCI_THRESHOLD'],
+        'mfi_oversold': v['mfi'] < CONFIG['MFI_THRESHOLD'],
+        'stoch_oversold': (v['fast_k'] < CONFIG['STOCH_K_THRESHOLD']) & (v['slow_d'] < CONFIG['STOCH_D_THRESHOLD']),
+        'bb_lower_touch': v['close'] <= v['bb_lower'],
+        'macd_bullish': v['macd_hist'] > 0,
+        # 숏
+        'adx_trend_down': trending & (v['minus_di'] > v['plus_di']),
+        'cci_overbought': v['cci'] > CONFIG['CCI_THRESHOLD'],
+        'mfi_overbought': v['mfi'] > 100 - CONFIG['MFI_THRESHOLD'],
+        'stoch_overbought': (v['fast_k'] > 100 - CONFIG['STOCH_K_THRESHOLD']) & (v['slow_d'] > 100 - CONFIG['STOCH_D_THRESHOLD']),
+        'bb_upper_touch': v['close'] >= v['bb_upper'],
+        'macd_bearish': v['macd_hist'] < 0,
+        # 공통 (변동성/거래량 확대)
+        'bb_expansion': v['bb_ratio'] > CONFIG['BB_EXPANSION_THRESHOLD'],
+        'volume_spike': v['volume_ratio'] > CONFIG['VOLUME_SPIKE_THRESHOLD'],
+    }
+
+
+def score_candle_conditions(candles):
+    """확정 캔들 배열((N, 5): open~volume)로 캔들 기반 롱/숏 조건과 지표 값을 계산합니다."""
+    high, low, close, volume = candles[:, 1], candles[:, 2], candles[:, 3], candles[:, 4]
+    signals = signal_kernel.compute_signals(candles)
+    adx, plus_di, minus_di = signal_kernel.adx_last(high, low, close)
+    values = {'adx': adx, 'plus_di': plus_di, 'minus_di': minus_di,
+              'cci': signal_kernel.cci_last(high, low, close),
+              'mfi': signal_kernel.mfi_last(high, low, close, volume),
+              'fast_k': signals.fast_k, 'slow_d': signals.slow_d,
+              'bb_ratio': signal_kernel.bb_width_ratio(close, CONFIG['MA_PERIOD']),
+              'volume_ratio': signal_kernel.volume_spike_ratio(volume)}
+    conditions = candle_conditions(dict(values, close=signals.close, bb_lower=signals.bb_lower,
+                                        bb_upper=signals.bb_upper, macd_hist=signals.macd_hist))
+    return {k: bool(v) for k, v in conditions.items()}, values
+
+
+def price_conditions(current_price, ma, rsi):
+    """현재가 기준 MA/RSI 조건 (배열도 받습니다)"""
+    return {
+        'ma_golden_cross': current_price > ma,
+        'ma_dead_cross': current_price < ma,
+        'rsi_oversold': rsi < CONFIG['RSI_THRESHOLD_LONG'],
+        'rsi_overbought': rsi > CONFIG['RSI_THRESHOLD_SHORT'],
+    }
+
+
+LONG_CONDITIONS = ('ma_golden_cross', 'rsi_oversold', 'adx_trend_up', 'cci_oversold', 'mfi_oversold',
+                   'stoch_oversold', 'bb_lower_touch', 'macd_bullish', 'bb_expansion', 'volume_spike')
+SHORT_CONDITIONS = ('ma_dead_cross', 'rsi_overbought', 'adx_trend_down', 'cci_overbought', 'mfi_overbought',
+                    'stoch_overbought', 'bb_upper_touch', 'macd_bearish', 'bb_expansion', 'volume_spike')
+
+
+def entry_scores(conditions):
+    """조건 점수와 진입 여부 (long_score, short_score, long, short). 조건이 배열이면 결과도 배열입니다.
+
+    ENTRY_CONDITION_STRICTNESS는 충족해야 할 조건의 비율(0~1)이며, 필요한 점수는 조건 수에 곱해 올림합니다.
+    """
+    long_score = sum(conditions[k] for k in LONG_CONDITIONS)
+    short_score = sum(conditions[k] for k in SHORT_CONDITIONS)
+    required = math.ceil(round(CONFIG['ENTRY_CONDITION_STRICTNESS'] * len(LONG_CONDITIONS), 9))  # 0.7 * 10 = 7.000000000000001 같은 오차 제거
+    long = (long_score >= required) & (long_score > short_score)
+    short = (short_score >= required) & (short_score > long_score)
+    return long_score, short_score, long, short
+
+
 def check_entry_conditions(exchange_handler, ticker, df, current_price, ma, rsi):
-    """개선된 진입 조건을 체크합니다."""
+    """개선된 진입 조건을 체크합니다.
+
+    ADX/CCI/MFI/스토캐스틱/볼린저/MACD/거래량 조건은 확정 캔들로 계산해 (심볼, 마지막 확정 캔들)마다 한 번만 구하고,
+    현재가 기준 MA/RSI 조건만 매 루프 계산합니다.
+    """
     try:
-        conditions = {}
-        # ... (원래 코드의 check_entry_conditions 함수 내용 전체를 여기에 복사)
-        # 예시:
-        conditions['ma_golden_cross'] = current_price > ma
-        conditions['rsi_oversold'] = rsi < CONFIG['RSI_THRESHOLD_LONG']
-        # ... (ADX, CCI, MFI 등 모든 지표 계산 및 점수화 로직)
-        
-        # 임시로 간단한 로직으로 대체합니다. 원래 코드를 여기에 붙여넣으세요.
-        score = 5 if conditions['ma_golden_cross'] and conditions['rsi_oversold'] else 2
-        
+        if len(df) < 2:
+            raise ValueError("not enough candles")
+        closed_ts = df.index[-2]
+        cached = _entry_score_cache.get(ticker)
+        if cached is None or cached[0] != closed_ts:
+            cached = (closed_ts, score_candle_conditions(df.to_numpy()[:-1]))
+            _entry_score_cache[ticker] = cached
+            log_debug_as_info(f"{ticker} - 진입 지표 갱신: {cached[1][1]}")
+        cached_conditions, values = cached[1]
+
+        conditions = dict(cached_conditions)
+        conditions.update(price_conditions(current_price, ma, rsi))
+        long_score, short_score, long, short = entry_scores(conditions)
+
         entry_signal = {
-            'long': score >= 4 and conditions.get('ma_golden_cross', False),
-            'short': score >= 4 and not conditions.get('ma_golden_cross', False),
-            'score': score,
-            'max_score': 10,
-            'conditions': conditions
+            'long': bool(long),
+            'short': bool(short),
+            'score': max(long_score, short_score),
+            'long_score': long_score,
+            'short_score': short_score,
+            'max_score': len(LONG_CONDITIONS),
+            'conditions': conditions,
+            'values': values,
         }
-        logging.info(f"{ticker} - 진입 조건 점수: {score}/10")
+        logging.info(f"{ticker} - 진입 조건 점수: 롱 {long_score}/{len(LONG_CONDITIONS)}, 숏 {short_score}/{len(SHORT_CONDITIONS)}")
         return entry_signal
     except Exception as e:
         logging.error(f"Error checking entry conditions for {ticker}: {e}")
-        return {'long': False, 'short': False, 'score': 0, 'max_score': 10, 'conditions': {}}
+        return {'long': False, 'short': False, 'score': 0, 'max_score': len(LONG_CONDITIONS), 'conditions': {}}
+
+def confirm_timeframes(ticker, entry_signal):
+    """1분봉에서 만든 상위 타임프레임 추세로 진입 신호를 확인합니다. (추가 API 요청 없음)
+
+    추세(종가 vs MA)가 반대인 타임프레임이 하나라도 있으면 그 방향 진입을 막습니다. 캔들이 모자란 타임프레임은 건너뜁니다.
+    """
+    trends = {}
+    for timeframe in CONFIG['CONFIRMATION_TIMEFRAMES']:
+        try:
+            frame = resampler.get_resampled(ticker, timeframe, CONFIG['MA_PERIOD'] + 1)  # 추세 판단(종가 vs MA)에 필요한 만큼만
+            if len(frame) < CONFIG['MA_PERIOD']:
+                continue
+            signals = indicator_memo.compute_signals(frame)
+            trends[timeframe] = 'up' if signals.close > signals.ma else 'down'
+        except Exception as e:
+            logging.error(f"{ticker} - {timeframe} confirmation failed: {e}")
+
+    confirmed = dict(entry_signal)
+    confirmed['long'] = entry_signal['long'] and 'down' not in trends.values()
+    confirmed['short'] = entry_signal['short'] and 'up' not in trends.values()
+    confirmed['timeframes'] = trends
+    if (entry_signal['long'], entry_signal['short']) != (confirmed['long'], confirmed['short']):
+        logging.info(f"{ticker} - 상위 타임프레임 추세 불일치로 진입 보류: {trends}")
+    return confirmed
+
 
 def create_atr_based_grid(exchange_handler, ticker, current_price, atr, existing_orders, amount, entry_signal):
     """ATR 기반 그리드를 생성합니다."""
@@ -55,11 +169,23 @@ def create_atr_based_grid(exchange_handler, ticker, current_price, atr, existing
 
 
 def progressive_grid_adjustment(exchange_handler, ticker, current_price, existing_orders, grid_interval_pct, amount):
-    """점진적으로 그리드를 조정합니다."""
-    # ...(원래 코드의 progressive_grid_adjustment 함수 내용 전체를 여기에 복사)...
-    # 이 함수는 exchange_handler.place_order를 호출하도록 수정되어야 합니다.
+    """점진적으로 그리드를 조정합니다. 목표 그리드와 미체결 주문의 차이만 주문/수정/취소하고 변경 건수를 반환합니다."""
     logging.info(f"{ticker} - Performing progressive grid adjustment...")
-    return 0
+    return grid_reconciler.reconcile_grid(exchange_handler, ticker, current_price, existing_orders, grid_interval_pct, amount)
+
+MIN_SAFE_INTERVAL = 0.0005  # 그리드 간격 하한
+
+
+def atr_grid_interval(atr_percentage):
+    """ATR 비율로 그리드 간격을 정합니다. 1% 이하는 최소, 3% 이상은 최대 간격이고 그 사이는 선형 보간합니다.
+
+    배열을 넘기면 캔들별 간격 배열(최소 간격 보장 포함)을 반환합니다. (백테스트용)
+    """
+    interval = np.interp(atr_percentage, [0.01, 0.03], [CONFIG['GRID_INTERVAL_MIN'], CONFIG['GRID_INTERVAL_MAX']])
+    if np.ndim(interval) == 0:
+        return float(interval)
+    return np.maximum(interval, MIN_SAFE_INTERVAL)
+
 
 def calculate_dynamic_grid_interval(ticker, current_price, atr, existing_orders=None):
     """기존 주문을 반영한 동적 그리드 간격 계산"""
@@ -73,18 +199,10 @@ def calculate_dynamic_grid_interval(ticker, current_price, atr, existing_orders=
             avg_interval = (price_range / (len(existing_prices) - 1)) if len(existing_prices) > 1 else 0.001
             target_interval = max(CONFIG['GRID_INTERVAL_MIN'], min(CONFIG['GRID_INTERVAL_MAX'], avg_interval / current_price))
         else:
-            # ATR 기반 기본 계산
-            if atr_percentage > 0.03:  # 높은 변동성
-                target_interval = CONFIG['GRID_INTERVAL_MAX']
-            elif atr_percentage < 0.01:  # 낮은 변동성
-                target_interval = CONFIG['GRID_INTERVAL_MIN']
-            else:  # 중간 변동성
-                ratio = (atr_percentage - 0.01) / (0.03 - 0.01)
-                target_interval = CONFIG['GRID_INTERVAL_MIN'] + ratio * (CONFIG['GRID_INTERVAL_MAX'] - CONFIG['GRID_INTERVAL_MIN'])
+            target_interval = atr_grid_interval(atr_percentage)
         
         # 최소 간격 보장
-        min_safe_interval = 0.0005
-        final_interval = max(target_interval, min_safe_interval)
+        final_interval = max(target_interval, MIN_SAFE_INTERVAL)
         
         logging.info(f"{ticker} - 동적 그리드 간격: ATR%={atr_percentage:.4f}, 기존주문={len(existing_orders) if existing_orders else 0}개, 간격={final_interval:.4f} ({final_interval*100:.2f}%)")
         return final_interval
@@ -0,0 +1,185 @@
+# trade_journal.py
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from config import CONFIG
+
+# 세그먼트: 하루에 한 파일(history/YYYY-MM-DD.jsonl), 레코드 한 개 = JSON 한 줄.
+# 줄 단위 추가만 하므로 쓰다가 죽어도 마지막 줄만 잘리고, 다음 시작 때 잘린 줄을 잘라낸다.
+SEGMENT_SUFFIX = '.jsonl'
+FSYNC_POLICIES = ('always', 'interval', 'never')  # 배치마다 fsync / FLUSH_INTERVAL마다 fsync / OS에 맡김
+
+
+def segment_path(directory, day):
+    return os.path.join(directory, f"{day}{SEGMENT_SUFFIX}")
+
+
+def repair_segment(path):
+    """마지막 줄이 개행으로 끝나지 않으면(쓰다가 끊긴 레코드) 잘라냅니다. 잘라낸 바이트 수를 반환합니다."""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+    if size == 0:
+        return 0
+    with open(path, 'rb+') as f:
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return 0
+        # 뒤에서부터 마지막 개행을 찾는다 (레코드는 짧으므로 보통 한 블록 안)
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b'\n')
+            if cut >= 0:
+                end = start + cut + 1
+                break
+            end = start
+        f.truncate(end)
+    return size - end
+
+
+def read_segment(path):
+    """세그먼트의 레코드 목록. 손상된 줄(멀티바이트 문자 중간에서 잘린 줄 포함)은 건너뜁니다."""
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line.decode('utf-8')))
+                except ValueError:  # UnicodeDecodeError도 ValueError
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class TradeJournal:
+    """거래 기록을 일별 JSONL 세그먼트에 추가만 하는 저널입니다.
+
+    append()는 큐에 넣기만 하므로 주문 경로의 비용이 일정하고, 백그라운드 스레드가 모아서
+    한 번에 기록합니다. fsync 정책은 JOURNAL_FSYNC('always'|'interval'|'never')로 정합니다.
+    """
+
+    def __init__(self, directory=None, fsync=None, flush_interval=None):
+        self._directory = directory
+        self.fsync = fsync or CONFIG.get('JOURNAL_FSYNC', 'interval')
+        if self.fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown journal fsync policy: {self.fsync}")
+        self.flush_interval = flush_interval if flush_interval is not None else CONFIG.get('JOURNAL_FLUSH_INTERVAL', 1.0)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._day = None
+        self._last_sync = 0.0
+        self.written = 0
+        self.dropped = 0  # 기록 실패로 버린 레코드 수
+
+    @property
+    def directory(self):
+        return self._directory or CONFIG['HISTORY_DIR']  # 기본값은 사용 시점의 설정 (시뮬레이터 등에서 바꿀 수 있음)
+
+    # --- 기록 (주문 경로) ---
+    def append(self, record):
+        """레코드를 기록 대기열에 넣습니다. 기록 날짜는 호출 시각 기준입니다."""
+        self._ensure_thread()
+        self._queue.put((datetime.now().strftime('%Y-%m-%d'), record))
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='trade-journal', daemon=True)
+                self._thread.start()
+
+    # --- 백그라운드 기록 ---
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while True:  # 쌓인 레코드를 한 번에 기록
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(entry is None for entry in batch)
+            self._write([entry for entry in batch if entry is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._close_file()
+                return
+
+    def _open(self, day):
+        """day 세그먼트로 전환합니다. 이전 세그먼트는 닫고, 새 세그먼트의 잘린 마지막 줄은 복구합니다."""
+        if self._day == day and self._file is not None:
+            return self._file
+        self._close_file()
+        os.makedirs(self.directory, exist_ok=True)
+        path = segment_path(self.directory, day)
+        torn = repair_segment(path)
+        if torn:
+            logging.warning(f"Trade journal {path}: truncated torn record ({torn} bytes)")
+        self._file = open(path, 'a', encoding='utf-8')
+        self._day = day
+        return self._file
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            for day, record in batch:
+                self._open(day).write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+            self._file.flush()
+            now = time.time()
+            if self.fsync == 'always' or (self.fsync == 'interval' and now - self._last_sync >= self.flush_interval):
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logging.error(f"Failed to write trade journal: {e}")
+            self._close_file()  # 다음 배치에서 다시 열고 잘린 줄을 복구
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+            if self.fsync != 'never':
+                os.fsync(self._file.fileno())
+            self._file.close()
+        except Exception as e:
+            logging.error(f"Failed to close trade journal: {e}")
+        self._file = None
+        self._day = None
+
+    def flush(self):
+        """대기 중인 레코드가 모두 기록될 때까지 기다립니다."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """남은 레코드를 기록하고 스레드를 멈춥니다."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    # --- 조회 ---
+    def read(self, day=None):
+        """day(YYYY-MM-DD, 기본 오늘) 세그먼트의 레코드 목록"""
+        self.flush()
+        return read_segment(segment_path(self.directory, day or datetime.now().strftime('%Y-%m-%d')))
+
+
+trade_journal = TradeJournal()
+atexit.register(trade_journal.close)
@@ -1,20 +1,16 @@
 # utils.py
 import logging
 import time
-import json
 import os
-from datetime import datetime, timezone
-from line_alert import SendMessage
+from notifier import notify, notify_suppressed
 from config import CONFIG
+from trade_journal import trade_journal
+import cache
+from cache import position_cache, funding_cache, snapshot_cache, notification_cache, symbol_tags
 
 # --- 캐시 관리 ---
-price_cache = {}
-min_amount_cache = {'ETH/USDT:USDT': {'amount': 0.001, 'timestamp': time.time()}}
-position_cache = {}
-amount_cache = {}
-funding_cache = {}
-last_notification = {}
-cumulative_funding = {}
+# 캐시는 cache 모듈의 구역(TTL + LRU, 스레드 안전)을 쓰고, 이름은 기존 코드 호환을 위해 여기서도 노출한다
+cumulative_funding = {}  # 심볼별 낸 펀딩비 누계 (pnl_engine이 채움, 캐시가 아닌 장부)
 
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'False') == 'True'
 
@@ -25,41 +21,18 @@ def log_debug_as_info(message):
     else:
         logging.debug(message)
 
-def get_cached_data(cache, key, fetch_func, duration):
-    """제네릭 캐시 데이터 조회 함수"""
-    current_time = time.time()
-    if key in cache and current_time - cache[key]['timestamp'] < duration:
-        log_debug_as_info(f"Using cached data for {key}")
-        return cache[key]['data']
-    
-    data = fetch_func()
-    cache[key] = {'data': data, 'timestamp': current_time}
-    log_debug_as_info(f"Fetched new data for {key}")
-    return data
+def get_cached_data(cache_namespace, key, fetch_func, duration=None, tags=()):
+    """제네릭 캐시 데이터 조회 함수. 동시에 같은 키를 요청하면 한 번만 조회합니다."""
+    return cache_namespace.get_or_load(key, fetch_func, tags=tags, ttl=duration)
 
 def invalidate_cache(ticker, position_side):
-    """포지션 관련 캐시 무효화"""
-    keys_to_delete = [
-        f"{ticker}_{position_side}_amount",
-        f"{ticker}_{position_side}"
-    ]
-    for key in keys_to_delete:
-        if key in amount_cache:
-            del amount_cache[key]
-            log_debug_as_info(f"Invalidated amount cache for {key}")
-        if key in position_cache:
-            del position_cache[key]
-            log_debug_as_info(f"Invalidated position cache for {key}")
+    """주문/취소 후 캐시 무효화 (스냅샷에서 해당 심볼의 미체결 주문만 지워 다음 조회 때 그 심볼만 다시 받음)"""
+    if snapshot_cache.invalidate_tag(ticker):
+        log_debug_as_info(f"Invalidated {ticker} open orders in account snapshot ({position_side})")
 
 def clear_all_cache():
     """모든 캐시 강제 무효화"""
-    global price_cache, min_amount_cache, position_cache, amount_cache, funding_cache, last_notification, cumulative_funding
-    price_cache.clear()
-    min_amount_cache.clear()
-    position_cache.clear()
-    amount_cache.clear()
-    funding_cache.clear()
-    last_notification.clear()
+    cache.clear_all()
     cumulative_funding.clear()
     logging.info("All caches cleared.")
 
@@ -69,39 +42,24 @@ def handle_exception(ticker, action, e, notify_type):
     error_msg = f"{action} 오류: {str(e)[:50]}"
     logging.error(f"{ticker} - {error_msg}")
     if can_notify(ticker, notify_type):
-        SendMessage(f"[{ticker}] {error_msg}")
+        notify(f"[{ticker}] {error_msg}", key=(ticker, notify_type))
 
 def can_notify(ticker, event_type, cooldown=None):
-    """알림 쿨다운 관리"""
-    current_time = time.time()
-    if ticker not in last_notification:
-        last_notification[ticker] = {}
-    
+    """알림 쿨다운 관리 (확인과 기록을 한 번에 처리하므로 동시에 호출해도 한 번만 True)
+
+    쿨다운에 걸린 알림은 버리지 않고 디스패처에 횟수만 넘겨 다음 알림 묶음에 합쳐 표시합니다.
+    """
     cooldown_time = cooldown if cooldown is not None else CONFIG.get('NOTIFICATION_COOLDOWN', 300)
-    
-    if event_type not in last_notification[ticker] or current_time - last_notification[ticker][event_type] > cooldown_time:
-        last_notification[ticker][event_type] = current_time
+    if notification_cache.add((ticker, event_type), time.time(), tags=symbol_tags(ticker), ttl=cooldown_time):
         return True
+    notify_suppressed((ticker, event_type))
     return False
 
 # --- 기록 저장 ---
 def save_history(data):
-    """거래 기록 저장"""
+    """거래 기록 저장 (저널 대기열에 넣기만 하고 기록은 백그라운드에서 처리)"""
     try:
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        file_path = os.path.join(CONFIG['HISTORY_DIR'], f"{date_str}.json")
-        history = []
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                try:
-                    history = json.load(f)
-                    if not isinstance(history, list):
-                        history = []
-                except json.JSONDecodeError:
-                    history = []
-        history.append(data)
-        with open(file_path, 'w') as f:
-            json.dump(history, f, indent=2)
+        trade_journal.append(data)
         log_debug_as_info(f"Saved history: {data}")
     except Exception as e:
         logging.error(f"Failed to save history: {e}")
\ No newline at end of file